@@ -0,0 +1,146 @@
+import logging
+import time
+from typing import Any, Optional
+import orjson
+import redis.asyncio as redis
+from app.celery_app import celery_app
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Job states whose API responses never change again and can be cached indefinitely
+TERMINAL_STATUSES = frozenset({"completed", "failed"})
+
+# Keep cache lookups from stalling requests when Redis is slow or down
+CACHE_SOCKET_TIMEOUT = 0.25  # Seconds
+
+# After a Redis error, skip the cache for this long instead of timing out on every request
+CACHE_RETRY_INTERVAL = 30  # Seconds
+
+# Created by open_client() at app startup, on the loop that serves requests
+_client: Optional[redis.Redis] = None
+_disabled_until: float = 0.0
+
+
+def status_key(job_id: str) -> str:
+    """Cache key for a job's /status payload"""
+    return f"job:{job_id}:status"
+
+
+def result_key(job_id: str) -> str:
+    """Cache key for a job's /result payload"""
+    return f"job:{job_id}:result"
+
+
+def _get_client() -> Optional[redis.Redis]:
+    """Return the app's Redis client, or None before startup or while the cache is backed off"""
+    if _client is None or time.monotonic() < _disabled_until:
+        return None
+    return _client
+
+
+async def open_client() -> None:
+    """Create the Redis client on the app's event loop; called once at startup"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=CACHE_SOCKET_TIMEOUT,
+            socket_timeout=CACHE_SOCKET_TIMEOUT,
+        )
+
+
+async def close_client() -> None:
+    """Close the Redis client and its connection pool; called at shutdown"""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing response cache client: {str(e)}")
+
+
+def _back_off(error: Exception) -> None:
+    """Disable the cache for a while after a Redis failure"""
+    global _disabled_until
+    _disabled_until = time.monotonic() + CACHE_RETRY_INTERVAL
+    logger.warning(f"Response cache unavailable, bypassing for {CACHE_RETRY_INTERVAL}s: {str(error)}")
+
+
+async def get_cached_bytes(key: str) -> Optional[bytes]:
+    """Return the cached JSON document for key as raw bytes, or None on a miss or cache error"""
+    client = _get_client()
+    if client is None:
+        return None
+    
+    try:
+        cached = await client.get(key)
+    except Exception as e:
+        _back_off(e)
+        return None
+    
+    if cached is not None:
+        logger.debug("Cache hit for %s", key)
+    return cached
+
+
+async def get_cached_json(key: str) -> Optional[Any]:
+    """Return the decoded cached value for key, or None on a miss or cache error"""
+    cached = await get_cached_bytes(key)
+    return orjson.loads(cached) if cached is not None else None
+
+
+async def set_cached_json(key: str, value: Any, ttl: Optional[int] = None) -> None:
+    """Store value under key as JSON; errors are logged and otherwise ignored"""
+    client = _get_client()
+    if client is None:
+        return
+    
+    try:
+        await client.set(key, orjson.dumps(value), ex=ttl)
+    except Exception as e:
+        _back_off(e)
+
+
+def _get_sync_client():
+    """Return the Celery result backend's Redis client (shares its connection pool), or None while backed off"""
+    if time.monotonic() < _disabled_until:
+        return None
+    
+    try:
+        return celery_app.backend.client
+    except Exception as e:
+        # Result backend is not Redis or cannot be created
+        _back_off(e)
+        return None
+
+
+def get_sync(key: str) -> Optional[bytes]:
+    """Blocking cache lookup for worker code; returns None on a miss or cache error"""
+    client = _get_sync_client()
+    if client is None:
+        return None
+    
+    try:
+        cached = client.get(key)
+    except Exception as e:
+        _back_off(e)
+        return None
+    
+    if cached is not None:
+        logger.debug("Cache hit for %s", key)
+    return cached
+
+
+def set_sync(key: str, value: bytes, ttl: int) -> None:
+    """Blocking cache store for worker code; errors are logged and otherwise ignored"""
+    client = _get_sync_client()
+    if client is None:
+        return
+    
+    try:
+        client.setex(key, ttl, value)
+    except Exception as e:
+        _back_off(e)
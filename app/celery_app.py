@@ -17,4 +17,20 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     result_expires=3600,  # Results expire after 1 hour
-)
\ No newline at end of file
+    # Jobs run for seconds to minutes, so each pool slot reserves only the job it is
+    # about to run instead of holding a backlog other workers could be processing
+    worker_prefetch_multiplier=1,
+)
+
+# Periodically send queued summaries to the OpenAI Batch API and collect finished batches
+if settings.SUMMARY_BATCH_ENABLED:
+    celery_app.conf.beat_schedule = {
+        "flush-summarization-batch": {
+            "task": "app.tasks.flush_summarization_batch",
+            "schedule": settings.SUMMARY_BATCH_FLUSH_INTERVAL,
+        },
+        "poll-summarization-batches": {
+            "task": "app.tasks.poll_summarization_batches",
+            "schedule": settings.SUMMARY_BATCH_POLL_INTERVAL,
+        },
+    }
@@ -0,0 +1,37 @@
+"""
+Command-line maintenance tasks for the application.
+
+Usage:
+    python -m app.cli init-db
+"""
+
+import argparse
+import logging
+import sys
+
+from app.database import create_tables
+
+# Get logger (logging is configured in config.py)
+logger = logging.getLogger(__name__)
+
+
+def init_db(args: argparse.Namespace) -> int:
+    """Create database tables and indexes that do not exist yet"""
+    create_tables()
+    logger.info("✓ Database tables are up to date")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    init_db_parser = subparsers.add_parser("init-db", help="Create database tables and indexes")
+    init_db_parser.set_defaults(func=init_db)
+    
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,96 @@
 import os
+import tempfile
+import atexit
 import logging
+import logging.handlers
+import queue
+import threading
+from functools import lru_cache
 from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Seconds between forced flushes of buffered log records to app.log
+LOG_FLUSH_INTERVAL = 30
+
+def _flush_periodically(handler: logging.Handler, stop: threading.Event) -> None:
+    """Flush buffered records every LOG_FLUSH_INTERVAL seconds until stopped"""
+    while not stop.wait(LOG_FLUSH_INTERVAL):
+        handler.flush()
+
 def setup_logging():
-    """Configure logging for the application"""
+    """
+    Configure logging for the application.
+    
+    Request handlers only enqueue records; a background QueueListener thread
+    writes them to the console and to a buffered app.log handler, so request
+    code never blocks on disk I/O. Buffered records are flushed on ERROR, when
+    the buffer fills, every LOG_FLUSH_INTERVAL seconds, and at exit.
+    """
     log_level = os.getenv("LOG_LEVEL", "INFO").upper()
-    log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    
+    stream_handler = logging.StreamHandler()  # Console output
+    stream_handler.setFormatter(formatter)
+    
+    file_handler = logging.FileHandler("app.log", mode="a")  # File output
+    file_handler.setFormatter(formatter)
+    buffered_file_handler = logging.handlers.MemoryHandler(
+        capacity=1024,
+        flushLevel=logging.ERROR,
+        target=file_handler,
+        flushOnClose=True
+    )
+    
+    log_queue: queue.Queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(
+        log_queue, buffered_file_handler, stream_handler, respect_handler_level=True
+    )
+    listener.start()
+    
+    # Records are formatted by the listener's handlers; only merge args here
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    stop_flushing = threading.Event()
+    
+    def start_flush_thread():
+        threading.Thread(
+            target=_flush_periodically,
+            args=(buffered_file_handler, stop_flushing),
+            name="log-flush",
+            daemon=True
+        ).start()
+    
+    start_flush_thread()
+    
+    def shutdown_logging():
+        stop_flushing.set()
+        listener.stop()
+        buffered_file_handler.close()
+        file_handler.close()
+    
+    atexit.register(shutdown_logging)
+    
+    def restart_in_child():
+        # A forked child (e.g. a Celery prefork worker) inherits the parent's
+        # queued and buffered records but not its threads: drop the copies so
+        # they are not written twice, and start fresh threads for the child
+        child_queue: queue.Queue = queue.Queue(-1)
+        queue_handler.queue = child_queue
+        listener.queue = child_queue
+        buffered_file_handler.buffer.clear()
+        listener.start()
+        start_flush_thread()
+    
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=restart_in_child)
     
     logging.basicConfig(
         level=getattr(logging, log_level),
-        format=log_format,
-        handlers=[
-            logging.StreamHandler(),  # Console output
-            logging.FileHandler("app.log", mode="a")  # File output
-        ]
+        handlers=[queue_handler]
     )
     
     # Set specific log levels for external libraries
@@ -34,17 +107,71 @@ class Settings:
     # Application Configuration
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./uploads")
     MAX_FILE_SIZE_MB: int = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
+    MAX_FILE_SIZE_BYTES: int = MAX_FILE_SIZE_MB * 1024 * 1024
+    MAX_BATCH_FILES: int = int(os.getenv("MAX_BATCH_FILES", "10"))
     
     # Database Configuration
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds
+    # Create tables on app startup; otherwise run `python -m app.cli init-db` once before serving
+    AUTO_CREATE_TABLES: bool = os.getenv("AUTO_CREATE_TABLES", "0") == "1"
+    
+    # OpenAI HTTP connection pool (shared by transcription and summarization)
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))  # In-flight API calls per process
+    OPENAI_MAX_ATTEMPTS: int = int(os.getenv("OPENAI_MAX_ATTEMPTS", "6"))  # Tries per API call on transient errors
+    OPENAI_READ_TIMEOUT: float = float(os.getenv("OPENAI_READ_TIMEOUT", "120"))  # Seconds to wait for a response
+    # Account rate limits to pace requests under, per process (0 disables); 90% of each is used
+    OPENAI_RPM: int = int(os.getenv("OPENAI_RPM", "0"))  # Requests per minute
+    OPENAI_TPM: int = int(os.getenv("OPENAI_TPM", "0"))  # Tokens per minute
+    
+    # Web server processes started by run_app.py (uvicorn --workers)
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    
+    # Celery worker: jobs mostly wait on the OpenAI API, so threads overlap that I/O cheaply
+    CELERY_WORKER_POOL: str = os.getenv("CELERY_WORKER_POOL", "threads")
+    CELERY_WORKER_CONCURRENCY: int = int(os.getenv("CELERY_WORKER_CONCURRENCY", "16"))
+    
+    # Summaries through the OpenAI Batch API (cheaper, but results can take up to 24h);
+    # requires Celery beat to run the flush/poll tasks
+    SUMMARY_BATCH_ENABLED: bool = os.getenv("SUMMARY_BATCH_ENABLED", "0") == "1"
+    SUMMARY_BATCH_FLUSH_INTERVAL: int = int(os.getenv("SUMMARY_BATCH_FLUSH_INTERVAL", "30"))  # Seconds
+    SUMMARY_BATCH_POLL_INTERVAL: int = int(os.getenv("SUMMARY_BATCH_POLL_INTERVAL", "60"))  # Seconds
+    SUMMARY_BATCH_MAX_JOBS: int = int(os.getenv("SUMMARY_BATCH_MAX_JOBS", "1000"))
+    
+    # Audio shorter than this is reported as having no speech without calling Whisper
+    # (needs ffprobe from ffmpeg on the worker; 0 disables the check)
+    MIN_AUDIO_DURATION_SECONDS: float = float(os.getenv("MIN_AUDIO_DURATION_SECONDS", "1.0"))
+    # Longer audio is split into segments of this length that are transcribed in parallel,
+    # each summarized as soon as its transcript arrives (needs ffmpeg; 0 disables splitting)
+    TRANSCRIPTION_SEGMENT_SECONDS: float = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "600"))
+    
+    # How long summaries are cached by transcript hash (0 disables the cache)
+    SUMMARY_CACHE_TTL: int = int(os.getenv("SUMMARY_CACHE_TTL", "604800"))  # Seconds (7 days)
+    # How long transcriptions are cached by audio file hash (0 disables the cache)
+    TRANSCRIPTION_CACHE_TTL: int = int(os.getenv("TRANSCRIPTION_CACHE_TTL", "2592000"))  # Seconds (30 days)
     
     # Redis Configuration
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
     
     # Logging Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    
+    # Development mode: reload templates when they change on disk
+    DEBUG: bool = os.getenv("DEBUG", "0") == "1"
+    
+    # Compiled template cache, reused across restarts and workers
+    TEMPLATE_CACHE_DIR: str = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "jinja_cache"))
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings instance (usable as a FastAPI dependency)"""
+    return Settings()
 
 # Initialize logging
 setup_logging()
 
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
\ No newline at end of file
@@ -1,6 +1,11 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert, select, update, delete, bindparam
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from app.models import ProcessingJob
-import uuid
+from app.models import ProcessingJob, generate_job_id
+
+# batch_id of jobs claimed by a summarization flush that hasn't submitted their batch yet
+SUMMARY_CLAIM_PREFIX = "claim:"
 
 class JobCRUD:
     """CRUD operations for ProcessingJob"""
@@ -9,50 +14,181 @@ class JobCRUD:
     def create_job(db: Session, filename: str) -> ProcessingJob:
         """Create a new processing job"""
         job = ProcessingJob(
-            id=str(uuid.uuid4()),
+            id=generate_job_id(),
             filename=filename,
             status="pending"
         )
         db.add(job)
         db.commit()
-        db.refresh(job)
         return job
     
+    @staticmethod
+    def create_jobs_bulk(db: Session, filenames: List[str]) -> List[str]:
+        """Create several pending jobs in a single INSERT and commit, returning their IDs"""
+        rows = [
+            {"id": generate_job_id(), "filename": filename, "status": "pending"}
+            for filename in filenames
+        ]
+        if rows:
+            db.execute(insert(ProcessingJob), rows)
+            db.commit()
+        return [row["id"] for row in rows]
+    
     @staticmethod
     def get_job(db: Session, job_id: str) -> ProcessingJob:
         """Get a job by ID"""
         return db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
     
     @staticmethod
-    def update_job_status(db: Session, job_id: str, status: str, error_message: str = None) -> ProcessingJob:
+    def get_job_status(db: Session, job_id: str) -> Optional[Row]:
+        """Get only the columns needed for status polling, skipping the large text columns"""
+        stmt = select(
+            ProcessingJob.id,
+            ProcessingJob.status,
+            ProcessingJob.filename,
+            ProcessingJob.created_at,
+            ProcessingJob.error_message
+        ).where(ProcessingJob.id == job_id)
+        return db.execute(stmt).first()
+    
+    @staticmethod
+    def claim_jobs_awaiting_summary(db: Session, claim: str, limit: int) -> List[Row]:
+        """
+        Move the oldest jobs waiting for batch summarization to summarizing under claim,
+        and return the (id, transcription) of the jobs claimed.
+        
+        The single UPDATE re-checks each job's status, so overlapping flushes never
+        claim, and submit, the same job twice.
+        """
+        oldest = (
+            select(ProcessingJob.id)
+            .where(ProcessingJob.status == "awaiting_summary")
+            .order_by(ProcessingJob.created_at)
+            .limit(limit)
+        )
+        db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id.in_(oldest), ProcessingJob.status == "awaiting_summary")
+            .values(status="summarizing", batch_id=claim)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        
+        stmt = select(ProcessingJob.id, ProcessingJob.transcription).where(ProcessingJob.batch_id == claim)
+        return list(db.execute(stmt))
+    
+    @staticmethod
+    def claim_job_awaiting_summary(db: Session, job_id: str, claim: str) -> bool:
+        """Move one job waiting for batch summarization to summarizing under claim; False if it no longer waits"""
+        result = db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == job_id, ProcessingJob.status == "awaiting_summary")
+            .values(status="summarizing", batch_id=claim)
+        )
+        db.commit()
+        return result.rowcount == 1
+    
+    @staticmethod
+    def finish_summary_claim(db: Session, job_id: str, claim: str, summary: Optional[str] = None) -> int:
+        """
+        Complete a claimed job with summary, or with summary None put it back in the
+        batch queue; jobs no longer held by claim are left alone
+        """
+        fields = {"status": "completed", "summary": summary} if summary is not None else {"status": "awaiting_summary"}
+        result = db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == job_id, ProcessingJob.batch_id == claim)
+            .values(batch_id=None, **fields)
+        )
+        db.commit()
+        return result.rowcount
+    
+    @staticmethod
+    def get_open_summary_batch_ids(db: Session) -> List[str]:
+        """Get the IDs of submitted summarization batches that still have jobs waiting on them"""
+        stmt = (
+            select(ProcessingJob.batch_id)
+            .where(
+                ProcessingJob.status == "summarizing",
+                ProcessingJob.batch_id.is_not(None),
+                ProcessingJob.batch_id.not_like(f"{SUMMARY_CLAIM_PREFIX}%")
+            )
+            .distinct()
+        )
+        return list(db.scalars(stmt))
+    
+    @staticmethod
+    def get_batch_job_ids(db: Session, batch_id: str) -> List[str]:
+        """Get the IDs of jobs still waiting on a summarization batch"""
+        stmt = select(ProcessingJob.id).where(
+            ProcessingJob.batch_id == batch_id,
+            ProcessingJob.status == "summarizing"
+        )
+        return list(db.scalars(stmt))
+    
+    @staticmethod
+    def update_job_status_atomic(db: Session, job_id: str, status: str) -> int:
+        """Set job status with a single UPDATE statement, without loading the row"""
+        return JobCRUD._update_job(db, job_id, status=status)
+    
+    @staticmethod
+    def update_jobs_bulk(db: Session, updates: List[Dict[str, Any]]) -> None:
+        """
+        Apply several job updates in one transaction.
+        
+        Args:
+            db: Database session
+            updates: Dicts with an "id" key plus the columns to set; all dicts
+                must set the same columns so they can share one executemany
+        """
+        if not updates:
+            return
+        
+        fields = [key for key in updates[0] if key != "id"]
+        stmt = (
+            update(ProcessingJob)
+            .where(ProcessingJob.id == bindparam("job_id"))
+            .values({field: bindparam(field) for field in fields})
+        )
+        params = [
+            {"job_id": row["id"], **{field: row[field] for field in fields}}
+            for row in updates
+        ]
+        db.connection().execute(stmt, params)
+        db.commit()
+    
+    @staticmethod
+    def _update_job(db: Session, job_id: str, **fields: Any) -> int:
+        """Apply column updates to a job with a single UPDATE and return the affected row count"""
+        result = db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == job_id)
+            .values(**fields)
+        )
+        db.commit()
+        return result.rowcount
+    
+    @staticmethod
+    def update_job_status(db: Session, job_id: str, status: str, error_message: str = None) -> int:
         """Update job status"""
-        job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-        if job:
-            job.status = status
-            if error_message:
-                job.error_message = error_message
-            db.commit()
-            db.refresh(job)
-        return job
+        fields = {"status": status}
+        if error_message:
+            fields["error_message"] = error_message
+        return JobCRUD._update_job(db, job_id, **fields)
     
     @staticmethod
-    def update_job_transcription(db: Session, job_id: str, transcription: str) -> ProcessingJob:
+    def update_job_transcription(db: Session, job_id: str, transcription: str) -> int:
         """Update job with transcription result"""
-        job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-        if job:
-            job.transcription = transcription
-            job.status = "transcribed"
-            db.commit()
-            db.refresh(job)
-        return job
+        return JobCRUD._update_job(db, job_id, transcription=transcription, status="transcribed")
     
     @staticmethod
-    def update_job_summary(db: Session, job_id: str, summary: str) -> ProcessingJob:
+    def update_job_summary(db: Session, job_id: str, summary: str) -> int:
         """Update job with summary result"""
-        job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-        if job:
-            job.summary = summary
-            job.status = "completed"
-            db.commit()
-            db.refresh(job)
-        return job
\ No newline at end of file
+        return JobCRUD._update_job(db, job_id, summary=summary, status="completed")
+    
+    @staticmethod
+    def delete_job(db: Session, job_id: str) -> int:
+        """Delete a job with a single DELETE and return the affected row count"""
+        result = db.execute(delete(ProcessingJob).where(ProcessingJob.id == job_id))
+        db.commit()
+        return result.rowcount
\ No newline at end of file
@@ -1,17 +1,74 @@
-from sqlalchemy import create_engine
+from typing import Any, Dict
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.models import Base
 from app.config import settings
 
-# Create database engine
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+def _engine_options(database_url: str) -> Dict[str, Any]:
+    """Build pool and driver options for the configured database"""
+    url = make_url(database_url)
+    options: Dict[str, Any] = {"pool_pre_ping": True}
+    
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # An in-memory database only exists on its connection, so share one
+            options["poolclass"] = StaticPool
+            return options
+    elif url.get_backend_name() == "postgresql" and url.get_driver_name() == "psycopg2":
+        options["executemany_mode"] = "values_plus_batch"
+    
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return options
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create database engine with an explicitly sized connection pool
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+
+# SQLite tuning applied to every new connection: WAL lets readers proceed while
+# a writer commits, and synchronous=NORMAL only fsyncs at checkpoints
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _connection_record):
+        """Apply performance PRAGMAs to each new SQLite connection"""
+        cursor = dbapi_conn.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+# Create session factory; objects keep their loaded values after commit instead of
+# being expired and re-selected on the next attribute access
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 def create_tables():
     """Create all database tables"""
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips tables that already exist, so add any columns and indexes they predate
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns and column.nullable:
+                column_type = column.type.compile(dialect=engine.dialect)
+                with engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 def get_db():
     """Dependency to get database session"""
@@ -19,4 +76,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
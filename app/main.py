@@ -1,15 +1,25 @@
 from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from jinja2 import FileSystemBytecodeCache
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import create_tables, get_db
-from app.models import UploadResponse, ErrorResponse, ProcessingResult
-from app.crud import JobCRUD
+from app.models import UploadResponse, BatchUploadResponse, ErrorResponse, ProcessingResult
+from app.crud import SUMMARY_CLAIM_PREFIX, JobCRUD
+from app import cache
 from app.services.file_handler import FileHandler
-from app.tasks import process_audio_file
+from app.services.transcription import get_transcription_service
+from app.services.summarization import get_summarization_service
+from app.tasks import process_audio_file, process_audio_batch
 from app.config import settings
+from typing import List, Optional, Tuple
+import asyncio
 import logging
+import os
+import time
+import uuid
 
 # Get logger (logging is configured in config.py)
 logger = logging.getLogger(__name__)
@@ -17,17 +27,67 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Audio Transcription Summarizer",
     description="API for transcribing MP3 files and generating summaries",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Set up templates and static files
-templates = Jinja2Templates(directory="app/templates")
+# How long a successful or failed API key check is reused before calling OpenAI again
+API_KEY_CHECK_TTL = 60
+
+# (monotonic timestamp, result) of the last API key validation
+_last_api_key_check: Optional[Tuple[float, bool]] = None
+
+def _api_key_is_valid() -> bool:
+    """Return the cached API key validation result, refreshing it once the TTL expires"""
+    global _last_api_key_check
+    
+    now = time.monotonic()
+    if _last_api_key_check is not None and now - _last_api_key_check[0] < API_KEY_CHECK_TTL:
+        return _last_api_key_check[1]
+    
+    is_valid = get_transcription_service().validate_api_key()
+    _last_api_key_check = (now, is_valid)
+    return is_valid
+
+# Room for the multipart boundary and part headers around the file itself
+UPLOAD_ENVELOPE_BYTES = 64 * 1024
+
+# Set up templates and static files; outside DEBUG, templates are never re-checked on
+# disk and their compiled bytecode is cached between processes
+os.makedirs(settings.TEMPLATE_CACHE_DIR, exist_ok=True)
+templates = Jinja2Templates(
+    directory="app/templates",
+    auto_reload=settings.DEBUG,
+    bytecode_cache=FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR)
+)
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
-# Initialize database tables on startup
+@app.middleware("http")
+async def limit_upload_body(request: Request, call_next):
+    """Reject uploads whose declared Content-Length is over the limit before the body is read"""
+    if request.method == "POST" and request.url.path in ("/upload", "/upload-stream", "/upload-batch"):
+        content_length = request.headers.get("content-length", "")
+        max_files = settings.MAX_BATCH_FILES if request.url.path == "/upload-batch" else 1
+        max_body = max_files * (settings.MAX_FILE_SIZE_BYTES + UPLOAD_ENVELOPE_BYTES)
+        if content_length.isdigit() and int(content_length) > max_body:
+            logger.warning(f"Rejected upload with Content-Length {content_length} before reading body")
+            return ORJSONResponse(
+                status_code=413,
+                content={"detail": f"File size exceeds limit of {settings.MAX_FILE_SIZE_MB}MB"}
+            )
+    return await call_next(request)
+
+# Validate configuration on startup (schema is created by `python -m app.cli init-db`)
 @app.on_event("startup")
 async def startup_event():
-    create_tables()
+    if settings.AUTO_CREATE_TABLES:
+        create_tables()
+    
+    # One response-cache client for the app's event loop, closed again at shutdown
+    await cache.open_client()
+    
+    # Create the upload directory once instead of on every upload
+    FileHandler.ensure_upload_directory()
     
     # Validate OpenAI API key is configured
     if not settings.OPENAI_API_KEY:
@@ -40,15 +100,17 @@ async def startup_event():
     
     # Test the API key validity
     try:
-        from app.services.transcription import get_transcription_service
-        service = get_transcription_service()
-        if service.validate_api_key():
+        if _api_key_is_valid():
             logger.info("✓ OpenAI API key is valid")
         else:
             logger.warning("⚠ OpenAI API key validation failed - please check your key")
     except Exception as e:
         logger.warning(f"⚠ Could not validate OpenAI API key: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await cache.close_client()
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """Serve the main web interface"""
@@ -70,9 +132,7 @@ async def health_check():
     
     if settings.OPENAI_API_KEY:
         try:
-            from app.services.transcription import get_transcription_service
-            service = get_transcription_service()
-            health_status["openai_api_key_valid"] = service.validate_api_key()
+            health_status["openai_api_key_valid"] = _api_key_is_valid()
         except Exception as e:
             health_status["openai_api_key_error"] = str(e)
     
@@ -88,28 +148,31 @@ async def upload_file(
     
     Returns a job ID that can be used to track processing status and retrieve results.
     """
-    logger.info(f"Upload request received for file: {file.filename}")
+    logger.info("Upload request received for file: %s", file.filename)
     
     try:
         # Validate file format
         FileHandler.validate_mp3_file(file)
-        logger.debug(f"File format validation passed for: {file.filename}")
+        logger.debug("File format validation passed for: %s", file.filename)
         
         # Validate file size
         FileHandler.validate_file_size(file)
-        logger.debug(f"File size validation passed for: {file.filename}")
+        logger.debug("File size validation passed for: %s", file.filename)
         
-        # Create job record in database
-        job = JobCRUD.create_job(db, filename=file.filename or "unknown.mp3")
-        logger.info(f"Created job {job.id} for file: {file.filename}")
+        # Reject non-MP3 content before anything is written to disk or the database
+        await FileHandler.validate_mp3_header(file)
+        
+        # Create job record in database without blocking the event loop
+        job = await run_in_threadpool(JobCRUD.create_job, db, filename=file.filename or "unknown.mp3")
+        logger.info("Created job %s for file: %s", job.id, file.filename)
         
         # Save uploaded file
-        file_path = FileHandler.save_uploaded_file(file, job.id)
-        logger.info(f"Saved file for job {job.id} at: {file_path}")
+        file_path, content_hash = await FileHandler.save_uploaded_file(file, job.id)
+        logger.info("Saved file for job %s at: %s", job.id, file_path)
         
         # Start asynchronous processing with Celery
-        task = process_audio_file.delay(job.id, file_path)
-        logger.info(f"Started processing task {task.id} for job {job.id}")
+        task = process_audio_file.delay(job.id, file_path, content_hash)
+        logger.info("Started processing task %s for job %s", task.id, job.id)
         
         return UploadResponse(
             job_id=job.id,
@@ -128,6 +191,135 @@ async def upload_file(
             detail=f"Failed to process upload: {str(e)}"
         )
 
+@app.post("/upload-stream", response_model=UploadResponse)
+async def upload_file_stream(
+    request: Request,
+    filename: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Upload an MP3 file sent as the raw request body (`?filename=` names the file).
+    
+    The body is streamed straight to the upload directory instead of being spooled by a
+    multipart parser first, so each byte is written to disk only once.
+    """
+    logger.info("Streaming upload request received for file: %s", filename)
+    
+    temp_path = None
+    try:
+        # Validate file name before reading the body
+        FileHandler.validate_mp3_filename(filename)
+        
+        # Stream body to a temporary file (validates size and MP3 signature on the fly);
+        # if streaming fails, stream_request_to_file has already removed it
+        part_path = FileHandler.partial_upload_path()
+        _, content_hash = await FileHandler.stream_request_to_file(request, part_path, filename)
+        temp_path = part_path
+        
+        # Create job record in database without blocking the event loop
+        job = await run_in_threadpool(JobCRUD.create_job, db, filename=filename)
+        logger.info("Created job %s for file: %s", job.id, filename)
+        
+        # Same-directory rename: no second copy of the data
+        file_path = FileHandler.job_file_path(job.id, filename)
+        os.replace(temp_path, file_path)
+        temp_path = None
+        logger.info("Saved file for job %s at: %s", job.id, file_path)
+        
+        # Start asynchronous processing with Celery
+        task = process_audio_file.delay(job.id, file_path, content_hash)
+        logger.info("Started processing task %s for job %s", task.id, job.id)
+        
+        return UploadResponse(
+            job_id=job.id,
+            status=job.status
+        )
+        
+    except HTTPException as e:
+        logger.warning(f"Streaming upload validation failed for {filename}: {e.detail}")
+        # Re-raise HTTP exceptions (validation errors)
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error during streaming upload for {filename}: {str(e)}")
+        # Handle unexpected errors
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to process upload: {str(e)}"
+        )
+    finally:
+        if temp_path:
+            FileHandler.cleanup_file(temp_path)
+
+@app.post("/upload-batch", response_model=BatchUploadResponse)
+async def upload_files_batch(
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload several MP3 files at once.
+    
+    All files are validated before any job is created, the jobs are inserted together,
+    and a single background task processes the whole batch.
+    """
+    logger.info("Batch upload request received for %s files", len(files))
+    
+    try:
+        if len(files) > settings.MAX_BATCH_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many files. At most {settings.MAX_BATCH_FILES} files can be uploaded at once."
+            )
+        
+        # Validate every file up front so a bad file rejects the batch before anything is stored
+        for file in files:
+            FileHandler.validate_mp3_file(file)
+            FileHandler.validate_file_size(file)
+            await FileHandler.validate_mp3_header(file)
+        
+        # Create all job records with one INSERT
+        filenames = [file.filename or "unknown.mp3" for file in files]
+        job_ids = await run_in_threadpool(JobCRUD.create_jobs_bulk, db, filenames)
+        logger.info("Created %s jobs for batch upload", len(job_ids))
+        
+        # Save uploaded files concurrently, each yielding (file_path, content_hash)
+        saved = await asyncio.gather(*(
+            FileHandler.save_uploaded_file(file, job_id)
+            for file, job_id in zip(files, job_ids)
+        ))
+        
+        # Dispatch the whole batch with a single broker round-trip
+        task = process_audio_batch.delay([
+            (job_id, file_path, content_hash)
+            for job_id, (file_path, content_hash) in zip(job_ids, saved)
+        ])
+        logger.info("Started batch task %s for %s jobs", task.id, len(job_ids))
+        
+        return BatchUploadResponse(
+            jobs=[UploadResponse(job_id=job_id, status="pending") for job_id in job_ids]
+        )
+        
+    except HTTPException as e:
+        logger.warning(f"Batch upload validation failed: {e.detail}")
+        # Re-raise HTTP exceptions (validation errors)
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error during batch upload: {str(e)}")
+        # Handle unexpected errors
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to process batch upload: {str(e)}"
+        )
+
+def _status_payload(job) -> dict:
+    """Build the /status response body for a job"""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "error_message": job.error_message
+    }
+
 @app.get("/status/{job_id}")
 async def get_status(job_id: str, db: Session = Depends(get_db)):
     """
@@ -135,11 +327,17 @@ async def get_status(job_id: str, db: Session = Depends(get_db)):
     
     Returns the current status of the processing job.
     """
-    logger.debug(f"Status request for job: {job_id}")
+    logger.debug("Status request for job: %s", job_id)
     
     try:
-        # Get job from database
-        job = JobCRUD.get_job(db, job_id)
+        # Finished jobs never change, so their status may already be cached
+        cached = await cache.get_cached_bytes(cache.status_key(job_id))
+        if cached is not None:
+            # Already-encoded JSON, so skip response serialization entirely
+            return Response(content=cached, media_type="application/json")
+        
+        # Get job status columns from database (off the event loop; the session is synchronous)
+        job = await run_in_threadpool(JobCRUD.get_job_status, db, job_id)
         
         if not job:
             logger.warning(f"Job not found: {job_id}")
@@ -148,15 +346,13 @@ async def get_status(job_id: str, db: Session = Depends(get_db)):
                 detail=f"Job with ID {job_id} not found"
             )
         
-        logger.debug(f"Job {job_id} status: {job.status}")
+        logger.debug("Job %s status: %s", job_id, job.status)
         
-        return {
-            "job_id": job.id,
-            "status": job.status,
-            "filename": job.filename,
-            "created_at": job.created_at.isoformat() if job.created_at else None,
-            "error_message": job.error_message
-        }
+        status = _status_payload(job)
+        if job.status in cache.TERMINAL_STATUSES:
+            await cache.set_cached_json(cache.status_key(job_id), status)
+        
+        return status
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -176,11 +372,17 @@ async def get_result(job_id: str, db: Session = Depends(get_db)):
     
     Returns the full transcription and summary if processing is complete.
     """
-    logger.debug(f"Result request for job: {job_id}")
+    logger.debug("Result request for job: %s", job_id)
     
     try:
-        # Get job from database
-        job = JobCRUD.get_job(db, job_id)
+        # Finished jobs never change, so their result may already be cached
+        cached = await cache.get_cached_bytes(cache.result_key(job_id))
+        if cached is not None:
+            # Already-encoded JSON, so skip response serialization entirely
+            return Response(content=cached, media_type="application/json")
+        
+        # Get job from database (off the event loop; the session is synchronous)
+        job = await run_in_threadpool(JobCRUD.get_job, db, job_id)
         
         if not job:
             logger.warning(f"Job not found for result request: {job_id}")
@@ -189,7 +391,7 @@ async def get_result(job_id: str, db: Session = Depends(get_db)):
                 detail=f"Job with ID {job_id} not found"
             )
         
-        logger.debug(f"Job {job_id} result status: {job.status}")
+        logger.debug("Job %s result status: %s", job_id, job.status)
         
         result = {
             "job_id": job.id,
@@ -199,7 +401,12 @@ async def get_result(job_id: str, db: Session = Depends(get_db)):
             "error_message": job.error_message
         }
         
-        logger.info(f"Returning result for job {job_id}: transcript length={len(job.transcription or '')}, summary length={len(job.summary or '')}")
+        logger.info("Returning result for job %s: transcript length=%s, summary length=%s", job_id, len(job.transcription or ''), len(job.summary or ''))
+        
+        if job.status in cache.TERMINAL_STATUSES:
+            # The full row is already loaded, so warm the status cache from the same query
+            await cache.set_cached_json(cache.result_key(job_id), result)
+            await cache.set_cached_json(cache.status_key(job_id), _status_payload(job))
         
         return result
         
@@ -212,4 +419,100 @@ async def get_result(job_id: str, db: Session = Depends(get_db)):
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get job result: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@app.get("/summary-stream/{job_id}")
+async def stream_summary(job_id: str, db: Session = Depends(get_db)):
+    """
+    Stream the summary of a job's transcript as plain text while it is generated.
+    
+    Jobs that already have a summary get it in one piece. A job waiting for its batch
+    summary (SUMMARY_BATCH_ENABLED) has it generated here instead: the job is claimed
+    first, so the batch flush skips it, and the streamed summary is stored on the job
+    when it completes. Jobs whose worker is still producing the summary get a 409
+    rather than a second, duplicate summarization of the same transcript.
+    """
+    logger.debug("Summary stream request for job: %s", job_id)
+    
+    try:
+        job = await run_in_threadpool(JobCRUD.get_job, db, job_id)
+    except Exception as e:
+        logger.error(f"Unexpected error getting job {job_id} for summary stream: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get job: {str(e)}"
+        )
+    
+    if not job:
+        logger.warning(f"Job not found for summary stream request: {job_id}")
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job with ID {job_id} not found"
+        )
+    
+    if job.summary:
+        return StreamingResponse(iter([job.summary]), media_type="text/plain; charset=utf-8")
+    
+    if not job.transcription:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Transcript for job {job_id} is not ready yet"
+        )
+    
+    if job.status == "failed":
+        raise HTTPException(
+            status_code=422,
+            detail=f"Job {job_id} failed, so no summary will be generated: {job.error_message}"
+        )
+    
+    # Take the job out of the batch queue (or find that a worker already has it)
+    claim = f"{SUMMARY_CLAIM_PREFIX}stream:{uuid.uuid4().hex}"
+    if job.status != "awaiting_summary" or not await run_in_threadpool(
+        JobCRUD.claim_job_awaiting_summary, db, job_id, claim
+    ):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Summary for job {job_id} is still being generated"
+        )
+    
+    def finish(summary_text: Optional[str] = None) -> None:
+        """Store the summary on the claimed job, or without one put the job back in the queue"""
+        try:
+            JobCRUD.finish_summary_claim(db, job_id, claim, summary_text)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to store streamed summary for job {job_id}: {str(e)}")
+    
+    try:
+        service = get_summarization_service()
+        # Validation runs before the response starts, so bad input is still a 400
+        summary = service.summarize_text_stream(job.transcription)
+        first = await run_in_threadpool(next, summary, "")
+    except ValueError as e:
+        await run_in_threadpool(finish)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        await run_in_threadpool(finish)
+        logger.error(f"Summary stream failed for job {job_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to summarize transcript: {str(e)}"
+        )
+    
+    def pieces():
+        parts = [first]
+        try:
+            yield first
+            for part in summary:
+                parts.append(part)
+                yield part
+        except BaseException:
+            # Failed or abandoned partway: leave the summary to the batch
+            finish()
+            raise
+        
+        # The whole summary was sent, so the job is done; keep it for later requests
+        finish("".join(parts))
+    
+    # Starlette iterates the synchronous generator on a worker thread
+    return StreamingResponse(pieces(), media_type="text/plain; charset=utf-8")
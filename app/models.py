@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
-from sqlalchemy import Column, String, Text, DateTime, create_engine
+from sqlalchemy import Column, String, Text, DateTime, Index, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import uuid
@@ -11,6 +11,9 @@ class UploadResponse(BaseModel):
     job_id: str
     status: str
 
+class BatchUploadResponse(BaseModel):
+    jobs: List[UploadResponse]
+
 class ProcessingResult(BaseModel):
     job_id: str
     status: str
@@ -25,13 +28,23 @@ class ErrorResponse(BaseModel):
 # SQLAlchemy setup
 Base = declarative_base()
 
+def generate_job_id() -> str:
+    """New job ID: 32 hex characters (a UUID4 without dashes) to keep keys short"""
+    return uuid.uuid4().hex
+
 class ProcessingJob(Base):
     __tablename__ = "processing_jobs"
+    __table_args__ = (
+        # Serves "jobs in state X, oldest first" lookups used by workers and pollers
+        Index("ix_jobs_status_created", "status", "created_at"),
+    )
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(String, primary_key=True, default=generate_job_id)
     filename = Column(String, nullable=False)
-    status = Column(String, nullable=False, default="pending")  # pending, processing, completed, failed
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, processing, awaiting_summary, summarizing, completed, failed
     transcription = Column(Text, nullable=True)
     summary = Column(Text, nullable=True)
     error_message = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+    batch_id = Column(String, nullable=True, index=True)  # OpenAI batch producing this job's summary
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 of the uploaded audio
\ No newline at end of file
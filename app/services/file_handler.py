@@ -1,13 +1,69 @@
 import os
-import shutil
+import uuid
+import mmap
+import hashlib
 import logging
-from typing import Tuple
-from fastapi import UploadFile, HTTPException
+from functools import lru_cache
+from typing import BinaryIO, Optional, Tuple
+import aiofiles
+from fastapi import UploadFile, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Read uploads in 1 MiB chunks so the event loop is released between writes
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Per-syscall request size for in-kernel copies (the kernel may copy less per call)
+ZERO_COPY_CHUNK_SIZE = 1 << 30
+
+# Enough leading bytes to recognise an ID3 tag or an MPEG frame header
+MP3_HEADER_PEEK_BYTES = 10
+
+MP3_EXTENSION = ".mp3"
+
+# MIME types accepted without further inspection
+ALLOWED_MP3_CONTENT_TYPES = frozenset({'application/octet-stream', 'audio/mpeg', 'audio/mp3'})
+
+# Set once the upload directory has been created, normally by the app's startup hook
+_upload_dir_ready = False
+
+
+def _sha256_of_open_file(f: BinaryIO, size: int) -> str:
+    """SHA-256 of an open binary file from offset 0, memory-mapped when possible"""
+    if size > 0:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return hashlib.sha256(mapped).hexdigest()
+        except (OSError, ValueError) as e:
+            logger.debug("mmap unavailable for %s, hashing with reads: %s", getattr(f, "name", f), e)
+    
+    f.seek(0)
+    if hasattr(hashlib, "file_digest"):
+        return hashlib.file_digest(f, "sha256").hexdigest()
+    
+    # Python < 3.11
+    digest = hashlib.sha256()
+    while chunk := f.read(UPLOAD_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=128)
+def _sha256_of_file(file_path: str, size: int, mtime_ns: int) -> str:
+    """
+    Hash a file without copying its bytes into Python objects.
+    
+    The file is memory-mapped and handed to OpenSSL in one call (which releases the GIL
+    and uses SHA extensions where the CPU has them). Empty or unmappable files fall back
+    to hashlib.file_digest / 1 MiB reads. size and mtime_ns only key the memo, so a
+    changed file is re-hashed.
+    """
+    with open(file_path, "rb") as f:
+        return _sha256_of_open_file(f, size)
+
 
 class FileHandler:
     """Handles file upload validation and storage"""
@@ -15,19 +71,14 @@ class FileHandler:
     @staticmethod
     def validate_mp3_file(file: UploadFile) -> None:
         """Validate that the uploaded file is a valid MP3 file"""
-        logger.debug(f"Validating MP3 file: {file.filename}, content_type: {file.content_type}")
+        logger.debug("Validating MP3 file: %s, content_type: %s", file.filename, file.content_type)
         
         # Check file extension
-        if not file.filename or not file.filename.lower().endswith('.mp3'):
-            logger.warning(f"Invalid file extension for file: {file.filename}")
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid file format. Only MP3 files are allowed."
-            )
+        FileHandler.validate_mp3_filename(file.filename)
         
         # Check content type (allow if not specified or if it's audio)
         # Some browsers/clients might not send correct MIME type
-        if file.content_type and file.content_type not in ['application/octet-stream', 'audio/mpeg', 'audio/mp3']:
+        if file.content_type and file.content_type not in ALLOWED_MP3_CONTENT_TYPES:
             # Only reject if it's clearly not an audio file
             if not file.content_type.startswith('audio/') and file.content_type != 'application/octet-stream':
                 logger.warning(f"Invalid content type for file {file.filename}: {file.content_type}")
@@ -36,30 +87,92 @@ class FileHandler:
                     detail="Invalid file type. Only audio files are allowed."
                 )
         
-        logger.debug(f"MP3 file validation passed for: {file.filename}")
+        logger.debug("MP3 file validation passed for: %s", file.filename)
+    
+    @staticmethod
+    def validate_mp3_filename(filename: Optional[str]) -> None:
+        """Validate that a filename has an .mp3 extension"""
+        # Only the suffix is lowercased, not the whole name
+        name = filename or ""
+        if name[-len(MP3_EXTENSION):].lower() != MP3_EXTENSION:
+            logger.warning(f"Invalid file extension for file: {filename}")
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid file format. Only MP3 files are allowed."
+            )
+    
+    @staticmethod
+    async def validate_mp3_header(file: UploadFile) -> None:
+        """
+        Check the leading bytes for an MP3 signature before the upload is stored.
+        
+        Accepts an ID3v2 tag or an MPEG audio frame sync word (11 set bits), then
+        rewinds the file so the full content can still be saved.
+        
+        Raises:
+            HTTPException: 400 if the file is empty or does not look like MP3 data
+        """
+        head = await file.read(MP3_HEADER_PEEK_BYTES)
+        await file.seek(0)
+        FileHandler._check_mp3_signature(head, file.filename)
+    
+    @staticmethod
+    def _check_mp3_signature(head: bytes, filename: Optional[str]) -> None:
+        """Raise HTTP 400 unless head is the start of an ID3-tagged or raw MPEG audio stream"""
+        if not head:
+            logger.warning(f"Empty file uploaded: {filename}")
+            raise HTTPException(
+                status_code=400,
+                detail="Uploaded file is empty."
+            )
+        
+        is_id3 = head.startswith(b"ID3")
+        is_mpeg_frame = len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0
+        if not (is_id3 or is_mpeg_frame):
+            logger.warning(f"File {filename} does not start with an MP3 signature")
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid file format. File content is not MP3 audio."
+            )
+        
+        logger.debug("MP3 header check passed for: %s", filename)
     
     @staticmethod
     def validate_file_size(file: UploadFile) -> None:
         """Validate file size against configured limits"""
+        max_bytes = settings.MAX_FILE_SIZE_BYTES
         if file.size:
             size_mb = file.size / (1024 * 1024)
-            logger.debug(f"File {file.filename} size: {size_mb:.2f}MB")
+            logger.debug("File %s size: %.2fMB", file.filename, size_mb)
             
-            if file.size > settings.MAX_FILE_SIZE_MB * 1024 * 1024:
+            if file.size > max_bytes:
                 logger.warning(f"File {file.filename} exceeds size limit: {size_mb:.2f}MB > {settings.MAX_FILE_SIZE_MB}MB")
                 raise HTTPException(
                     status_code=413,
                     detail=f"File size exceeds limit of {settings.MAX_FILE_SIZE_MB}MB"
                 )
         else:
-            logger.debug(f"File {file.filename} size not provided by client")
+            logger.debug("File %s size not provided by client", file.filename)
+    
+    @staticmethod
+    def compute_sha256(file_path: str) -> str:
+        """
+        SHA-256 hex digest of a file's contents, used as its cache identity.
+        
+        Results are memoized per (path, size, mtime), so the worker and the
+        transcription cache can both ask for a file's hash without reading it twice.
+        """
+        stat = os.stat(file_path)
+        return _sha256_of_file(file_path, stat.st_size, stat.st_mtime_ns)
     
     @staticmethod
     def ensure_upload_directory() -> None:
         """Ensure the upload directory exists"""
+        global _upload_dir_ready
         try:
             os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-            logger.debug(f"Upload directory ensured: {settings.UPLOAD_DIR}")
+            _upload_dir_ready = True
+            logger.debug("Upload directory ensured: %s", settings.UPLOAD_DIR)
         except Exception as e:
             logger.error(f"Failed to create upload directory {settings.UPLOAD_DIR}: {str(e)}")
             raise HTTPException(
@@ -68,28 +181,203 @@ class FileHandler:
             )
     
     @staticmethod
-    def save_uploaded_file(file: UploadFile, job_id: str) -> str:
-        """Save uploaded file to temporary directory and return file path"""
-        FileHandler.ensure_upload_directory()
+    def _is_disk_backed(src: BinaryIO) -> bool:
+        """Check whether a (spooled) upload file has been rolled over to a real file on disk"""
+        if getattr(src, "_rolled", True) is False:
+            return False
+        try:
+            src.fileno()
+        except (AttributeError, OSError, ValueError):
+            return False
+        return True
+    
+    @staticmethod
+    def _copy_disk_backed(src: BinaryIO, file_path: str) -> str:
+        """
+        Copy a disk-backed upload to file_path without routing the data through Python,
+        returning the SHA-256 of its contents.
         
+        Tries os.copy_file_range (in-kernel, can share extents on CoW filesystems), then
+        os.sendfile, and finally a readinto loop over a reused 1 MiB buffer. Every strategy
+        copies from offset 0, so a fallback simply overwrites a partial earlier attempt.
+        After an in-kernel copy the source is hashed through mmap from the page cache;
+        the readinto loop hashes each buffer as it writes it.
+        """
+        src.flush()
+        src_fd = src.fileno()
+        dst_fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            for strategy in (FileHandler._copy_with_copy_file_range, FileHandler._copy_with_sendfile):
+                try:
+                    strategy(src_fd, dst_fd)
+                    return _sha256_of_open_file(src, os.fstat(src_fd).st_size)
+                except (AttributeError, OSError) as e:
+                    # Syscall missing on this platform or unsupported for these files (EXDEV, ENOSYS, EINVAL...)
+                    logger.debug("%s unavailable for %s: %s", strategy.__name__, file_path, e)
+            
+            return FileHandler._copy_with_readinto(src, dst_fd)
+        finally:
+            os.close(dst_fd)
+    
+    @staticmethod
+    def _copy_with_copy_file_range(src_fd: int, dst_fd: int) -> None:
+        """Copy src_fd to dst_fd entirely inside the kernel with copy_file_range"""
+        offset = 0
+        while True:
+            copied = os.copy_file_range(src_fd, dst_fd, ZERO_COPY_CHUNK_SIZE, offset, offset)
+            if copied == 0:
+                break
+            offset += copied
+    
+    @staticmethod
+    def _copy_with_sendfile(src_fd: int, dst_fd: int) -> None:
+        """Copy src_fd to dst_fd with sendfile (page-cache to page-cache)"""
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        offset = 0
+        while True:
+            sent = os.sendfile(dst_fd, src_fd, offset, ZERO_COPY_CHUNK_SIZE)
+            if sent == 0:
+                break
+            offset += sent
+    
+    @staticmethod
+    def _copy_with_readinto(src: BinaryIO, dst_fd: int) -> str:
+        """
+        Buffered fallback copy that reuses a single 1 MiB buffer instead of allocating per chunk,
+        hashing each buffer in the same pass; returns the SHA-256 hex digest
+        """
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        src.seek(0)
+        digest = hashlib.sha256()
+        buffer = bytearray(UPLOAD_CHUNK_SIZE)
+        view = memoryview(buffer)
+        while True:
+            read = src.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+            written = 0
+            while written < read:
+                written += os.write(dst_fd, view[written:read])
+        return digest.hexdigest()
+    
+    @staticmethod
+    def job_file_path(job_id: str, original_filename: Optional[str]) -> str:
+        """Storage path for a job's upload, keeping the original extension"""
         # Create unique filename using job_id
-        file_extension = os.path.splitext(file.filename)[1] if file.filename else '.mp3'
-        filename = f"{job_id}{file_extension}"
-        file_path = os.path.join(settings.UPLOAD_DIR, filename)
+        file_extension = os.path.splitext(original_filename)[1] if original_filename else '.mp3'
+        return os.path.join(settings.UPLOAD_DIR, f"{job_id}{file_extension}")
+    
+    @staticmethod
+    def partial_upload_path() -> str:
+        """Unique temporary path in the upload directory for a body that is still streaming in"""
+        if not _upload_dir_ready:
+            FileHandler.ensure_upload_directory()
+        return os.path.join(settings.UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    
+    @staticmethod
+    async def stream_request_to_file(request: Request, file_path: str, filename: Optional[str] = None) -> Tuple[int, str]:
+        """
+        Write a raw request body straight to file_path without spooling it first.
         
-        logger.info(f"Saving uploaded file for job {job_id} to: {file_path}")
+        The body is written in 1 MiB batches, checked for an MP3 signature as soon as
+        its first bytes arrive, and cut off with 413 once it exceeds the size limit.
+        It is hashed as it arrives, so the file never has to be read back.
+        The partial file is removed if anything goes wrong.
+        
+        Args:
+            request: Request whose body is the uploaded file
+            file_path: Server-side path to write the body to
+            filename: Client file name, used in signature warnings
+        
+        Returns:
+            Tuple[int, str]: Number of bytes written and their SHA-256 hex digest
+            
+        Raises:
+            HTTPException: 400 for empty or non-MP3 content, 413 for oversized bodies
+        """
+        max_bytes = settings.MAX_FILE_SIZE_BYTES
+        total = 0
+        head = b""
+        pending = bytearray()
+        digest = hashlib.sha256()
+        
+        try:
+            async with aiofiles.open(file_path, "wb") as buffer:
+                async for chunk in request.stream():
+                    if not chunk:
+                        continue
+                    
+                    if len(head) < MP3_HEADER_PEEK_BYTES:
+                        head += chunk[:MP3_HEADER_PEEK_BYTES - len(head)]
+                        if len(head) == MP3_HEADER_PEEK_BYTES:
+                            FileHandler._check_mp3_signature(head, filename)
+                    
+                    total += len(chunk)
+                    if total > max_bytes:
+                        logger.warning(f"Streamed upload exceeds size limit of {settings.MAX_FILE_SIZE_MB}MB")
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File size exceeds limit of {settings.MAX_FILE_SIZE_MB}MB"
+                        )
+                    
+                    digest.update(chunk)
+                    pending += chunk
+                    if len(pending) >= UPLOAD_CHUNK_SIZE:
+                        await buffer.write(pending)
+                        pending.clear()
+                
+                if pending:
+                    await buffer.write(pending)
+            
+            # Bodies shorter than the peek size (including empty ones) are checked here
+            if len(head) < MP3_HEADER_PEEK_BYTES:
+                FileHandler._check_mp3_signature(head, filename)
+            
+        except BaseException:
+            FileHandler.cleanup_file(file_path)
+            raise
+        
+        logger.info("Streamed %s bytes to: %s", total, file_path)
+        return total, digest.hexdigest()
+    
+    @staticmethod
+    async def save_uploaded_file(file: UploadFile, job_id: str) -> Tuple[str, str]:
+        """
+        Stream uploaded file to temporary directory in chunks.
+        
+        The content is hashed in the same pass that writes it, for the job's content_hash.
+        
+        Returns:
+            Tuple[str, str]: The stored file path and the SHA-256 hex digest of its contents
+        """
+        # Created at startup; only contexts that skipped it (e.g. tests) pay for the mkdir
+        if not _upload_dir_ready:
+            FileHandler.ensure_upload_directory()
+        
+        file_path = FileHandler.job_file_path(job_id, file.filename)
+        
+        logger.info("Saving uploaded file for job %s to: %s", job_id, file_path)
         
         # Save file
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            if FileHandler._is_disk_backed(file.file):
+                # Spooled upload already lives in a temp file; let the kernel copy it
+                content_hash = await run_in_threadpool(FileHandler._copy_disk_backed, file.file, file_path)
+            else:
+                digest = hashlib.sha256()
+                async with aiofiles.open(file_path, "wb") as buffer:
+                    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                        digest.update(chunk)
+                        await buffer.write(chunk)
+                content_hash = digest.hexdigest()
             
             # Verify file was saved successfully
             if not os.path.exists(file_path):
                 raise Exception("File was not saved successfully")
             
             file_size = os.path.getsize(file_path)
-            logger.info(f"Successfully saved file for job {job_id}: {file_path} ({file_size} bytes)")
+            logger.info("Successfully saved file for job %s: %s (%s bytes)", job_id, file_path, file_size)
             
         except PermissionError as e:
             logger.error(f"Permission denied saving file for job {job_id}: {str(e)}")
@@ -110,7 +398,7 @@ class FileHandler:
                 detail=f"Failed to save file: {str(e)}"
             )
         
-        return file_path
+        return file_path, content_hash
     
     @staticmethod
     def cleanup_file(file_path: str) -> bool:
@@ -124,13 +412,12 @@ class FileHandler:
             bool: True if cleanup was successful, False otherwise
         """
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Successfully cleaned up file: {file_path}")
-                return True
-            else:
-                logger.warning(f"File not found for cleanup: {file_path}")
-                return False
+            os.remove(file_path)
+            logger.info(f"Successfully cleaned up file: {file_path}")
+            return True
+        except FileNotFoundError:
+            logger.warning(f"File not found for cleanup: {file_path}")
+            return False
         except PermissionError as e:
             logger.error(f"Permission denied cleaning up file {file_path}: {str(e)}")
             return False
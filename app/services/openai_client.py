@@ -0,0 +1,216 @@
+import os
+import time
+import logging
+import threading
+import importlib.util
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypeVar
+from functools import lru_cache
+import httpx
+from openai import APIConnectionError, DefaultHttpxClient, InternalServerError, RateLimitError
+from tenacity import RetryCallState, Retrying, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Transient failures worth retrying (timeouts are connection errors); auth, validation and
+# payload-size errors are not
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+# Upper bound for a single backoff, including server-requested Retry-After delays
+MAX_RETRY_WAIT = 60  # Seconds
+
+# Share of the configured OPENAI_RPM/OPENAI_TPM actually used, leaving headroom for estimate errors
+RATE_LIMIT_SAFETY_MARGIN = 0.9
+
+# Per-request limits, so a hung connection fails (and is retried) instead of stalling a worker
+# thread for the SDK's 10 minute default. Reads wait for Whisper/GPT to finish processing.
+OPENAI_TIMEOUT = httpx.Timeout(connect=5.0, read=settings.OPENAI_READ_TIMEOUT, write=60.0, pool=5.0)
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """
+    Get the process-wide HTTP client shared by all OpenAI SDK clients.
+    
+    Reusing one connection pool keeps TLS connections to the API warm across
+    requests and tasks instead of handshaking for every new service instance.
+    SDK clients built on it inherit its OPENAI_TIMEOUT.
+    """
+    logger.debug(f"Creating shared OpenAI HTTP client (http2={HTTP2_AVAILABLE})")
+    return DefaultHttpxClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=OPENAI_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+
+
+@lru_cache(maxsize=1)
+def _get_call_semaphore() -> threading.BoundedSemaphore:
+    """Process-wide limit on in-flight OpenAI requests across all worker threads"""
+    return threading.BoundedSemaphore(settings.OPENAI_MAX_CONCURRENCY)
+
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, shared by the threads of one process.
+    
+    acquire() blocks until both buckets can cover a call, so bursts are spread out
+    before they reach the API instead of being rejected with 429s and backed off.
+    A limit of 0 is not enforced.
+    """
+    
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = requests_per_minute
+        self._tokens = tokens_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Wait until a request using about tokens tokens fits both budgets, then spend them.
+        
+        Returns:
+            float: Seconds spent waiting
+        """
+        # A request larger than the whole token budget waits for a full bucket
+        tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+        waited = 0.0
+        
+        while True:
+            with self._lock:
+                self._refill()
+                wait = 0.0
+                if self.requests_per_minute and self._requests < 1:
+                    wait = (1 - self._requests) * 60 / self.requests_per_minute
+                if tokens and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+                
+                if not wait:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return waited
+            
+            time.sleep(wait)
+            waited += wait
+    
+    def _refill(self) -> None:
+        """Top both buckets up for the time since the last call, to at most one minute's worth"""
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+
+@lru_cache(maxsize=1)
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Process-wide limiter for OPENAI_RPM/OPENAI_TPM, or None when neither is set"""
+    if settings.OPENAI_RPM <= 0 and settings.OPENAI_TPM <= 0:
+        return None
+    return RateLimiter(
+        max(settings.OPENAI_RPM, 0) * RATE_LIMIT_SAFETY_MARGIN,
+        max(settings.OPENAI_TPM, 0) * RATE_LIMIT_SAFETY_MARGIN
+    )
+
+
+@contextmanager
+def openai_call_slot() -> Iterator[None]:
+    """
+    Hold one of the OPENAI_MAX_CONCURRENCY request slots for the duration of an API call.
+    
+    Lets a threaded worker run many jobs at once while keeping the number of
+    simultaneous requests under the account's rate limits.
+    """
+    with _get_call_semaphore():
+        yield
+
+
+def _retry_after_seconds(error: Optional[BaseException]) -> Optional[float]:
+    """Delay requested by the server through retry-after-ms / retry-after headers, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        # HTTP-date form of Retry-After; fall back to exponential backoff
+        return None
+    return None
+
+
+_exponential_wait = wait_exponential_jitter(initial=1, max=MAX_RETRY_WAIT)
+
+
+def _wait_for_retry(retry_state: RetryCallState) -> float:
+    """Exponential backoff with jitter, stretched to honour the server's Retry-After"""
+    wait = _exponential_wait(retry_state)
+    retry_after = _retry_after_seconds(retry_state.outcome.exception())
+    if retry_after is not None:
+        wait = max(wait, min(retry_after, MAX_RETRY_WAIT))
+    return wait
+
+
+def _log_retry(retry_state: RetryCallState) -> None:
+    error = retry_state.outcome.exception()
+    logger.warning(
+        f"OpenAI request failed (attempt {retry_state.attempt_number}/{settings.OPENAI_MAX_ATTEMPTS}), "
+        f"retrying in {retry_state.next_action.sleep:.1f}s: {str(error)}"
+    )
+
+
+def call_openai(request: Callable[[], T], estimated_tokens: int = 0) -> T:
+    """
+    Run an OpenAI SDK call under the concurrency cap, retrying transient failures.
+    
+    Each attempt first waits for room under OPENAI_RPM/OPENAI_TPM, charging
+    estimated_tokens against the token budget, so sustained load is paced instead
+    of running into 429s.
+    
+    Rate limits, connection errors and 5xx responses are retried with exponential
+    backoff and jitter (at least as long as any Retry-After header asks for), up to
+    OPENAI_MAX_ATTEMPTS attempts; other errors propagate immediately. The request slot
+    is released while waiting, so backoff does not block other jobs.
+    """
+    retrying = Retrying(
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        wait=_wait_for_retry,
+        stop=stop_after_attempt(settings.OPENAI_MAX_ATTEMPTS),
+        before_sleep=_log_retry,
+        reraise=True
+    )
+    limiter = get_rate_limiter()
+    for attempt in retrying:
+        with attempt:
+            if limiter is not None:
+                limiter.acquire(estimated_tokens)
+            with openai_call_slot():
+                return request()
+
+
+def _reset_after_fork() -> None:
+    """Forked children get their own sockets, an unheld semaphore and fresh rate budgets"""
+    get_http_client.cache_clear()
+    _get_call_semaphore.cache_clear()
+    get_rate_limiter.cache_clear()
+
+
+# Sockets and locks must not be shared with forked children (e.g. Celery prefork workers)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,11 +1,56 @@
+import os
+import hashlib
 import logging
-from typing import Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import orjson
 from openai import OpenAI
+from app import cache
 from app.config import settings
+from app.services.openai_client import call_openai, get_http_client
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts are estimated from character length without it
+    tiktoken = None
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Bump whenever the prompt or generation parameters change, so cached summaries are not reused
+SUMMARY_PROMPT_VERSION = "v2"
+
+# Fixed text that starts every summarization request. OpenAI caches repeated prompt prefixes
+# server-side, so these must stay byte-identical across calls with the transcript after them.
+SYSTEM_PROMPT = "You are a helpful assistant that creates concise, accurate summaries of text content."
+PROMPT_PREFIX = (
+    "Please provide a concise summary of the following text. Focus on capturing the main points, "
+    "key ideas, and important details. The summary should be clear, well-organized, and significantly "
+    "shorter than the original text while preserving the essential information."
+)
+
+# Batch API endpoint used for summaries, and batch states after which no more results arrive
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_FINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+# Rough characters per token, used when tiktoken (or its encoding data) is unavailable
+CHARS_PER_TOKEN_ESTIMATE = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Tokenizer for model, or None if tiktoken or its encoding files can't be loaded"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails offline
+        logger.warning(f"Could not load tiktoken encoding for {model}, estimating tokens instead: {str(e)}")
+        return None
+
 class SummarizationService:
     """Service for summarizing text using OpenAI GPT API"""
     
@@ -14,17 +59,30 @@ class SummarizationService:
         if not settings.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Retries are handled by call_openai, which also honours Retry-After
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY, http_client=get_http_client(), max_retries=0)
         
         # Configuration for summarization
         self.min_text_length = 50  # Minimum characters for summarization
-        self.max_text_length = 100000  # Maximum characters to avoid token limits
+        self.max_text_length = 2000000  # Maximum characters, bounding the cost of one job
+        self.passthrough_length = 300  # Shorter texts are returned as their own summary
         self.model = "gpt-3.5-turbo"  # Default model for summarization
+        
+        # Longer texts are split into overlapping windows, summarized in parallel and combined
+        self.chunk_tokens = 3000
+        self.chunk_overlap_tokens = 200
+        
+        # Futures for summaries being generated right now, by cache key
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
     
     def summarize_text(self, text: str) -> str:
         """
         Generate a summary of the provided text using OpenAI GPT API.
         
+        Text longer than one chunk is summarized map-reduce style: each chunk is
+        summarized in parallel, then the partial summaries are combined.
+        
         Args:
             text: The text to summarize
             
@@ -35,85 +93,569 @@ class SummarizationService:
             ValueError: If the text is too short or too long for summarization
             Exception: For API failures or other summarization errors
         """
-        # Basic text length validation
-        if not text or not text.strip():
-            raise ValueError("Text cannot be empty")
+        text = self.validate_text(text)
         
-        text = text.strip()
+        # A summary would be about as long as the text itself, so skip the API call
+        if len(text) < self.passthrough_length:
+            logger.info(f"Text of length {len(text)} is short enough to be its own summary")
+            return text
         
-        if len(text) < self.min_text_length:
-            raise ValueError(f"Text is too short for summarization (minimum {self.min_text_length} characters)")
+        # Identical transcripts (re-uploads, duplicates) reuse the earlier summary
+        cache_key = self._summary_cache_key(text)
+        cached = self._cached_summary(cache_key)
+        if cached is not None:
+            logger.info(f"Using cached summary for text of length: {len(text)}")
+            return cached
         
-        if len(text) > self.max_text_length:
-            raise ValueError(f"Text is too long for summarization (maximum {self.max_text_length} characters)")
+        # Duplicates that arrive while the first is still being summarized (before it is
+        # cached) wait for its result instead of making the same API calls again
+        with self._inflight_lock:
+            pending = self._inflight.get(cache_key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[cache_key] = Future()
+        
+        if not leader:
+            logger.info(f"Waiting for in-flight summary of identical text of length: {len(text)}")
+            return pending.result()
         
+        try:
+            summary = self._generate_summary(text, cache_key)
+            pending.set_result(summary)
+            return summary
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[cache_key]
+    
+    def _generate_summary(self, text: str, cache_key: str) -> str:
+        """Summarize validated text through the API and cache the result under cache_key"""
         try:
             logger.info(f"Starting summarization for text of length: {len(text)}")
             
-            # Create a simple but effective prompt for summarization
-            prompt = self._create_summarization_prompt(text)
-            
             # Generate summary using OpenAI GPT API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that creates concise, accurate summaries of text content."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=500,  # Limit summary length
-                temperature=0.3  # Lower temperature for more focused summaries
-            )
-            
-            summary = response.choices[0].message.content.strip()
+            summary = self._summarize_chunked(text)
             
             if not summary:
                 logger.warning("Empty summary generated")
                 return "Unable to generate summary - no content returned."
             
             logger.info("Summarization completed successfully")
+            
+            self._store_summary(cache_key, summary)
             return summary
             
         except Exception as e:
             logger.error(f"Summarization failed: {str(e)}")
+            raise self._summarization_error(e)
+    
+    def summarize_text_stream(self, text: str) -> Iterator[str]:
+        """
+        Generate a summary like summarize_text, yielding it piece by piece as the API produces it.
+        
+        Passthrough texts and cached summaries are yielded whole. Texts that need
+        chunking are summarized map-reduce style and yielded once combined, since
+        nothing of the final summary exists before then.
+        
+        Args:
+            text: The text to summarize
+            
+        Yields:
+            str: Consecutive pieces of the summary
+            
+        Raises:
+            ValueError: If the text is too short or too long for summarization
+            Exception: For API failures or other summarization errors
+        """
+        text = self.validate_text(text)
+        
+        if len(text) < self.passthrough_length or not self.fits_single_request(text):
+            yield self.summarize_text(text)
+            return
+        
+        cache_key = self._summary_cache_key(text)
+        cached = self._cached_summary(cache_key)
+        if cached is not None:
+            logger.info(f"Using cached summary for text of length: {len(text)}")
+            yield cached
+            return
+        
+        try:
+            logger.info(f"Starting streamed summarization for text of length: {len(text)}")
+            
+            params = self._completion_params(text)
+            # Retries cover opening the stream; a failure partway through is raised to the reader
+            stream = call_openai(
+                lambda: self.client.chat.completions.create(**params, stream=True),
+                estimated_tokens=self._estimate_tokens(params)
+            )
             
-            # Handle specific OpenAI API errors
-            if hasattr(e, 'response') and hasattr(e.response, 'status_code'):
-                status_code = e.response.status_code
-                if status_code == 401:
-                    raise Exception("Invalid OpenAI API key")
-                elif status_code == 429:
-                    raise Exception("OpenAI API rate limit exceeded. Please try again later.")
-                elif status_code == 413:
-                    raise Exception("Text is too large for processing")
-                elif status_code >= 500:
-                    raise Exception("OpenAI API service is temporarily unavailable")
-            
-            # Re-raise the original exception if it's not an API error
-            raise Exception(f"Summarization failed: {str(e)}")
+            pieces = []
+            for chunk in stream:
+                piece = chunk.choices[0].delta.content if chunk.choices else None
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+            
+            summary = "".join(pieces).strip()
+            if not summary:
+                logger.warning("Empty summary generated")
+                yield "Unable to generate summary - no content returned."
+                return
+            
+            logger.info("Streamed summarization completed successfully")
+            self._store_summary(cache_key, summary)
+            
+        except Exception as e:
+            logger.error(f"Summarization failed: {str(e)}")
+            raise self._summarization_error(e)
+    
+    @staticmethod
+    def _summarization_error(e: Exception) -> Exception:
+        """The exception to raise to callers for a failed summarization"""
+        # Handle specific OpenAI API errors
+        if hasattr(e, 'response') and hasattr(e.response, 'status_code'):
+            status_code = e.response.status_code
+            if status_code == 401:
+                return Exception("Invalid OpenAI API key")
+            elif status_code == 429:
+                return Exception("OpenAI API rate limit exceeded. Please try again later.")
+            elif status_code == 413:
+                return Exception("Text is too large for processing")
+            elif status_code >= 500:
+                return Exception("OpenAI API service is temporarily unavailable")
+        
+        # Wrap the original exception if it's not an API error
+        return Exception(f"Summarization failed: {str(e)}")
+    
+    def summarize_texts(self, texts: List[str], max_concurrency: Optional[int] = None) -> List[Union[str, Exception]]:
+        """
+        Summarize several texts concurrently.
+        
+        Each text goes through summarize_text on a worker thread, so N independent
+        requests take about as long as the slowest one instead of their sum.
+        
+        Args:
+            texts: The texts to summarize
+            max_concurrency: Texts summarized at once; defaults to OPENAI_MAX_CONCURRENCY,
+                which also caps the requests in flight across the whole process
+        
+        Returns:
+            List[Union[str, Exception]]: Per text, in order, its summary or the exception
+            summarize_text raised for it
+        """
+        if not texts:
+            return []
+        
+        def summarize(text: str) -> Union[str, Exception]:
+            try:
+                return self.summarize_text(text)
+            except Exception as e:
+                return e
+        
+        workers = min(len(texts), max_concurrency or settings.OPENAI_MAX_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(summarize, texts))
+    
+    def summarize_texts_packed(self, texts: List[str], pack: int = 8) -> List[Union[str, Exception]]:
+        """
+        Summarize several short texts with as few requests as possible.
+        
+        Up to pack texts share one chat completion that returns their summaries as JSON,
+        as long as together they still fit a single request. Like summarize_text, texts
+        already in the summary cache (or being summarized elsewhere) aren't sent, identical
+        texts are sent once, and packed summaries are cached. Texts too long to share a
+        request, and any that a packed response leaves out, go through summarize_text.
+        
+        Args:
+            texts: The texts to summarize
+            pack: Most texts summarized by one request
+            
+        Returns:
+            List[Union[str, Exception]]: Per text, in order, its summary or the exception
+            raised for it
+        """
+        results: List[Union[str, Exception, None]] = [None] * len(texts)
+        packs: List[List[Tuple[int, str]]] = []
+        current: List[Tuple[int, str]] = []
+        # Texts this call summarizes, by cache key: the first index with that text and the
+        # Future that identical summarize_text calls wait on meanwhile
+        owned: Dict[str, Tuple[int, Future]] = {}
+        duplicates: Dict[int, str] = {}
+        
+        for index, text in enumerate(texts):
+            try:
+                text = self.validate_text(text)
+            except ValueError as e:
+                results[index] = e
+                continue
+            
+            # Same shortcut as summarize_text; long texts are left for it to chunk
+            if len(text) < self.passthrough_length:
+                results[index] = text
+                continue
+            if not self.fits_single_request(text):
+                continue
+            
+            cache_key = self._summary_cache_key(text)
+            if cache_key in owned:
+                duplicates[index] = cache_key
+                continue
+            cached = self._cached_summary(cache_key)
+            if cached is not None:
+                results[index] = cached
+                continue
+            with self._inflight_lock:
+                if cache_key in self._inflight:
+                    # summarize_text below waits for the summary being generated
+                    continue
+                pending = self._inflight[cache_key] = Future()
+            owned[cache_key] = (index, pending)
+            
+            if current and (
+                len(current) >= pack
+                or not self.fits_single_request(self._create_packed_prompt([t for _, t in current] + [text]))
+            ):
+                packs.append(current)
+                current = []
+            current.append((index, text))
+        
+        if current:
+            packs.append(current)
+        
+        try:
+            for members in packs:
+                for index, summary in self._summarize_pack(members).items():
+                    results[index] = summary
+        finally:
+            # Let summarize_text take over the texts the packs left out
+            with self._inflight_lock:
+                for cache_key in owned:
+                    del self._inflight[cache_key]
+        
+        leftover = [
+            index for index, result in enumerate(results)
+            if result is None and index not in duplicates
+        ]
+        try:
+            for index, outcome in zip(leftover, self.summarize_texts([texts[index] for index in leftover])):
+                results[index] = outcome
+        finally:
+            for cache_key, (index, pending) in owned.items():
+                outcome = results[index]
+                if isinstance(outcome, str):
+                    self._store_summary(cache_key, outcome)
+                    pending.set_result(outcome)
+                else:
+                    pending.set_exception(outcome or Exception("Summarization failed"))
+        
+        for index, cache_key in duplicates.items():
+            results[index] = results[owned[cache_key][0]]
+        
+        return results
+    
+    def _summarize_pack(self, members: List[Tuple[int, str]]) -> Dict[int, str]:
+        """Summarize (index, text) pairs in one request; returns the summaries it got back by index"""
+        params = self._chat_params(self._create_packed_prompt([text for _, text in members]))
+        params["max_tokens"] *= len(members)
+        params["response_format"] = {"type": "json_object"}
+        
+        try:
+            entries = orjson.loads(self._complete(params))["summaries"]
+            by_number = {int(entry["document"]): str(entry["summary"]).strip() for entry in entries}
+        except Exception as e:
+            logger.warning(f"Packed summarization of {len(members)} texts failed, summarizing them one by one: {str(e)}")
+            return {}
+        
+        logger.info(f"Summarized {len(by_number)} of {len(members)} texts in one request")
+        return {
+            index: by_number[number]
+            for number, (index, _) in enumerate(members, start=1)
+            if by_number.get(number)
+        }
+    
+    def validate_text(self, text: str) -> str:
+        """
+        Check that text can be summarized and return it stripped.
+        
+        Raises:
+            ValueError: If the text is empty, too short or too long for summarization
+        """
+        # Basic text length validation
+        text = text.strip() if text else ""
+        length = len(text)
+        
+        if not length:
+            raise ValueError("Text cannot be empty")
+        
+        if length < self.min_text_length:
+            raise ValueError(f"Text is too short for summarization (minimum {self.min_text_length} characters)")
+        
+        if length > self.max_text_length:
+            raise ValueError(f"Text is too long for summarization (maximum {self.max_text_length} characters)")
+        
+        return text
+    
+    def fits_single_request(self, text: str) -> bool:
+        """Whether text can be summarized with one request, without chunking"""
+        return len(self._split_text(text)) == 1
+    
+    def _split_text(self, text: str) -> List[str]:
+        """Split text into windows of at most chunk_tokens tokens that overlap by chunk_overlap_tokens"""
+        # Every token is at least one character, so short text never needs tokenizing
+        if len(text) <= self.chunk_tokens:
+            return [text]
+        
+        step = self.chunk_tokens - self.chunk_overlap_tokens
+        encoding = _get_encoding(self.model)
+        
+        if encoding is None:
+            size = self.chunk_tokens * CHARS_PER_TOKEN_ESTIMATE
+            if len(text) <= size:
+                return [text]
+            stride = step * CHARS_PER_TOKEN_ESTIMATE
+            last_start = len(text) - self.chunk_overlap_tokens * CHARS_PER_TOKEN_ESTIMATE
+            return [text[start:start + size] for start in range(0, last_start, stride)]
+        
+        tokens = encoding.encode(text)
+        if len(tokens) <= self.chunk_tokens:
+            return [text]
+        return [
+            encoding.decode(tokens[start:start + self.chunk_tokens])
+            for start in range(0, len(tokens) - self.chunk_overlap_tokens, step)
+        ]
+    
+    def _summarize_chunked(self, text: str) -> str:
+        """Summarize text in one request, or map-reduce it over chunks when it is too long"""
+        chunks = self._split_text(text)
+        if len(chunks) == 1:
+            return self._complete(self._completion_params(text))
+        
+        logger.info(f"Summarizing text in {len(chunks)} chunks")
+        
+        # Map: chunk requests run concurrently, still capped by OPENAI_MAX_CONCURRENCY
+        with ThreadPoolExecutor(max_workers=min(len(chunks), settings.OPENAI_MAX_CONCURRENCY)) as pool:
+            partials = list(pool.map(lambda chunk: self._complete(self._completion_params(chunk)), chunks))
+        
+        # Reduce: very long texts can leave more partial summaries than fit in one request
+        return self.combine_summaries(partials)
+    
+    def combine_summaries(self, partials: List[str]) -> str:
+        """
+        Merge the summaries of consecutive parts of one text into a single summary.
+        
+        Args:
+            partials: Part summaries, in text order
+            
+        Returns:
+            str: The combined summary
+        """
+        partials = [partial for partial in partials if partial and partial.strip()]
+        if len(partials) <= 1:
+            return partials[0] if partials else ""
+        
+        combined = "\n\n".join(partials)
+        if not self.fits_single_request(combined):
+            return self._summarize_chunked(combined)
+        return self._complete(self._combine_params(partials))
+    
+    def _complete(self, params: Dict[str, Any]) -> str:
+        """Run one chat completion and return its stripped text"""
+        response = call_openai(
+            lambda: self.client.chat.completions.create(**params),
+            estimated_tokens=self._estimate_tokens(params)
+        )
+        return (response.choices[0].message.content or "").strip()
+    
+    @staticmethod
+    def _estimate_tokens(params: Dict[str, Any]) -> int:
+        """Rough tokens a chat completion counts against TPM: its prompt plus the maximum completion"""
+        prompt_chars = sum(len(message["content"]) for message in params["messages"])
+        return prompt_chars // CHARS_PER_TOKEN_ESTIMATE + params.get("max_tokens", 0)
+    
+    @staticmethod
+    def _cached_summary(cache_key: str) -> Optional[str]:
+        """Summary stored under cache_key, or None on a miss or when caching is off"""
+        if settings.SUMMARY_CACHE_TTL <= 0:
+            return None
+        cached = cache.get_sync(cache_key)
+        return cached.decode("utf-8") if cached is not None else None
+    
+    @staticmethod
+    def _store_summary(cache_key: str, summary: str) -> None:
+        """Store a summary under cache_key when caching is on"""
+        if settings.SUMMARY_CACHE_TTL > 0:
+            cache.set_sync(cache_key, summary.encode("utf-8"), settings.SUMMARY_CACHE_TTL)
+    
+    def _summary_cache_key(self, text: str) -> str:
+        """
+        Cache key identifying the summary of text under the current model and prompt.
+        
+        Whitespace and case are normalized first, so transcripts that differ only in
+        line breaks, spacing or capitalization share one cached summary.
+        """
+        normalized = " ".join(text.split()).casefold()
+        digest = hashlib.sha256(f"{self.model}|{SUMMARY_PROMPT_VERSION}|{normalized}".encode("utf-8")).hexdigest()
+        return f"sum:{digest}"
+    
+    def _completion_params(self, text: str) -> Dict[str, Any]:
+        """Chat completion request body for summarizing already-validated text"""
+        # Create a simple but effective prompt for summarization
+        return self._chat_params(self._create_summarization_prompt(text))
+    
+    def _combine_params(self, partials: List[str]) -> Dict[str, Any]:
+        """Chat completion request body merging the summaries of consecutive chunks into one"""
+        return self._chat_params(self._create_combine_prompt(partials))
+    
+    def _chat_params(self, prompt: str) -> Dict[str, Any]:
+        """Chat completion request body for a summarization prompt"""
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": 500,  # Limit summary length
+            "temperature": 0.3  # Lower temperature for more focused summaries
+        }
+    
+    def submit_batch(self, texts: Dict[str, str]) -> str:
+        """
+        Submit several summarization requests through the OpenAI Batch API.
+        
+        Args:
+            texts: Map of custom ID (the job ID) to validated text that fits a single request
+            
+        Returns:
+            str: The OpenAI batch ID to pass to fetch_batch
+        """
+        lines = [
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": self._completion_params(text)
+            })
+            for custom_id, text in texts.items()
+        ]
+        
+        batch_input = call_openai(lambda: self.client.files.create(
+            file=("summaries.jsonl", b"\n".join(lines)),
+            purpose="batch"
+        ))
+        batch = call_openai(lambda: self.client.batches.create(
+            input_file_id=batch_input.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h"
+        ))
+        logger.info(f"Submitted summarization batch {batch.id} with {len(lines)} requests")
+        return batch.id
+    
+    def fetch_batch(self, batch_id: str) -> Optional[Dict[str, str]]:
+        """
+        Collect the results of a submitted batch.
+        
+        Returns:
+            None while the batch is still running, otherwise a map of custom ID to summary;
+            requests that failed map to a "Summary generation failed: ..." message
+        """
+        batch = call_openai(lambda: self.client.batches.retrieve(batch_id))
+        
+        if batch.status not in BATCH_FINAL_STATUSES:
+            logger.debug(f"Summarization batch {batch_id} is {batch.status}")
+            return None
+        
+        summaries: Dict[str, str] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = call_openai(lambda: self.client.files.content(file_id)).text
+            for line in content.splitlines():
+                if line.strip():
+                    custom_id, summary = self._parse_batch_line(orjson.loads(line))
+                    summaries[custom_id] = summary
+        
+        logger.info(f"Summarization batch {batch_id} finished as {batch.status} with {len(summaries)} results")
+        return summaries
+    
+    @staticmethod
+    def _parse_batch_line(line: Dict[str, Any]) -> Tuple[str, str]:
+        """Turn one batch output line into (custom_id, summary or failure message)"""
+        custom_id = line["custom_id"]
+        response = line.get("response") or {}
+        
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or response.get("body", {}).get("error") or {}
+            message = error.get("message", "unknown error") if isinstance(error, dict) else str(error)
+            return custom_id, f"Summary generation failed: {message}"
+        
+        summary = (response["body"]["choices"][0]["message"]["content"] or "").strip()
+        if not summary:
+            return custom_id, "Unable to generate summary - no content returned."
+        return custom_id, summary
     
     def _create_summarization_prompt(self, text: str) -> str:
         """
         Create a prompt for text summarization that captures main points.
         
+        The instructions come first as PROMPT_PREFIX and the text strictly after them,
+        so every request shares the same cacheable prefix.
+        
         Args:
             text: The text to be summarized
             
         Returns:
             str: The formatted prompt for summarization
         """
-        return f"""Please provide a concise summary of the following text. Focus on capturing the main points, key ideas, and important details. The summary should be clear, well-organized, and significantly shorter than the original text while preserving the essential information.
-
-Text to summarize:
+        return f"""{PROMPT_PREFIX}
+---
+DOCUMENT:
 {text}
 
 Summary:"""
     
+    def _create_combine_prompt(self, partials: List[str]) -> str:
+        """
+        Create a prompt that merges the summaries of consecutive chunks of one text.
+        
+        Args:
+            partials: Chunk summaries, in text order
+            
+        Returns:
+            str: The formatted prompt for combining the summaries
+        """
+        sections = "\n\n".join(f"Part {index}:\n{partial}" for index, partial in enumerate(partials, start=1))
+        return f"""The following are summaries of consecutive parts of one text. Combine them into a single concise summary of the whole text, keeping the main points, key ideas, and important details and removing repetition.
+
+{sections}
+
+Summary:"""
+    
+    def _create_packed_prompt(self, texts: List[str]) -> str:
+        """
+        Create a prompt that summarizes several independent texts in one response.
+        
+        Args:
+            texts: The texts to be summarized, numbered from 1 in the prompt
+            
+        Returns:
+            str: The formatted prompt, asking for a JSON object of summaries by document number
+        """
+        documents = "\n\n".join(f"Document {number}:\n{text}" for number, text in enumerate(texts, start=1))
+        return f"""Please provide a concise summary of each of the following {len(texts)} documents. Focus on capturing the main points, key ideas, and important details of each one. Each summary should be clear, well-organized, and significantly shorter than its document while preserving the essential information.
+
+{documents}
+
+Respond with a JSON object of the form {{"summaries": [{{"document": 1, "summary": "..."}}]}}, with one entry for every document."""
+    
     def validate_api_key(self) -> bool:
         """
         Validate that the OpenAI API key is working for chat completions.
@@ -135,6 +677,12 @@ Summary:"""
 
 
 # Factory function to create summarization service instance
+@lru_cache(maxsize=1)
 def get_summarization_service() -> SummarizationService:
-    """Get a summarization service instance"""
-    return SummarizationService()
\ No newline at end of file
+    """Get the shared summarization service instance"""
+    return SummarizationService()
+
+
+# A cached instance holds the parent's HTTP client, so forked children build their own
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=get_summarization_service.cache_clear)
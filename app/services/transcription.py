@@ -1,28 +1,145 @@
 import os
+import shutil
 import logging
-from typing import Optional
-from openai import OpenAI
+import subprocess
+import tempfile
+from functools import cached_property, lru_cache
+from typing import List, Optional
+from openai import APITimeoutError, OpenAI
+from app import cache
 from app.config import settings
+from app.services.openai_client import call_openai, get_http_client
+from app.services.file_handler import FileHandler
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Audio formats accepted by the Whisper API, with the content type each is uploaded as
+AUDIO_MIME_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.m4a': 'audio/mp4',
+    '.flac': 'audio/flac'
+}
+ALLOWED_AUDIO_EXTENSIONS = frozenset(AUDIO_MIME_TYPES)
+
+# Returned when there is nothing to transcribe
+NO_SPEECH_MESSAGE = "No speech detected in the audio file."
+
+# ffprobe only reads container/stream headers, so this bounds a hung probe, not normal runs
+FFPROBE_TIMEOUT = 10  # Seconds
+
+# Segmenting copies the stream without re-encoding, so even long files split quickly
+FFMPEG_SPLIT_TIMEOUT = 300  # Seconds
+
+
+@lru_cache(maxsize=1)
+def _ffprobe_path() -> Optional[str]:
+    """Location of the ffprobe binary, or None if ffmpeg is not installed"""
+    return shutil.which("ffprobe")
+
+
+@lru_cache(maxsize=1)
+def _ffmpeg_path() -> Optional[str]:
+    """Location of the ffmpeg binary, or None if it is not installed"""
+    return shutil.which("ffmpeg")
+
+
+def probe_audio_duration(file_path: str) -> Optional[float]:
+    """
+    Duration of an audio file in seconds according to ffprobe.
+    
+    Returns:
+        Optional[float]: The duration, or None if ffprobe is unavailable or can't read the file
+    """
+    ffprobe = _ffprobe_path()
+    if not ffprobe:
+        return None
+    
+    try:
+        result = subprocess.run(
+            [ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", file_path],
+            capture_output=True,
+            text=True,
+            timeout=FFPROBE_TIMEOUT
+        )
+        return float(result.stdout.strip()) if result.returncode == 0 else None
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        logger.debug("ffprobe could not read %s: %s", file_path, e)
+        return None
+
+def split_audio(file_path: str, segment_seconds: float) -> List[str]:
+    """
+    Split an audio file into consecutive segments of about segment_seconds each.
+    
+    The segments are written to a new temporary directory, which the caller removes
+    once they are transcribed.
+    
+    Returns:
+        List[str]: The segment paths in playback order, or just file_path when the file
+        is no longer than one segment or ffmpeg/ffprobe are unavailable or fail
+    """
+    ffmpeg = _ffmpeg_path()
+    if segment_seconds <= 0 or not ffmpeg:
+        return [file_path]
+    
+    duration = probe_audio_duration(file_path)
+    if duration is None or duration <= segment_seconds:
+        return [file_path]
+    
+    extension = os.path.splitext(file_path)[1].lower()
+    segment_dir = tempfile.mkdtemp(prefix="segments-")
+    try:
+        result = subprocess.run(
+            [
+                ffmpeg, "-v", "error", "-i", file_path,
+                "-f", "segment", "-segment_time", str(segment_seconds), "-c", "copy",
+                os.path.join(segment_dir, f"%04d{extension}")
+            ],
+            capture_output=True,
+            timeout=FFMPEG_SPLIT_TIMEOUT
+        )
+        segments = sorted(os.path.join(segment_dir, name) for name in os.listdir(segment_dir))
+        if result.returncode != 0 or not segments:
+            raise OSError(result.stderr.decode("utf-8", "replace").strip() or "no segments written")
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not split {file_path} into segments, transcribing it whole: {str(e)}")
+        shutil.rmtree(segment_dir, ignore_errors=True)
+        return [file_path]
+    
+    logger.info(f"Split {file_path} ({duration:.0f}s) into {len(segments)} segments")
+    return segments
+
 class TranscriptionService:
     """Service for transcribing audio files using OpenAI Whisper API"""
     
     def __init__(self):
-        """Initialize the transcription service with OpenAI client"""
+        """Initialize the transcription service; the OpenAI client is created on first use"""
         if not settings.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.api_key = settings.OPENAI_API_KEY
+        self.model = "whisper-1"
     
-    def transcribe_audio(self, file_path: str) -> str:
+    @cached_property
+    def client(self) -> OpenAI:
+        """
+        OpenAI client, built only once a request gets past validation, so rejected
+        files and cache hits never pay for its construction.
+        """
+        # Retries are handled by call_openai, which also honours Retry-After
+        return OpenAI(api_key=self.api_key, http_client=get_http_client(), max_retries=0)
+    
+    def transcribe_audio(self, file_path: str, content_hash: Optional[str] = None, cache_checked: bool = False) -> str:
         """
         Transcribe an audio file using OpenAI Whisper API.
         
         Args:
             file_path: Path to the audio file to transcribe
+            content_hash: SHA-256 of the file if already known (computed at upload),
+                so the cache lookup doesn't have to read the file
+            cache_checked: The caller already found no cached transcript for content_hash
+                (see get_cached_transcription), so skip the lookup; the result is still cached
             
         Returns:
             str: The transcribed text
@@ -37,34 +154,61 @@ class TranscriptionService:
             raise FileNotFoundError(f"Audio file not found: {file_path}")
         
         # Validate file format (basic check)
-        if not file_path.lower().endswith(('.mp3', '.wav', '.m4a', '.flac')):
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension not in ALLOWED_AUDIO_EXTENSIONS:
             raise ValueError(f"Unsupported audio format: {file_path}")
         
+        # Identical audio (re-uploads, duplicates) reuses the earlier transcript
+        cache_key = self._transcription_cache_key(file_path, content_hash)
+        cached = None if cache_checked else self._cached_transcription(cache_key)
+        if cached is not None:
+            logger.info(f"Using cached transcription for file: {file_path}")
+            return cached
+        
+        # Clips too short to hold speech skip the Whisper upload entirely
+        if settings.MIN_AUDIO_DURATION_SECONDS > 0:
+            duration = probe_audio_duration(file_path)
+            if duration is not None and duration < settings.MIN_AUDIO_DURATION_SECONDS:
+                logger.info(f"Skipping transcription of {file_path}: only {duration:.2f}s of audio")
+                return NO_SPEECH_MESSAGE
+        
         try:
             logger.info(f"Starting transcription for file: {file_path}")
             
-            # Open and transcribe the audio file
+            # Open and transcribe the audio file. The open file (never its bytes or a path, which
+            # the SDK would read into memory) is streamed into the multipart body in chunks.
             with open(file_path, "rb") as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="text"
-                )
+                upload = (os.path.basename(file_path), audio_file, AUDIO_MIME_TYPES[extension])
+                
+                def request():
+                    # Retries must upload the file from the start again
+                    audio_file.seek(0)
+                    return self.client.audio.transcriptions.create(
+                        model=self.model,
+                        file=upload,
+                        response_format="text"
+                    )
+                
+                transcript = call_openai(request)
             
             # The transcript is returned as a string when response_format="text"
             transcription_text = transcript.strip()
             
             if not transcription_text:
                 logger.warning(f"Empty transcription result for file: {file_path}")
-                return "No speech detected in the audio file."
+                return NO_SPEECH_MESSAGE
             
             logger.info(f"Transcription completed successfully for file: {file_path}")
+            
+            self._store_transcription(cache_key, transcription_text)
             return transcription_text
             
         except Exception as e:
             logger.error(f"Transcription failed for file {file_path}: {str(e)}")
             
             # Handle specific OpenAI API errors
+            if isinstance(e, APITimeoutError):
+                raise Exception("OpenAI API request timed out. Please try again later.")
             if hasattr(e, 'response') and hasattr(e.response, 'status_code'):
                 status_code = e.response.status_code
                 if status_code == 401:
@@ -79,6 +223,49 @@ class TranscriptionService:
             # Re-raise the original exception if it's not an API error
             raise Exception(f"Transcription failed: {str(e)}")
     
+    def get_cached_transcription(self, content_hash: str) -> Optional[str]:
+        """
+        Transcript cached for audio with the given SHA-256, or None.
+        
+        Lets callers that transcribe a recording in segments skip splitting it when
+        the whole file was transcribed before.
+        """
+        return self._cached_transcription(self._transcription_cache_key(None, content_hash))
+    
+    def cache_transcription(self, content_hash: str, transcription: str) -> None:
+        """Cache the transcript of audio with the given SHA-256, e.g. one joined from its segments"""
+        if transcription and transcription != NO_SPEECH_MESSAGE:
+            self._store_transcription(self._transcription_cache_key(None, content_hash), transcription)
+    
+    @staticmethod
+    def _cached_transcription(cache_key: Optional[str]) -> Optional[str]:
+        """Transcript stored under cache_key, or None on a miss or when caching is off"""
+        if not cache_key:
+            return None
+        cached = cache.get_sync(cache_key)
+        return cached.decode("utf-8") if cached is not None else None
+    
+    @staticmethod
+    def _store_transcription(cache_key: Optional[str], transcription: str) -> None:
+        """Store a transcript under cache_key when caching is on"""
+        if cache_key:
+            cache.set_sync(cache_key, transcription.encode("utf-8"), settings.TRANSCRIPTION_CACHE_TTL)
+    
+    def _transcription_cache_key(self, file_path: str, content_hash: Optional[str] = None) -> Optional[str]:
+        """Cache key for a file's transcript, or None when caching is off or the file can't be hashed"""
+        if settings.TRANSCRIPTION_CACHE_TTL <= 0:
+            return None
+        
+        if content_hash:
+            return f"tr:{self.model}:{content_hash}"
+        
+        try:
+            return f"tr:{self.model}:{FileHandler.compute_sha256(file_path)}"
+        except OSError as e:
+            # The cache is an optimisation only; transcribe without it
+            logger.debug(f"Could not hash {file_path} for the transcription cache: {str(e)}")
+            return None
+    
     def validate_api_key(self) -> bool:
         """
         Validate that the OpenAI API key is working.
@@ -96,6 +283,12 @@ class TranscriptionService:
 
 
 # Factory function to create transcription service instance
+@lru_cache(maxsize=1)
 def get_transcription_service() -> TranscriptionService:
-    """Get a transcription service instance"""
-    return TranscriptionService()
\ No newline at end of file
+    """Get the shared transcription service instance"""
+    return TranscriptionService()
+
+
+# A cached instance holds the parent's HTTP client, so forked children build their own
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=get_transcription_service.cache_clear)
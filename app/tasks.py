@@ -1,49 +1,108 @@
 import os
+import shutil
 import logging
-from typing import Dict, Any
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 from celery import current_task
+from celery.signals import worker_init, worker_process_init
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.celery_app import celery_app
+from app.config import settings
 from app.database import SessionLocal
 from app.models import ProcessingJob
-from app.services.transcription import get_transcription_service
-from app.services.summarization import get_summarization_service
+from app.crud import SUMMARY_CLAIM_PREFIX, JobCRUD
+from app.services.transcription import NO_SPEECH_MESSAGE, TranscriptionService, get_transcription_service, split_audio
+from app.services.summarization import SummarizationService, get_summarization_service
 from app.services.file_handler import FileHandler
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Public surface of this module: the registered Celery tasks and their state helpers
+__all__ = [
+    "process_audio_file",
+    "process_audio_batch",
+    "summarize_job",
+    "flush_summarization_batch",
+    "poll_summarization_batches",
+    "update_job_status",
+    "JobStateWriter",
+    "cleanup_file_safe",
+]
 
-def update_job_status(job_id: str, status: str, **kwargs):
-    """Update job status in database with enhanced error handling"""
-    db: Session = SessionLocal()
+
+class JobStateWriter:
+    """
+    Writes a job's state transitions for the length of a task through a single session.
+    
+    Each set() is one UPDATE statement, committed immediately so pollers see progress,
+    without a SELECT of the row or a new session per transition.
+    
+    Usage:
+        with JobStateWriter(job_id) as state:
+            state.set(status="processing")
+    """
+    
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.db: Optional[Session] = None
+    
+    def __enter__(self) -> "JobStateWriter":
+        self.db = SessionLocal()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        try:
+            if exc_type is not None:
+                self.db.rollback()
+        finally:
+            self.db.close()
+        return False
+    
+    def set(self, **fields: Any) -> None:
+        """Update the given columns of the job and commit"""
+        logger.info(f"Updating job {self.job_id} status to: {fields.get('status', '(unchanged)')}")
+        try:
+            result = self.db.execute(
+                update(ProcessingJob)
+                .where(ProcessingJob.id == self.job_id)
+                .values(**fields)
+            )
+            self.db.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"Database error updating job {self.job_id}: {str(e)}")
+            self.db.rollback()
+            raise Exception(f"Database error: {str(e)}")
+        
+        if result.rowcount == 0:
+            logger.error(f"Job {self.job_id} not found in database")
+            raise ValueError(f"Job {self.job_id} not found")
+
+
+def update_job_status(job_id: str, status: str, **fields: Any) -> None:
+    """Set a job's status and any other columns with one UPDATE, for one-off writes outside a task"""
+    with JobStateWriter(job_id) as state:
+        state.set(status=status, **fields)
+
+
+@worker_init.connect
+@worker_process_init.connect
+def warm_openai_services(**kwargs) -> None:
+    """
+    Build the shared API services when a worker (or prefork child) starts, so the
+    first job doesn't pay for client setup; jobs then reuse the pooled HTTP/2 connections
+    """
     try:
-        job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-        if job:
-            logger.info(f"Updating job {job_id} status to: {status}")
-            job.status = status
-            for key, value in kwargs.items():
-                if hasattr(job, key):
-                    setattr(job, key, value)
-                    logger.debug(f"Updated job {job_id} field {key}")
-            db.commit()
-            db.refresh(job)  # Refresh to get updated values
-            logger.info(f"Successfully updated job {job_id} status")
-        else:
-            logger.error(f"Job {job_id} not found in database")
-            raise ValueError(f"Job {job_id} not found")
-    except SQLAlchemyError as e:
-        logger.error(f"Database error updating job {job_id}: {str(e)}")
-        db.rollback()
-        raise Exception(f"Database error: {str(e)}")
+        get_transcription_service()
+        get_summarization_service()
+        logger.info("OpenAI services initialised for worker process")
     except Exception as e:
-        logger.error(f"Unexpected error updating job {job_id}: {str(e)}")
-        db.rollback()
-        raise
-    finally:
-        db.close()
+        # Tasks retry construction themselves and record the error on the job
+        logger.warning(f"Could not initialise OpenAI services at worker start: {str(e)}")
 
 
 def cleanup_file_safe(file_path: str, job_id: str) -> bool:
@@ -62,14 +121,13 @@ def cleanup_file_safe(file_path: str, job_id: str) -> bool:
             logger.warning(f"Job {job_id}: No file path provided for cleanup")
             return False
             
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"Job {job_id}: Successfully cleaned up file: {file_path}")
-            return True
-        else:
-            logger.warning(f"Job {job_id}: File not found for cleanup: {file_path}")
-            return False
+        os.remove(file_path)
+        logger.info(f"Job {job_id}: Successfully cleaned up file: {file_path}")
+        return True
             
+    except FileNotFoundError:
+        logger.warning(f"Job {job_id}: File not found for cleanup: {file_path}")
+        return False
     except PermissionError as e:
         logger.error(f"Job {job_id}: Permission denied cleaning up file {file_path}: {str(e)}")
         return False
@@ -81,14 +139,126 @@ def cleanup_file_safe(file_path: str, job_id: str) -> bool:
         return False
 
 
+def _content_hash(file_path: str) -> Optional[str]:
+    """SHA-256 of the uploaded audio, or None if it can't be read (the hash is informational)"""
+    try:
+        return FileHandler.compute_sha256(file_path)
+    except OSError as e:
+        logger.warning(f"Could not hash file {file_path}: {str(e)}")
+        return None
+
+
+def _transcribe(
+    job_id: str,
+    file_path: str,
+    get_service: Callable[[], TranscriptionService],
+    content_hash: Optional[str] = None,
+    cache_checked: bool = False
+) -> str:
+    """Transcribe a job's audio file, raising if no text comes back"""
+    try:
+        transcription_service = get_service()
+        if cache_checked:
+            transcription = transcription_service.transcribe_audio(file_path, content_hash=content_hash, cache_checked=True)
+        elif content_hash:
+            transcription = transcription_service.transcribe_audio(file_path, content_hash=content_hash)
+        else:
+            transcription = transcription_service.transcribe_audio(file_path)
+        
+        if not transcription or not transcription.strip():
+            raise Exception("Transcription failed - no text returned")
+        
+        logger.info(f"Job {job_id}: Transcription completed successfully ({len(transcription)} characters)")
+        return transcription
+        
+    except Exception as e:
+        logger.error(f"Job {job_id}: Transcription failed: {str(e)}")
+        raise Exception(f"Transcription failed: {str(e)}")
+
+
+def _summarize(job_id: str, transcription: str, get_service: Callable[[], SummarizationService]) -> str:
+    """Summarize a transcription; failures produce a placeholder summary instead of failing the job"""
+    try:
+        outcome = get_service().summarize_text(transcription)
+    except Exception as e:
+        outcome = e
+    return _summary_from_outcome(job_id, outcome)
+
+
+def _summary_from_outcome(job_id: str, outcome: Union[str, Exception]) -> str:
+    """The summary to store for a job, given what summarization returned or raised"""
+    if isinstance(outcome, Exception):
+        logger.error(f"Job {job_id}: Summarization failed: {str(outcome)}")
+        # Don't fail the entire job if only summarization fails
+        logger.info(f"Job {job_id}: Continuing with transcription only")
+        return f"Summary generation failed: {str(outcome)}"
+    
+    summary = outcome
+    if not summary or not summary.strip():
+        logger.warning(f"Job {job_id}: Summarization returned empty result, using fallback")
+        summary = "Summary could not be generated, but transcription is available."
+    
+    logger.info(f"Job {job_id}: Summarization completed successfully ({len(summary)} characters)")
+    return summary
+
+
+def _transcribe_segments(job_id: str, segments: List[str], summarize: bool) -> Tuple[str, Optional[str]]:
+    """
+    Transcribe the segments of one recording concurrently.
+    
+    With summarize, each segment's transcript is summarized as soon as it arrives, while
+    later segments are still being transcribed, and the part summaries are then combined.
+    
+    Returns:
+        (transcription, summary), where summary is None unless summarize is set
+    """
+    logger.info(f"Job {job_id}: Transcribing {len(segments)} audio segments")
+    
+    def summarize_part(text: str) -> str:
+        try:
+            return get_summarization_service().summarize_text(text)
+        except ValueError:
+            # Too little speech in the segment to summarize; it stands for itself
+            return text
+    
+    texts: List[Optional[str]] = [None] * len(segments)
+    summarizing = {}
+    
+    with ThreadPoolExecutor(max_workers=min(len(segments), settings.OPENAI_MAX_CONCURRENCY)) as pool:
+        transcribing = {
+            pool.submit(_transcribe, job_id, segment, get_transcription_service): index
+            for index, segment in enumerate(segments)
+        }
+        for future in as_completed(transcribing):
+            index = transcribing[future]
+            texts[index] = future.result()
+            if summarize and texts[index] != NO_SPEECH_MESSAGE:
+                summarizing[index] = pool.submit(summarize_part, texts[index])
+        
+        transcription = " ".join(text for text in texts if text != NO_SPEECH_MESSAGE) or NO_SPEECH_MESSAGE
+        if not summarize:
+            return transcription, None
+        if not summarizing:
+            return transcription, _summarize(job_id, transcription, get_summarization_service)
+        
+        try:
+            partials = [summarizing[index].result() for index in sorted(summarizing)]
+            outcome = get_summarization_service().combine_summaries(partials)
+        except Exception as e:
+            outcome = e
+    
+    return transcription, _summary_from_outcome(job_id, outcome)
+
+
 @celery_app.task(bind=True)
-def process_audio_file(self, job_id: str, file_path: str) -> Dict[str, Any]:
+def process_audio_file(self, job_id: str, file_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
     """
     Process audio file: transcription → summarization with comprehensive error handling
     
     Args:
         job_id: Unique identifier for the processing job
         file_path: Path to the uploaded MP3 file
+        content_hash: SHA-256 of the file computed while it was uploaded; hashed here if omitted
         
     Returns:
         Dict containing processing results
@@ -101,100 +271,399 @@ def process_audio_file(self, job_id: str, file_path: str) -> Dict[str, Any]:
     transcription = None
     summary = None
     
-    try:
-        # Validate file exists before processing
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Audio file not found: {file_path}")
-        
-        # Update status to processing
-        update_job_status(job_id, "processing")
-        logger.info(f"Job {job_id}: Status updated to processing")
-        
-        # Step 1: Transcribe audio
-        logger.info(f"Job {job_id}: Starting transcription")
-        current_task.update_state(
-            state="PROGRESS",
-            meta={"current": 1, "total": 2, "status": "Transcribing audio..."}
-        )
-        
+    # One session for every state change of this job
+    with JobStateWriter(job_id) as state:
         try:
-            transcription_service = get_transcription_service()
-            transcription = transcription_service.transcribe_audio(file_path)
+            # Update status to processing
+            state.set(status="processing")
+            logger.info(f"Job {job_id}: Status updated to processing")
             
-            if not transcription or not transcription.strip():
-                raise Exception("Transcription failed - no text returned")
+            # Step 1: Transcribe audio
+            logger.info(f"Job {job_id}: Starting transcription")
+            current_task.update_state(
+                state="PROGRESS",
+                meta={"current": 1, "total": 2, "status": "Transcribing audio..."}
+            )
             
-            logger.info(f"Job {job_id}: Transcription completed successfully ({len(transcription)} characters)")
+            # Stored so repeated uploads of the same audio can be recognised, and keys the
+            # whole-file transcript cache checked before a long recording is split
+            if not content_hash:
+                content_hash = _content_hash(file_path)
             
-            # Update job with transcription
-            update_job_status(job_id, "processing", transcription=transcription)
+            if content_hash:
+                transcription = get_transcription_service().get_cached_transcription(content_hash)
             
-        except Exception as e:
-            logger.error(f"Job {job_id}: Transcription failed: {str(e)}")
-            raise Exception(f"Transcription failed: {str(e)}")
-        
-        # Step 2: Generate summary
-        logger.info(f"Job {job_id}: Starting summarization")
-        current_task.update_state(
-            state="PROGRESS", 
-            meta={"current": 2, "total": 2, "status": "Generating summary..."}
-        )
-        
-        try:
-            summarization_service = get_summarization_service()
-            summary = summarization_service.summarize_text(transcription)
+            if transcription:
+                logger.info(f"Job {job_id}: Using cached transcription of the whole file")
+            else:
+                # Long recordings are split so their segments transcribe (and summarize) in parallel
+                segments = split_audio(file_path, settings.TRANSCRIPTION_SEGMENT_SECONDS)
+                if len(segments) > 1:
+                    try:
+                        transcription, summary = _transcribe_segments(
+                            job_id, segments, summarize=not settings.SUMMARY_BATCH_ENABLED
+                        )
+                    finally:
+                        shutil.rmtree(os.path.dirname(segments[0]), ignore_errors=True)
+                    if content_hash:
+                        get_transcription_service().cache_transcription(content_hash, transcription)
+                else:
+                    # The whole-file cache was just checked, so don't look the same key up again
+                    transcription = _transcribe(
+                        job_id, file_path, get_transcription_service, content_hash, cache_checked=bool(content_hash)
+                    )
+            
+            if settings.SUMMARY_BATCH_ENABLED:
+                # The summary is produced later by the Batch API flush/poll tasks
+                state.set(status="awaiting_summary", transcription=transcription, content_hash=content_hash)
+                logger.info(f"Job {job_id}: Transcription saved, summary queued for batch processing")
+                
+                cleanup_file_safe(file_path, job_id)
+                return {
+                    "job_id": job_id,
+                    "status": "awaiting_summary",
+                    "transcription": transcription
+                }
+            
+            # Update job with transcription (intermediate commit so it survives a summarization crash)
+            state.set(status="processing", transcription=transcription, content_hash=content_hash)
+            
+            # Step 2: Generate summary
+            logger.info(f"Job {job_id}: Starting summarization")
+            current_task.update_state(
+                state="PROGRESS", 
+                meta={"current": 2, "total": 2, "status": "Generating summary..."}
+            )
+            
+            if summary is None:
+                summary = _summarize(job_id, transcription, get_summarization_service)
+            
+            # Update job as completed (transcription was already stored above)
+            state.set(status="completed", summary=summary)
             
-            if not summary or not summary.strip():
-                logger.warning(f"Job {job_id}: Summarization returned empty result, using fallback")
-                summary = "Summary could not be generated, but transcription is available."
+            logger.info(f"Job {job_id}: Processing completed successfully")
             
-            logger.info(f"Job {job_id}: Summarization completed successfully ({len(summary)} characters)")
+            # Clean up uploaded file
+            cleanup_success = cleanup_file_safe(file_path, job_id)
+            if not cleanup_success:
+                logger.warning(f"Job {job_id}: File cleanup failed, but processing was successful")
+            
+            return {
+                "job_id": job_id,
+                "status": "completed",
+                "transcription": transcription,
+                "summary": summary
+            }
             
         except Exception as e:
-            logger.error(f"Job {job_id}: Summarization failed: {str(e)}")
-            # Don't fail the entire job if only summarization fails
-            summary = f"Summary generation failed: {str(e)}"
-            logger.info(f"Job {job_id}: Continuing with transcription only")
-        
-        # Update job as completed
-        update_job_status(
-            job_id, 
-            "completed", 
-            transcription=transcription,
-            summary=summary
-        )
+            error_message = str(e)
+            logger.error(f"Job {job_id}: Processing failed with error: {error_message}")
+            
+            try:
+                # Update job as failed
+                state.set(status="failed", error_message=error_message)
+                logger.info(f"Job {job_id}: Status updated to failed")
+            except Exception as db_error:
+                logger.error(f"Job {job_id}: Failed to update job status to failed: {str(db_error)}")
+            
+            # Clean up uploaded file even on failure
+            cleanup_success = cleanup_file_safe(file_path, job_id)
+            if cleanup_success:
+                logger.info(f"Job {job_id}: File cleanup completed after failure")
+            else:
+                logger.error(f"Job {job_id}: File cleanup failed after processing failure")
+            
+            # Re-raise the exception so Celery marks the task as failed
+            raise Exception(f"Audio processing failed for job {job_id}: {error_message}")
+
+
+def _transcribe_batch_item(job_id: str, file_path: str, content_hash: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Transcribe one file of a batch and return (transcription, content_hash); the file is removed either way"""
+    try:
+        transcription = _transcribe(job_id, file_path, get_transcription_service, content_hash)
+        return transcription, content_hash or _content_hash(file_path)
+    finally:
+        cleanup_file_safe(file_path, job_id)
+
+
+@celery_app.task(bind=True)
+def process_audio_batch(self, items: List[Tuple[str, str, Optional[str]]]) -> List[Dict[str, Any]]:
+    """
+    Process several uploaded files in one task, sharing service clients and the final DB write
+    
+    The files are transcribed concurrently, bounded like every other OpenAI call by
+    OPENAI_MAX_CONCURRENCY, and their summaries requested together afterwards, with
+    short transcripts packed into shared requests.
+    
+    Args:
+        items: (job_id, file_path, content_hash) tuples, as created by the /upload-batch
+            endpoint; (job_id, file_path) pairs are also accepted and hashed here
         
-        logger.info(f"Job {job_id}: Processing completed successfully")
+    Returns:
+        List of per-job result dicts in the same order as items
+    """
+    logger.info(f"Starting batch processing of {len(items)} jobs")
+    
+    results: List[Dict[str, Any]] = []
+    completed: List[Dict[str, Any]] = []
+    if not items:
+        return results
+    
+    entries = [
+        (job_id, file_path, upload_hash[0] if upload_hash else None)
+        for job_id, file_path, *upload_hash in items
+    ]
+    
+    # One session for every status write of the batch, used from this thread only
+    db: Session = SessionLocal()
+    
+    try:
+        # Every job of the batch starts at once, in one UPDATE and commit
+        JobCRUD.update_jobs_bulk(db, [{"id": job_id, "status": "processing"} for job_id, _, _ in entries])
+    except SQLAlchemyError as e:
+        logger.error(f"Database error starting batch: {str(e)}")
+        db.rollback()
+        db.close()
+        raise Exception(f"Database error: {str(e)}")
+    
+    transcribed: List[Union[Tuple[str, Optional[str]], Exception]] = [None] * len(entries)
+    with ThreadPoolExecutor(max_workers=min(len(entries), settings.OPENAI_MAX_CONCURRENCY)) as pool:
+        transcribing = {pool.submit(_transcribe_batch_item, *entry): index for index, entry in enumerate(entries)}
+        for done, future in enumerate(as_completed(transcribing), start=1):
+            index = transcribing[future]
+            try:
+                transcribed[index] = future.result()
+            except Exception as e:
+                transcribed[index] = e
+            
+            self.update_state(
+                state="PROGRESS",
+                meta={"current": done, "total": len(items), "status": f"Transcribed job {entries[index][0]}..."}
+            )
+    
+    for (job_id, _, _), outcome in zip(entries, transcribed):
+        if isinstance(outcome, Exception):
+            error_message = str(outcome)
+            logger.error(f"Job {job_id}: Batch processing failed with error: {error_message}")
+            
+            try:
+                JobCRUD.update_job_status(db, job_id, "failed", error_message=error_message)
+            except Exception as db_error:
+                db.rollback()
+                logger.error(f"Job {job_id}: Failed to update job status to failed: {str(db_error)}")
+            
+            results.append({"job_id": job_id, "status": "failed", "error_message": error_message})
+            continue
         
-        # Clean up uploaded file
-        cleanup_success = cleanup_file_safe(file_path, job_id)
-        if not cleanup_success:
-            logger.warning(f"Job {job_id}: File cleanup failed, but processing was successful")
+        transcription, content_hash = outcome
+        # Summaries are filled in below, or left for the Batch API flush/poll tasks
+        status = "awaiting_summary" if settings.SUMMARY_BATCH_ENABLED else "completed"
         
-        return {
+        completed.append({
+            "id": job_id,
+            "status": status,
+            "transcription": transcription,
+            "summary": None,
+            "content_hash": content_hash
+        })
+        results.append({
             "job_id": job_id,
-            "status": "completed",
+            "status": status,
             "transcription": transcription,
-            "summary": summary
-        }
+            "summary": None
+        })
+    
+    # The transcripts are independent, so summarize them all at once rather than one by one,
+    # packing short ones into shared requests
+    if completed and not settings.SUMMARY_BATCH_ENABLED:
+        self.update_state(
+            state="PROGRESS",
+            meta={"current": len(items), "total": len(items), "status": "Generating summaries..."}
+        )
         
-    except Exception as e:
-        error_message = str(e)
-        logger.error(f"Job {job_id}: Processing failed with error: {error_message}")
+        pending = [result for result in results if result["status"] == "completed"]
+        try:
+            outcomes = get_summarization_service().summarize_texts_packed([job["transcription"] for job in completed])
+        except Exception as e:
+            outcomes = [e] * len(completed)
+        
+        for job, result, outcome in zip(completed, pending, outcomes):
+            job["summary"] = result["summary"] = _summary_from_outcome(job["id"], outcome)
+    
+    # Write all successful results in one transaction
+    try:
+        if completed:
+            JobCRUD.update_jobs_bulk(db, completed)
+            logger.info(f"Batch results saved for {len(completed)} jobs")
+    except SQLAlchemyError as e:
+        logger.error(f"Database error saving batch results: {str(e)}")
+        db.rollback()
+        raise Exception(f"Database error: {str(e)}")
+    finally:
+        db.close()
+    
+    logger.info(f"Batch processing finished: {len(completed)}/{len(items)} jobs transcribed")
+    return results
+
+
+@celery_app.task
+def summarize_job(job_id: str) -> Dict[str, Any]:
+    """
+    Summarize a job's stored transcription and complete the job
+    
+    Used by flush_summarization_batch for texts it doesn't send to the Batch API, so
+    their summarize_text calls run on the workers instead of in the beat task.
+    
+    Returns:
+        Dict containing the job's final status and summary
+    """
+    db: Session = SessionLocal()
+    try:
+        job = JobCRUD.get_job(db, job_id)
+        if not job:
+            logger.error(f"Job {job_id} not found in database")
+            raise ValueError(f"Job {job_id} not found")
+        
+        summary = _summarize(job_id, job.transcription, get_summarization_service)
+        JobCRUD.update_job_summary(db, job_id, summary)
+        logger.info(f"Job {job_id}: Summary stored")
+        return {"job_id": job_id, "status": "completed", "summary": summary}
+        
+    except SQLAlchemyError as e:
+        logger.error(f"Database error summarizing job {job_id}: {str(e)}")
+        db.rollback()
+        raise Exception(f"Database error: {str(e)}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def flush_summarization_batch() -> Optional[str]:
+    """
+    Send the transcriptions of jobs awaiting a summary to the OpenAI Batch API as one batch
+    
+    The jobs are claimed (moved to summarizing) before anything is submitted, so
+    overlapping runs never send a job twice; if the submission fails they are put back.
+    
+    Returns:
+        The submitted batch ID, or None if nothing was waiting
+    """
+    db: Session = SessionLocal()
+    claim = f"{SUMMARY_CLAIM_PREFIX}{uuid.uuid4().hex}"
+    try:
+        rows = JobCRUD.claim_jobs_awaiting_summary(db, claim, settings.SUMMARY_BATCH_MAX_JOBS)
+        if not rows:
+            return None
+        
+        summarization_service = get_summarization_service()
+        
+        # Texts the API would reject complete right away, as in the synchronous path;
+        # texts short enough to be their own summary, or too long for one batch
+        # request, are summarized by summarize_job tasks instead
+        texts: Dict[str, str] = {}
+        finished: List[Dict[str, Any]] = []
+        direct: List[str] = []
+        for row in rows:
+            try:
+                text = summarization_service.validate_text(row.transcription)
+            except ValueError as e:
+                finished.append({
+                    "id": row.id,
+                    "status": "completed",
+                    "summary": f"Summary generation failed: {str(e)}",
+                    "batch_id": None
+                })
+                continue
+            
+            if len(text) >= summarization_service.passthrough_length and summarization_service.fits_single_request(text):
+                texts[row.id] = text
+            else:
+                direct.append(row.id)
+        
+        if finished:
+            JobCRUD.update_jobs_bulk(db, finished)
+            logger.info(f"Completed {len(finished)} jobs whose text can't be summarized")
+        
+        if direct:
+            # Still summarizing, but no longer part of this claim
+            JobCRUD.update_jobs_bulk(db, [{"id": job_id, "batch_id": None} for job_id in direct])
+            try:
+                for job_id in direct:
+                    summarize_job.delay(job_id)
+            except Exception:
+                JobCRUD.update_jobs_bulk(db, [{"id": job_id, "status": "awaiting_summary"} for job_id in direct])
+                raise
+            logger.info(f"Queued {len(direct)} jobs for summarization outside the batch (text too short or too long)")
+        
+        if not texts:
+            return None
         
         try:
-            # Update job as failed
-            update_job_status(job_id, "failed", error_message=error_message)
-            logger.info(f"Job {job_id}: Status updated to failed")
-        except Exception as db_error:
-            logger.error(f"Job {job_id}: Failed to update job status to failed: {str(db_error)}")
-        
-        # Clean up uploaded file even on failure
-        cleanup_success = cleanup_file_safe(file_path, job_id)
-        if cleanup_success:
-            logger.info(f"Job {job_id}: File cleanup completed after failure")
-        else:
-            logger.error(f"Job {job_id}: File cleanup failed after processing failure")
+            batch_id = summarization_service.submit_batch(texts)
+        except Exception:
+            JobCRUD.update_jobs_bulk(
+                db,
+                [{"id": job_id, "status": "awaiting_summary", "batch_id": None} for job_id in texts]
+            )
+            logger.error(f"Submitting summarization batch failed, {len(texts)} jobs returned to the queue")
+            raise
+        
+        try:
+            JobCRUD.update_jobs_bulk(db, [{"id": job_id, "batch_id": batch_id} for job_id in texts])
+        except SQLAlchemyError:
+            # The jobs stay claimed rather than being submitted again
+            logger.error(f"Summarization batch {batch_id} was submitted but not recorded on jobs claimed as {claim}")
+            raise
+        logger.info(f"Queued {len(texts)} jobs on summarization batch {batch_id}")
+        return batch_id
+        
+    except SQLAlchemyError as e:
+        logger.error(f"Database error flushing summarization batch: {str(e)}")
+        db.rollback()
+        raise Exception(f"Database error: {str(e)}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def poll_summarization_batches() -> int:
+    """
+    Check submitted summarization batches and store the summaries of any that finished
+    
+    Returns:
+        Number of jobs completed by this run
+    """
+    db: Session = SessionLocal()
+    try:
+        batch_ids = JobCRUD.get_open_summary_batch_ids(db)
+        if not batch_ids:
+            return 0
+        
+        summarization_service = get_summarization_service()
+        completed = 0
+        
+        for batch_id in batch_ids:
+            summaries = summarization_service.fetch_batch(batch_id)
+            if summaries is None:
+                continue
+            
+            updates = [
+                {
+                    "id": job_id,
+                    "status": "completed",
+                    "summary": summaries.get(job_id, "Summary generation failed: no result returned by batch")
+                }
+                for job_id in JobCRUD.get_batch_job_ids(db, batch_id)
+            ]
+            JobCRUD.update_jobs_bulk(db, updates)
+            completed += len(updates)
+            logger.info(f"Stored {len(updates)} summaries from batch {batch_id}")
         
-        # Re-raise the exception so Celery marks the task as failed
-        raise Exception(f"Audio processing failed for job {job_id}: {error_message}")
\ No newline at end of file
+        return completed
+        
+    except SQLAlchemyError as e:
+        logger.error(f"Database error polling summarization batches: {str(e)}")
+        db.rollback()
+        raise Exception(f"Database error: {str(e)}")
+    finally:
+        db.close()
@@ -6,13 +6,37 @@ This will start both the Celery worker and FastAPI server.
 
 import subprocess
 import sys
-import time
 import signal
 import os
 
-def signal_handler(sig, frame):
-    print('\n🛑 Shutting down...')
-    sys.exit(0)
+import uvicorn
+
+def start_worker() -> int:
+    """
+    Start the Celery worker alongside the server and return its PID.
+    
+    Where fork is available the worker is forked from this process, so it skips
+    interpreter startup and shares already-imported code pages with it.
+    """
+    if not hasattr(os, "fork"):
+        return subprocess.Popen([sys.executable, "start_worker.py"]).pid
+    
+    pid = os.fork()
+    if pid == 0:
+        from start_worker import run_worker
+        try:
+            run_worker()
+        finally:
+            os._exit(0)
+    return pid
+
+def stop_worker(pid: int):
+    """Ask the worker to shut down and wait for it to exit"""
+    try:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass
 
 def main():
     print("🚀 Starting Audio Transcription Summarizer...")
@@ -23,20 +47,20 @@ def main():
     print("🔑 Make sure your .env file has a valid OPENAI_API_KEY")
     print("\n" + "="*50)
     
-    # Register signal handler for graceful shutdown
-    signal.signal(signal.SIGINT, signal_handler)
+    from app.config import settings
+    from app.database import create_tables, engine
+    
+    # Create database tables before any process starts using them
+    print("🗄️  Initializing database...")
+    create_tables()
+    # Don't hand the pooled connections to the forked worker
+    engine.dispose()
+    
+    # Start Celery worker in background
+    print("🔄 Starting Celery worker...")
+    worker_pid = start_worker()
     
     try:
-        # Start Celery worker in background
-        print("🔄 Starting Celery worker...")
-        worker_process = subprocess.Popen([
-            "celery", "-A", "app.celery_app", "worker", 
-            "--loglevel=info", "--concurrency=1"
-        ])
-        
-        # Give worker time to start
-        time.sleep(3)
-        
         # Start FastAPI server
         print("🌐 Starting FastAPI server on http://localhost:8000...")
         print("📖 API docs available at: http://localhost:8000/docs")
@@ -44,24 +68,24 @@ def main():
         print("\n💡 Press Ctrl+C to stop both services")
         print("="*50 + "\n")
         
-        server_process = subprocess.Popen([
-            "uvicorn", "app.main:app", "--reload", 
-            "--host", "0.0.0.0", "--port", "8000"
-        ])
-        
-        # Wait for server process
-        server_process.wait()
-        
+        # "auto" picks uvloop and httptools (installed with uvicorn[standard]); DEBUG
+        # reloads on code changes instead, which runs a single server process
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=settings.WEB_CONCURRENCY,
+            loop="auto",
+            http="auto",
+            reload=settings.DEBUG
+        )
+    
     except KeyboardInterrupt:
         print("\n🛑 Received shutdown signal...")
     finally:
-        # Clean up processes
-        try:
-            worker_process.terminate()
-            server_process.terminate()
-            print("✅ Services stopped")
-        except:
-            pass
+        # Clean up the worker
+        stop_worker(worker_pid)
+        print("✅ Services stopped")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -11,11 +11,23 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.celery_app import celery_app
+from app.config import settings
 
-if __name__ == "__main__":
-    # Start the Celery worker
-    celery_app.start([
+def run_worker():
+    """Run the Celery worker in this process (blocks until the worker shuts down)"""
+    # Jobs spend most of their time waiting on the OpenAI API, so a thread pool
+    # overlaps many of them (API calls are capped by OPENAI_MAX_CONCURRENCY).
+    # Gossip, mingle and heartbeats only serve worker-to-worker coordination this app
+    # doesn't use; skipping them shortens startup and removes periodic broker traffic.
+    celery_app.worker_main([
         "worker",
         "--loglevel=info",
-        "--concurrency=1",  # Process one task at a time for simplicity
-    ])
\ No newline at end of file
+        f"--pool={settings.CELERY_WORKER_POOL}",
+        f"--concurrency={settings.CELERY_WORKER_CONCURRENCY}",
+        "--without-gossip",
+        "--without-mingle",
+        "--without-heartbeat",
+    ])
+
+if __name__ == "__main__":
+    run_worker()
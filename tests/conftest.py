@@ -0,0 +1,189 @@
+"""
+Shared pytest fixtures for the test suite
+"""
+import asyncio
+import itertools
+import os
+import sys
+from types import SimpleNamespace
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import get_db
+from app.main import app
+from app.models import Base
+
+# TestClient runs the app on a fresh asyncio loop per request; make that loop uvloop
+if sys.platform != "win32":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+
+def _test_database_url() -> str:
+    """Named in-memory database, one per pytest-xdist worker (``pytest -n auto``)"""
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+    return f"sqlite:///file:memdb_{worker}?mode=memory&cache=shared&uri=true"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--force-openai-check",
+        action="store_true",
+        help="validate OPENAI_API_KEY against OpenAI even if it passed within the last hour"
+    )
+    parser.addoption(
+        "--run-live",
+        action="store_true",
+        help="also run tests marked live, which call the real OpenAI API"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "live: calls the real OpenAI API; only runs with --run-live")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Deselect live tests unless --run-live was given"""
+    if config.getoption("--run-live"):
+        return
+    live = [item for item in items if item.get_closest_marker("live")]
+    if live:
+        config.hook.pytest_deselected(items=live)
+        items[:] = [item for item in items if not item.get_closest_marker("live")]
+
+
+@pytest.fixture(scope="session")
+def engine():
+    """In-memory test database, with the schema created once per test session"""
+    test_engine = create_engine(_test_database_url(), connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    
+    # pysqlite manages transactions itself and breaks SAVEPOINTs; let SQLAlchemy emit BEGIN.
+    # Test data is throwaway, so skip the rollback journal on disk and every sync as well.
+    @event.listens_for(test_engine, "connect")
+    def _configure_connection(dbapi_connection, _connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=MEMORY")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+    
+    # Sessions share the pool's single connection, so only the first one opens a transaction
+    @event.listens_for(test_engine, "begin")
+    def _begin(connection):
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN")
+    
+    Base.metadata.create_all(bind=test_engine)
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture
+def db_session(engine):
+    """
+    Session whose changes are all rolled back when the test ends.
+    
+    The session joins a transaction opened on the connection, so commits made by the
+    code under test only release SAVEPOINTs inside it and nothing outlives the test.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(
+        bind=connection,
+        join_transaction_mode="create_savepoint",
+        autoflush=False,
+        expire_on_commit=False
+    )
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def override_get_db(db_session):
+    """Serve the app's requests from the test's rolled-back session"""
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = lambda: db_session
+    yield
+    if previous is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous
+
+
+@pytest.fixture
+def task_sessions(db_session, monkeypatch):
+    """
+    Session factory for the Celery tasks, joined to the test's rolled-back transaction.
+    
+    Commits made by the tasks only release SAVEPOINTs, so what they write is visible
+    to the test and still rolled back when it ends.
+    """
+    factory = sessionmaker(
+        bind=db_session.bind,
+        join_transaction_mode="create_savepoint",
+        autoflush=False,
+        expire_on_commit=False
+    )
+    monkeypatch.setattr("app.tasks.SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    One TestClient shared by every endpoint test.
+    
+    It is not entered as a context manager: the startup hook creates the real tables
+    and refuses to run without OPENAI_API_KEY, and the tests override what they need.
+    """
+    return TestClient(app)
+
+
+@pytest.fixture
+def async_client():
+    """
+    httpx client that calls the app in-process over ASGI, for tests that batch requests.
+    
+    Like ``client`` it skips the lifespan hooks; enter it with ``async with`` in the test's loop.
+    """
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.fixture(scope="session")
+def new_job_id():
+    """
+    Factory for job IDs that only need to be unique within the test run.
+    
+    Numbering them is enough for that and skips the os.urandom read behind uuid.uuid4().
+    """
+    ids = itertools.count()
+    return lambda: f"test-job-{os.getpid()}-{next(ids)}"
+
+
+@pytest.fixture(scope="session")
+def stub_transcription():
+    """Stand-in TranscriptionService with a canned transcript, long enough to be summarized"""
+    return SimpleNamespace(
+        transcribe_audio=lambda _file_path: "This canned transcript stands in for the Whisper output in offline test runs.",
+        validate_api_key=lambda: True
+    )
+
+
+@pytest.fixture(scope="session")
+def stub_summarization():
+    """Stand-in SummarizationService with a canned summary"""
+    return SimpleNamespace(
+        summarize_text=lambda _text: "Canned summary.",
+        validate_api_key=lambda: True
+    )
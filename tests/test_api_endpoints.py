@@ -1,49 +1,45 @@
 """
 Comprehensive API endpoint tests for the audio transcription summarizer
 """
+import asyncio
 import pytest
 import io
 import os
-from unittest.mock import patch, Mock
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import re
+import hashlib
+from unittest.mock import ANY, patch, Mock
+from sqlalchemy import insert
+from app import cache
 from app.main import app
-from app.database import get_db
-from app.models import Base, ProcessingJob
-import uuid
+from app.config import settings
+from app.models import ProcessingJob
 
-# Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_api_endpoints.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Small fake MP3 (ID3 header plus filler), built once and shared by the upload tests
+_MP3 = b"ID3\x03\x00\x00\x00" + b"fake mp3 content" * 100
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Error details expected for rejected formats and unknown jobs
+_BAD_FORMAT = re.compile(r"mp3|audio|format", re.I)
+_NOT_FOUND = re.compile(r"not found")
+
+
+pytestmark = pytest.mark.usefixtures("override_get_db")
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
 
-# Override the database dependency
-app.dependency_overrides[get_db] = override_get_db
+def bulk_create_jobs(session, rows):
+    """Insert job rows with a single executemany; the db_session fixture rolls them back"""
+    session.execute(insert(ProcessingJob), rows)
 
 
-def test_root_endpoint():
+def test_root_endpoint(client):
     """Test the root endpoint"""
-    client = TestClient(app)
     response = client.get("/")
     assert response.status_code == 200
     assert "message" in response.json()
     assert "Audio Transcription Summarizer API" in response.json()["message"]
 
 
-def test_health_endpoint():
+def test_health_endpoint(client):
     """Test the health check endpoint"""
-    client = TestClient(app)
     response = client.get("/health")
     assert response.status_code == 200
     data = response.json()
@@ -52,22 +48,35 @@ def test_health_endpoint():
     assert "openai_api_key_valid" in data
 
 
+def test_response_cache_client_lifecycle():
+    """Test that the response cache has one client from startup until it is closed at shutdown"""
+    async def lifecycle():
+        assert cache._get_client() is None
+        await cache.open_client()
+        client = cache._get_client()
+        await cache.open_client()
+        assert cache._get_client() is client
+        
+        with patch.object(client, "aclose", wraps=client.aclose) as aclose:
+            await cache.close_client()
+        aclose.assert_awaited_once()
+        assert cache._get_client() is None
+    
+    asyncio.run(lifecycle())
+
+
 @patch('app.tasks.process_audio_file.delay')
 @patch('app.services.file_handler.FileHandler.save_uploaded_file')
-def test_upload_valid_mp3_file(mock_save_file, mock_task):
+def test_upload_valid_mp3_file(mock_save_file, mock_task, client):
     """Test uploading a valid MP3 file"""
     # Mock the file save and task
-    mock_save_file.return_value = "/fake/path/test.mp3"
+    mock_save_file.return_value = ("/fake/path/test.mp3", "fake-hash")
     mock_task.return_value = Mock(id="task-123")
     
-    # Create mock MP3 file content
-    mp3_content = b"ID3\x03\x00\x00\x00" + b"fake mp3 content" * 100
-    
     files = {
-        'file': ('test.mp3', io.BytesIO(mp3_content), 'audio/mpeg')
+        'file': ('test.mp3', io.BytesIO(_MP3), 'audio/mpeg')
     }
     
-    client = TestClient(app)
     response = client.post("/upload", files=files)
     
     assert response.status_code == 200
@@ -81,195 +90,219 @@ def test_upload_valid_mp3_file(mock_save_file, mock_task):
     mock_save_file.assert_called_once()
 
 
-def test_upload_invalid_file_format():
+@patch('app.tasks.process_audio_file.delay')
+def test_upload_stream_valid_mp3(mock_task, client):
+    """Test streaming a raw MP3 request body straight to disk"""
+    mock_task.return_value = Mock(id="task-123")
+    
+    response = client.post("/upload-stream", params={"filename": "test.mp3"}, content=_MP3)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "pending"
+    
+    # The task receives the final file, which holds exactly the uploaded bytes, and its hash
+    job_id, file_path, content_hash = mock_task.call_args[0]
+    assert job_id == data["job_id"]
+    assert content_hash == hashlib.sha256(_MP3).hexdigest()
+    try:
+        with open(file_path, "rb") as saved:
+            assert saved.read() == _MP3
+    finally:
+        os.remove(file_path)
+
+
+def test_upload_stream_rejects_non_mp3_content(client, caplog):
+    """Test that a streamed body without an MP3 signature is rejected, logged under the client's file name"""
+    with caplog.at_level("WARNING", logger="app.services.file_handler"):
+        response = client.post("/upload-stream", params={"filename": "test.mp3"}, content=b"This is not an MP3 file")
+    
+    assert response.status_code == 400
+    assert "File test.mp3 does not start with an MP3 signature" in caplog.text
+
+
+@patch('app.tasks.process_audio_batch.delay')
+@patch('app.services.file_handler.FileHandler.save_uploaded_file')
+def test_upload_batch_valid_mp3_files(mock_save_file, mock_task, client):
+    """Test uploading several MP3 files in one request"""
+    mock_save_file.side_effect = lambda file, job_id: (f"/fake/path/{job_id}.mp3", "fake-hash")
+    mock_task.return_value = Mock(id="task-123")
+    
+    files = [
+        ('files', ('first.mp3', io.BytesIO(_MP3), 'audio/mpeg')),
+        ('files', ('second.mp3', io.BytesIO(_MP3), 'audio/mpeg'))
+    ]
+    
+    response = client.post("/upload-batch", files=files)
+    
+    assert response.status_code == 200
+    jobs = response.json()["jobs"]
+    assert len(jobs) == 2
+    assert all(job["status"] == "pending" for job in jobs)
+    
+    # All jobs are dispatched together in a single task
+    mock_task.assert_called_once()
+    items = mock_task.call_args[0][0]
+    assert [job_id for job_id, _, _ in items] == [job["job_id"] for job in jobs]
+    assert mock_save_file.call_count == 2
+
+
+def test_upload_batch_rejects_invalid_file(client):
+    """Test that one invalid file rejects the whole batch"""
+    files = [
+        ('files', ('good.mp3', io.BytesIO(_MP3), 'audio/mpeg')),
+        ('files', ('bad.txt', io.BytesIO(b"This is not an MP3 file"), 'text/plain'))
+    ]
+    
+    response = client.post("/upload-batch", files=files)
+    
+    assert response.status_code == 400
+
+
+def test_upload_invalid_file_format(client):
     """Test uploading an invalid file format"""
     # Create a text file instead of MP3
     files = {
         'file': ('test.txt', io.BytesIO(b"This is not an MP3 file"), 'text/plain')
     }
     
-    client = TestClient(app)
     response = client.post("/upload", files=files)
     
     assert response.status_code == 400
     assert "detail" in response.json()
-    detail = response.json()["detail"].lower()
-    assert "mp3" in detail or "audio" in detail or "format" in detail
+    assert _BAD_FORMAT.search(response.json()["detail"])
 
 
-def test_upload_oversized_file():
+def test_upload_oversized_file(client, monkeypatch):
     """Test uploading a file that's too large"""
-    # Create a large fake MP3 file (over 25MB)
-    large_content = b"ID3\x03\x00\x00\x00" + b"x" * (26 * 1024 * 1024)
+    # Shrink the limit so a small body is enough to exceed it
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_MB", 1)
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_BYTES", 1024 * 1024)
+    large_content = b"ID3\x03\x00\x00\x00" + b"x" * (2 * 1024 * 1024)
     
     files = {
         'file': ('large.mp3', io.BytesIO(large_content), 'audio/mpeg')
     }
     
-    client = TestClient(app)
     response = client.post("/upload", files=files)
     
-    assert response.status_code == 400
+    assert response.status_code == 413
     assert "detail" in response.json()
     assert "size" in response.json()["detail"].lower()
 
 
-def test_status_endpoint_valid_job():
-    """Test status endpoint with valid job ID"""
-    # Create a test job directly in database
-    db = TestingSessionLocal()
-    job_id = str(uuid.uuid4())
-    job = ProcessingJob(
-        id=job_id,
-        filename="test.mp3",
-        status="processing"
-    )
-    db.add(job)
-    db.commit()
-    db.close()
+@pytest.fixture
+def make_job(db_session, new_job_id):
+    """Insert a job with the given columns into the test session and return its ID"""
+    def _make_job(**columns):
+        job_id = new_job_id()
+        bulk_create_jobs(db_session, [{"id": job_id, "filename": "test.mp3", **columns}])
+        return job_id
+    return _make_job
+
+
+@pytest.mark.parametrize("endpoint,columns,expected", [
+    (
+        "status",
+        {"status": "processing"},
+        {"status": "processing", "filename": "test.mp3", "created_at": ANY}
+    ),
+    (
+        "result",
+        {"status": "completed", "transcription": "This is a test transcription", "summary": "This is a test summary"},
+        {"status": "completed", "transcript": "This is a test transcription", "summary": "This is a test summary", "error_message": None}
+    ),
+    (
+        "result",
+        {"status": "failed", "error_message": "Processing failed"},
+        {"status": "failed", "transcript": None, "summary": None, "error_message": "Processing failed"}
+    ),
+], ids=["status-processing", "result-completed", "result-failed"])
+def test_job_endpoint_valid_job(make_job, client, endpoint, columns, expected):
+    """Test the status and result endpoints with a job in the database"""
+    job_id = make_job(**columns)
     
-    # Test the endpoint
-    client = TestClient(app)
-    response = client.get(f"/status/{job_id}")
+    response = client.get(f"/{endpoint}/{job_id}")
     assert response.status_code == 200
     
     data = response.json()
     assert data["job_id"] == job_id
-    assert data["status"] == "processing"
-    assert data["filename"] == "test.mp3"
-    assert "created_at" in data
+    for field, value in expected.items():
+        assert data[field] == value
 
 
-def test_status_endpoint_invalid_job():
-    """Test status endpoint with invalid job ID"""
-    fake_job_id = str(uuid.uuid4())
-    client = TestClient(app)
-    response = client.get(f"/status/{fake_job_id}")
+@pytest.mark.parametrize("endpoint", ["status", "result"])
+def test_job_endpoint_invalid_job(client, endpoint, new_job_id):
+    """Test the status and result endpoints with an unknown job ID"""
+    fake_job_id = new_job_id()
+    response = client.get(f"/{endpoint}/{fake_job_id}")
     assert response.status_code == 404
-    assert "not found" in response.json()["detail"]
-
-
-def test_result_endpoint_completed_job():
-    """Test result endpoint with completed job"""
-    # Create a test job with results
-    db = TestingSessionLocal()
-    job_id = str(uuid.uuid4())
-    job = ProcessingJob(
-        id=job_id,
-        filename="test.mp3",
-        status="completed",
-        transcription="This is a test transcription",
-        summary="This is a test summary"
-    )
-    db.add(job)
-    db.commit()
-    db.close()
+    assert _NOT_FOUND.search(response.json()["detail"])
+
+
+def test_summary_stream(make_job, client, db_session):
+    """Test that a summary awaiting the batch is streamed from the transcript and stored on the job"""
+    job_id = make_job(status="awaiting_summary", transcription="This is a test transcription")
+    
+    with patch('app.main.get_summarization_service') as mock_factory:
+        mock_factory.return_value.summarize_text_stream.return_value = iter(["Streamed ", "summary"])
+        response = client.get(f"/summary-stream/{job_id}")
     
-    # Test the endpoint
-    client = TestClient(app)
-    response = client.get(f"/result/{job_id}")
     assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text == "Streamed summary"
+    mock_factory.return_value.summarize_text_stream.assert_called_once_with("This is a test transcription")
     
-    data = response.json()
-    assert data["job_id"] == job_id
-    assert data["status"] == "completed"
-    assert data["transcription"] == "This is a test transcription"
-    assert data["summary"] == "This is a test summary"
-    assert data["error_message"] is None
-
-
-def test_result_endpoint_failed_job():
-    """Test result endpoint with failed job"""
-    # Create a test job with error
-    db = TestingSessionLocal()
-    job_id = str(uuid.uuid4())
-    job = ProcessingJob(
-        id=job_id,
-        filename="test.mp3",
-        status="failed",
-        error_message="Processing failed"
-    )
-    db.add(job)
-    db.commit()
-    db.close()
+    job = db_session.get(ProcessingJob, job_id, populate_existing=True)
+    assert (job.status, job.summary, job.batch_id) == ("completed", "Streamed summary", None)
+
+
+def test_summary_stream_failure_returns_job_to_batch(make_job, client, db_session):
+    """Test that a summary stream that fails leaves the job waiting for its batch summary"""
+    job_id = make_job(status="awaiting_summary", transcription="This is a test transcription")
     
-    # Test the endpoint
-    client = TestClient(app)
-    response = client.get(f"/result/{job_id}")
-    assert response.status_code == 200
+    with patch('app.main.get_summarization_service') as mock_factory:
+        mock_factory.return_value.summarize_text_stream.side_effect = Exception("API unavailable")
+        response = client.get(f"/summary-stream/{job_id}")
     
-    data = response.json()
-    assert data["job_id"] == job_id
-    assert data["status"] == "failed"
-    assert data["transcription"] is None
-    assert data["summary"] is None
-    assert data["error_message"] == "Processing failed"
+    assert response.status_code == 500
+    job = db_session.get(ProcessingJob, job_id, populate_existing=True)
+    assert (job.status, job.summary, job.batch_id) == ("awaiting_summary", None, None)
 
 
-def test_result_endpoint_invalid_job():
-    """Test result endpoint with invalid job ID"""
-    fake_job_id = str(uuid.uuid4())
-    client = TestClient(app)
-    response = client.get(f"/result/{fake_job_id}")
-    assert response.status_code == 404
-    assert "not found" in response.json()["detail"]
+@pytest.mark.parametrize("columns,status_code", [
+    ({"status": "pending"}, 409),
+    ({"status": "processing", "transcription": "This is a test transcription"}, 409),
+    ({"status": "summarizing", "transcription": "This is a test transcription", "batch_id": "batch-123"}, 409),
+    ({"status": "failed", "transcription": "This is a test transcription", "error_message": "Database error"}, 422),
+], ids=["no-transcript", "worker-summarizing", "batch-summarizing", "failed"])
+def test_summary_stream_not_ready(make_job, client, columns, status_code):
+    """Test that nothing is streamed before the transcript, while it is summarized elsewhere, or for a failed job"""
+    job_id = make_job(**columns)
+    
+    with patch('app.main.get_summarization_service') as mock_factory:
+        response = client.get(f"/summary-stream/{job_id}")
+    
+    assert response.status_code == status_code
+    mock_factory.assert_not_called()
 
 
-def test_upload_no_file():
+def test_upload_no_file(client):
     """Test upload endpoint without providing a file"""
-    client = TestClient(app)
     response = client.post("/upload")
     assert response.status_code == 422  # Unprocessable Entity
 
 
-def test_upload_empty_file():
+def test_upload_empty_file(client):
     """Test upload endpoint with empty file"""
     files = {
         'file': ('empty.mp3', io.BytesIO(b""), 'audio/mpeg')
     }
     
-    client = TestClient(app)
     response = client.post("/upload", files=files)
     assert response.status_code == 400
     assert "detail" in response.json()
 
 
 if __name__ == "__main__":
-    # Clean up test database if it exists
-    if os.path.exists("test_api_endpoints.db"):
-        os.remove("test_api_endpoints.db")
-    
-    print("🧪 Running API Endpoint Tests")
-    
-    tests = [
-        ("Root endpoint", test_root_endpoint),
-        ("Health endpoint", test_health_endpoint),
-        ("Upload valid MP3", test_upload_valid_mp3_file),
-        ("Upload invalid format", test_upload_invalid_file_format),
-        ("Upload oversized file", test_upload_oversized_file),
-        ("Status valid job", test_status_endpoint_valid_job),
-        ("Status invalid job", test_status_endpoint_invalid_job),
-        ("Result completed job", test_result_endpoint_completed_job),
-        ("Result failed job", test_result_endpoint_failed_job),
-        ("Result invalid job", test_result_endpoint_invalid_job),
-        ("Upload no file", test_upload_no_file),
-        ("Upload empty file", test_upload_empty_file),
-    ]
-    
-    passed = 0
-    failed = 0
-    
-    for test_name, test_func in tests:
-        try:
-            test_func()
-            print(f"✅ {test_name} - PASSED")
-            passed += 1
-        except Exception as e:
-            print(f"❌ {test_name} - FAILED: {e}")
-            failed += 1
-    
-    print(f"\n📊 Results: {passed} passed, {failed} failed")
-    
-    # Clean up
-    if os.path.exists("test_api_endpoints.db"):
-        os.remove("test_api_endpoints.db")
\ No newline at end of file
+    pytest.main([__file__])
@@ -1,62 +1,69 @@
 """
 Test core workflow functionality without API endpoints
 """
+import hashlib
 import pytest
 import os
-import tempfile
-import uuid
-from unittest.mock import patch, Mock, MagicMock
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.database import get_db
-from app.models import Base, ProcessingJob
+import threading
+from types import SimpleNamespace
+from unittest.mock import Mock
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+from app import database
+from app.config import settings
+from app.models import ProcessingJob
 from app.services.file_handler import FileHandler
-from app.tasks import process_audio_file, update_job_status
+from app.crud import JobCRUD
+from app.tasks import (
+    flush_summarization_batch,
+    poll_summarization_batches,
+    process_audio_batch,
+    process_audio_file,
+    summarize_job,
+    update_job_status,
+)
 from app.services.transcription import TranscriptionService
 from app.services.summarization import SummarizationService
 
-# Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_core_workflow.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Mock MP3 content: an ID3 header followed by filler
+MOCK_MP3 = b"ID3\x03\x00\x00\x00" + b"fake mp3 content for testing" * 50
+MOCK_MP3_HASH = hashlib.sha256(MOCK_MP3).hexdigest()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+
+@pytest.fixture(scope="module")
+def mp3_source(tmp_path_factory):
+    """Mock MP3 file written once for all of the module's tests"""
+    path = tmp_path_factory.mktemp("mp3") / "source.mp3"
+    path.write_bytes(MOCK_MP3)
+    return path
+
+
+@pytest.fixture
+def mp3_path(mp3_source, tmp_path):
+    """
+    Hard link to the module's mock MP3 in the test's temporary directory.
+    
+    The task deletes the file it processed; that only removes the link, not the source.
+    """
+    path = tmp_path / "test.mp3"
+    os.link(mp3_source, path)
+    return str(path)
+
+
+def _outcome(value):
+    """side_effect for a mocked service call: raise exceptions, return anything else"""
+    if isinstance(value, Exception):
+        return value
+    return lambda *args, **kwargs: value
 
 
 class TestCoreWorkflow:
     """Test cases for core workflow functionality"""
     
-    def setup_method(self):
-        """Set up test fixtures"""
-        # Create mock MP3 content
-        self.mock_mp3_content = b"ID3\x03\x00\x00\x00" + b"fake mp3 content for testing" * 50
-        
-        # Create test uploads directory
-        self.test_uploads_dir = "test_uploads"
-        os.makedirs(self.test_uploads_dir, exist_ok=True)
-    
-    def teardown_method(self):
-        """Clean up after tests"""
-        # Clean up test uploads directory
-        if os.path.exists(self.test_uploads_dir):
-            for file in os.listdir(self.test_uploads_dir):
-                try:
-                    os.remove(os.path.join(self.test_uploads_dir, file))
-                except:
-                    pass
-            try:
-                os.rmdir(self.test_uploads_dir)
-            except:
-                pass
-    
     def test_file_handler_validation(self):
         """Test FileHandler validation methods"""
         # Test valid MP3 file
-        valid_file = Mock()
-        valid_file.filename = "test.mp3"
-        valid_file.content_type = "audio/mpeg"
-        valid_file.size = 1024 * 1024  # 1MB
+        valid_file = SimpleNamespace(filename="test.mp3", content_type="audio/mpeg", size=1024 * 1024)  # 1MB
         
         # Should not raise exception
         try:
@@ -67,229 +74,203 @@ class TestCoreWorkflow:
             assert False, "Valid file should pass validation"
         
         # Test invalid file format
-        invalid_file = Mock()
-        invalid_file.filename = "test.txt"
-        invalid_file.content_type = "text/plain"
+        invalid_file = SimpleNamespace(filename="test.txt", content_type="text/plain", size=1024)
         
         with pytest.raises(Exception):
             FileHandler.validate_mp3_file(invalid_file)
         
         # Test oversized file
-        large_file = Mock()
-        large_file.filename = "large.mp3"
-        large_file.content_type = "audio/mpeg"
-        large_file.size = 30 * 1024 * 1024  # 30MB
+        large_file = SimpleNamespace(filename="large.mp3", content_type="audio/mpeg", size=settings.MAX_FILE_SIZE_BYTES + 1)
         
         with pytest.raises(Exception):
             FileHandler.validate_file_size(large_file)
     
-    def test_job_status_update(self):
+    def test_job_status_update(self, db_session, task_sessions, new_job_id):
         """Test job status update functionality"""
         # Create a test job in database
-        db = TestingSessionLocal()
-        job_id = str(uuid.uuid4())
+        job_id = new_job_id()
         job = ProcessingJob(
             id=job_id,
             filename="test.mp3",
             status="pending"
         )
-        db.add(job)
-        db.commit()
-        db.close()
+        db_session.add(job)
+        db_session.flush()
         
         # Test updating job status
         update_job_status(job_id, "processing")
         
         # Verify job was updated
-        db = TestingSessionLocal()
-        updated_job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-        assert updated_job.status == "processing"
-        db.close()
+        db_session.refresh(job)
+        assert job.status == "processing"
         
         # Test updating with additional fields
         update_job_status(job_id, "completed", transcription="Test transcription", summary="Test summary")
         
         # Verify additional fields were updated
-        db = TestingSessionLocal()
-        final_job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-        assert final_job.status == "completed"
-        assert final_job.transcription == "Test transcription"
-        assert final_job.summary == "Test summary"
-        db.close()
+        db_session.refresh(job)
+        assert job.status == "completed"
+        assert job.transcription == "Test transcription"
+        assert job.summary == "Test summary"
     
-    @patch('app.services.transcription.get_transcription_service')
-    @patch('app.services.summarization.get_summarization_service')
-    def test_successful_processing_workflow(self, mock_summarization_service, mock_transcription_service):
-        """Test successful end-to-end processing workflow"""
+    @pytest.mark.parametrize("transcribe,summarize,expected", [
+        (
+            "This is a test transcription from the audio file.",
+            "This is a test summary of the transcription.",
+            {
+                "status": "completed",
+                "transcription": "This is a test transcription from the audio file.",
+                "summary": "This is a test summary of the transcription."
+            }
+        ),
+        (
+            Exception("Transcription API failed"),
+            None,
+            {"status": "failed", "error_message": "Transcription failed: Transcription API failed"}
+        ),
+        (
+            # Summarization failing still completes the job, with the transcription only
+            "This is a successful transcription.",
+            Exception("Summarization API failed"),
+            {
+                "status": "completed",
+                "transcription": "This is a successful transcription.",
+                "summary": "Summary generation failed: Summarization API failed"
+            }
+        ),
+    ], ids=["success", "transcription-failure", "summarization-failure"])
+    def test_processing_workflow(self, transcribe, summarize, expected, mp3_path, db_session, task_sessions, monkeypatch, new_job_id):
+        """Test the processing workflow when each service succeeds or fails"""
         # Create a test job in database
-        db = TestingSessionLocal()
-        job_id = str(uuid.uuid4())
+        job_id = new_job_id()
         job = ProcessingJob(
             id=job_id,
             filename="test.mp3",
             status="pending"
         )
-        db.add(job)
-        db.commit()
-        db.close()
+        db_session.add(job)
+        db_session.flush()
         
-        # Create a temporary test file
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-            temp_file.write(self.mock_mp3_content)
-            temp_file_path = temp_file.name
+        # Stub the services the task looks up; an exception outcome is raised by the call,
+        # anything else returned. Progress updates go nowhere.
+        mock_transcription = SimpleNamespace(
+            get_cached_transcription=lambda content_hash: None,
+            transcribe_audio=Mock(side_effect=_outcome(transcribe))
+        )
+        mock_summarization = SimpleNamespace(summarize_text=Mock(side_effect=_outcome(summarize)))
+        monkeypatch.setattr("app.tasks.get_transcription_service", lambda: mock_transcription)
+        monkeypatch.setattr("app.tasks.get_summarization_service", lambda: mock_summarization)
+        monkeypatch.setattr("app.tasks.current_task", SimpleNamespace(update_state=lambda **_: None))
         
-        try:
-            # Mock services
-            mock_transcription = Mock()
-            mock_transcription.transcribe_audio.return_value = "This is a test transcription from the audio file."
-            mock_transcription_service.return_value = mock_transcription
-            
-            mock_summarization = Mock()
-            mock_summarization.summarize_text.return_value = "This is a test summary of the transcription."
-            mock_summarization_service.return_value = mock_summarization
-            
-            # Execute the processing task
-            result = process_audio_file(job_id, temp_file_path)
-            
-            # Verify result
-            assert result["status"] == "completed"
-            assert result["transcription"] == "This is a test transcription from the audio file."
-            assert result["summary"] == "This is a test summary of the transcription."
-            
-            # Verify job was updated in database
-            db = TestingSessionLocal()
-            updated_job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-            assert updated_job.status == "completed"
-            assert updated_job.transcription == "This is a test transcription from the audio file."
-            assert updated_job.summary == "This is a test summary of the transcription."
-            db.close()
-            
-            # Verify services were called correctly
-            mock_transcription.transcribe_audio.assert_called_once_with(temp_file_path)
-            mock_summarization.summarize_text.assert_called_once_with("This is a test transcription from the audio file.")
-            
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+        # Execute the processing task; a failed job re-raises the error
+        if expected["status"] == "failed":
+            with pytest.raises(Exception, match=str(transcribe)):
+                process_audio_file(job_id, mp3_path)
+        else:
+            result = process_audio_file(job_id, mp3_path)
+            for field, value in expected.items():
+                assert result[field] == value
+        
+        # Verify job was updated in database
+        db_session.refresh(job)
+        for field, value in expected.items():
+            assert getattr(job, field) == value
+        
+        # Verify services were called correctly
+        mock_transcription.transcribe_audio.assert_called_once_with(mp3_path, content_hash=MOCK_MP3_HASH, cache_checked=True)
+        if isinstance(transcribe, Exception):
+            mock_summarization.summarize_text.assert_not_called()
+        else:
+            mock_summarization.summarize_text.assert_called_once_with(transcribe)
     
-    @patch('app.services.transcription.get_transcription_service')
-    def test_transcription_failure_workflow(self, mock_transcription_service):
-        """Test workflow when transcription fails"""
-        # Create a test job in database
-        db = TestingSessionLocal()
-        job_id = str(uuid.uuid4())
-        job = ProcessingJob(
-            id=job_id,
-            filename="test.mp3",
-            status="pending"
+    def test_segmented_audio_overlaps_transcription_and_summarization(self, mp3_path, db_session, task_sessions, monkeypatch, new_job_id, tmp_path):
+        """Test that segment summaries start while later segments are still being transcribed"""
+        job_id = new_job_id()
+        db_session.add(ProcessingJob(id=job_id, filename="test.mp3", status="pending"))
+        db_session.flush()
+        
+        segment_dir = tmp_path / "segments"
+        segment_dir.mkdir()
+        segments = [str(segment_dir / f"{index:04d}.mp3") for index in range(3)]
+        summary_started = threading.Event()
+        waited_for_summary = []
+        
+        def transcribe_audio(path):
+            index = segments.index(path)
+            if index == 2:
+                # The last segment only finishes once an earlier one is being summarized
+                waited_for_summary.append(summary_started.wait(timeout=5))
+            return f"Text of segment {index}."
+        
+        def summarize_text(text):
+            summary_started.set()
+            return f"Summary of {text}"
+        
+        mock_transcription = SimpleNamespace(
+            get_cached_transcription=Mock(return_value=None),
+            cache_transcription=Mock(),
+            transcribe_audio=transcribe_audio
         )
-        db.add(job)
-        db.commit()
-        db.close()
+        monkeypatch.setattr("app.tasks.split_audio", lambda path, seconds: segments)
+        monkeypatch.setattr("app.tasks.get_transcription_service", lambda: mock_transcription)
+        monkeypatch.setattr("app.tasks.get_summarization_service", lambda: SimpleNamespace(
+            summarize_text=summarize_text,
+            combine_summaries=lambda partials: " | ".join(partials)
+        ))
+        monkeypatch.setattr("app.tasks.current_task", SimpleNamespace(update_state=lambda **_: None))
         
-        # Create a temporary test file
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-            temp_file.write(self.mock_mp3_content)
-            temp_file_path = temp_file.name
+        result = process_audio_file(job_id, mp3_path)
         
-        try:
-            # Mock transcription service to fail
-            mock_transcription = Mock()
-            mock_transcription.transcribe_audio.side_effect = Exception("Transcription API failed")
-            mock_transcription_service.return_value = mock_transcription
-            
-            # Execute the task - should raise exception
-            with pytest.raises(Exception, match="Transcription API failed"):
-                process_audio_file(job_id, temp_file_path)
-            
-            # Verify job was marked as failed
-            db = TestingSessionLocal()
-            failed_job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-            assert failed_job.status == "failed"
-            assert "Transcription API failed" in failed_job.error_message
-            db.close()
-            
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+        assert waited_for_summary == [True]
+        assert result["transcription"] == "Text of segment 0. Text of segment 1. Text of segment 2."
+        assert result["summary"] == " | ".join(f"Summary of Text of segment {index}." for index in range(3))
+        assert not segment_dir.exists()
+        
+        # The joined transcript is cached for the whole file, so a re-upload is not split again
+        mock_transcription.get_cached_transcription.assert_called_once_with(MOCK_MP3_HASH)
+        mock_transcription.cache_transcription.assert_called_once_with(MOCK_MP3_HASH, result["transcription"])
     
-    @patch('app.services.transcription.get_transcription_service')
-    @patch('app.services.summarization.get_summarization_service')
-    def test_summarization_failure_workflow(self, mock_summarization_service, mock_transcription_service):
-        """Test workflow when summarization fails but transcription succeeds"""
-        # Create a test job in database
-        db = TestingSessionLocal()
-        job_id = str(uuid.uuid4())
-        job = ProcessingJob(
-            id=job_id,
-            filename="test.mp3",
-            status="pending"
+    def test_cached_whole_file_transcription_skips_splitting(self, mp3_path, db_session, task_sessions, monkeypatch, new_job_id):
+        """Test that a recording whose transcript is cached is neither split nor transcribed again"""
+        job_id = new_job_id()
+        db_session.add(ProcessingJob(id=job_id, filename="test.mp3", status="pending"))
+        db_session.flush()
+        
+        split_audio = Mock()
+        mock_transcription = SimpleNamespace(
+            get_cached_transcription=Mock(return_value="Cached transcript of the whole recording."),
+            transcribe_audio=Mock()
         )
-        db.add(job)
-        db.commit()
-        db.close()
+        monkeypatch.setattr("app.tasks.split_audio", split_audio)
+        monkeypatch.setattr("app.tasks.get_transcription_service", lambda: mock_transcription)
+        monkeypatch.setattr("app.tasks.get_summarization_service", lambda: SimpleNamespace(summarize_text=lambda text: "Summary."))
+        monkeypatch.setattr("app.tasks.current_task", SimpleNamespace(update_state=lambda **_: None))
         
-        # Create a temporary test file
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-            temp_file.write(self.mock_mp3_content)
-            temp_file_path = temp_file.name
+        result = process_audio_file(job_id, mp3_path, MOCK_MP3_HASH)
         
-        try:
-            # Mock transcription to succeed
-            mock_transcription = Mock()
-            mock_transcription.transcribe_audio.return_value = "This is a successful transcription."
-            mock_transcription_service.return_value = mock_transcription
-            
-            # Mock summarization to fail
-            mock_summarization = Mock()
-            mock_summarization.summarize_text.side_effect = Exception("Summarization API failed")
-            mock_summarization_service.return_value = mock_summarization
-            
-            # Execute the task - should complete with transcription only
-            result = process_audio_file(job_id, temp_file_path)
-            
-            # Verify result - should be completed with transcription but failed summary
-            assert result["status"] == "completed"
-            assert result["transcription"] == "This is a successful transcription."
-            assert "Summarization API failed" in result["summary"]
-            
-            # Verify job was updated in database
-            db = TestingSessionLocal()
-            updated_job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
-            assert updated_job.status == "completed"
-            assert updated_job.transcription == "This is a successful transcription."
-            assert "Summarization API failed" in updated_job.summary
-            db.close()
-            
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+        assert (result["transcription"], result["summary"]) == ("Cached transcript of the whole recording.", "Summary.")
+        mock_transcription.get_cached_transcription.assert_called_once_with(MOCK_MP3_HASH)
+        split_audio.assert_not_called()
+        mock_transcription.transcribe_audio.assert_not_called()
     
-    def test_service_integration(self):
-        """Test that services can be instantiated and have expected methods"""
-        # Test transcription service
-        with patch('app.services.transcription.settings.OPENAI_API_KEY', 'test-key'):
-            transcription_service = TranscriptionService()
-            assert hasattr(transcription_service, 'transcribe_audio')
-            assert hasattr(transcription_service, 'validate_api_key')
-        
-        # Test summarization service
-        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
-            summarization_service = SummarizationService()
-            assert hasattr(summarization_service, 'summarize_text')
-            assert hasattr(summarization_service, 'validate_api_key')
+    @pytest.mark.parametrize("service_class,method", [
+        (TranscriptionService, "transcribe_audio"),
+        (TranscriptionService, "validate_api_key"),
+        (SummarizationService, "summarize_text"),
+        (SummarizationService, "validate_api_key"),
+    ])
+    def test_service_integration(self, service_class, method):
+        """Test that the services expose the methods the task and API call"""
+        assert callable(getattr(service_class, method, None))
     
-    def test_file_cleanup_functionality(self):
+    def test_file_cleanup_functionality(self, tmp_path):
         """Test file cleanup functionality"""
         from app.tasks import cleanup_file_safe
         
         # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(b"test content")
-            temp_file_path = temp_file.name
+        temp_file = tmp_path / "test-content"
+        temp_file.write_bytes(b"test content")
+        temp_file_path = str(temp_file)
         
         # Verify file exists
         assert os.path.exists(temp_file_path)
@@ -303,43 +284,179 @@ class TestCoreWorkflow:
         result = cleanup_file_safe("/nonexistent/file.mp3", "test-job-id")
         assert result is False
 
-
-if __name__ == "__main__":
-    # Clean up test database if it exists
-    if os.path.exists("test_core_workflow.db"):
-        os.remove("test_core_workflow.db")
     
-    print("🧪 Running Core Workflow Tests")
-    
-    test_instance = TestCoreWorkflow()
+    def test_process_audio_batch(self, mp3_source, db_session, task_sessions, monkeypatch, new_job_id, tmp_path):
+        """Test that the files transcribe concurrently, a failing item fails only its own job and the rest are saved in one write"""
+        job_ids = [new_job_id() for _ in range(3)]
+        paths = []
+        for index, job_id in enumerate(job_ids):
+            db_session.add(ProcessingJob(id=job_id, filename=f"test{index}.mp3", status="pending"))
+            path = tmp_path / f"test{index}.mp3"
+            os.link(mp3_source, path)
+            paths.append(str(path))
+        db_session.flush()
+        
+        # The first item carries the hash computed at upload, the others are hashed by the task
+        items = [(job_ids[0], paths[0], "upload-hash"), (job_ids[1], paths[1]), (job_ids[2], paths[2])]
+        
+        last_started = threading.Event()
+        waited_for_last = []
+        
+        def transcribe_audio(path, content_hash=None):
+            if path == paths[0]:
+                # The first file only finishes once the last one is being transcribed too
+                waited_for_last.append(last_started.wait(timeout=5))
+            elif path == paths[1]:
+                raise Exception("Whisper unavailable")
+            else:
+                last_started.set()
+            return f"Transcript of {os.path.basename(path)}"
+        
+        mock_transcription = SimpleNamespace(transcribe_audio=Mock(side_effect=transcribe_audio))
+        mock_summarization = SimpleNamespace(
+            summarize_texts_packed=Mock(side_effect=lambda texts: [f"Summary of {text}" for text in texts])
+        )
+        update_jobs_bulk = Mock(wraps=JobCRUD.update_jobs_bulk)
+        monkeypatch.setattr("app.tasks.get_transcription_service", lambda: mock_transcription)
+        monkeypatch.setattr("app.tasks.get_summarization_service", lambda: mock_summarization)
+        monkeypatch.setattr(JobCRUD, "update_jobs_bulk", update_jobs_bulk)
+        monkeypatch.setattr(process_audio_batch, "update_state", lambda **_: None)
+        
+        results = process_audio_batch(items)
+        
+        assert waited_for_last == [True]
+        assert [result["status"] for result in results] == ["completed", "failed", "completed"]
+        assert "Whisper unavailable" in results[1]["error_message"]
+        assert results[2]["summary"] == "Summary of Transcript of test2.mp3"
+        
+        # Both transcripts go to the summarizer together; all jobs start in one write and
+        # the successful ones are saved in another
+        mock_summarization.summarize_texts_packed.assert_called_once_with(
+            ["Transcript of test0.mp3", "Transcript of test2.mp3"]
+        )
+        assert [[job["status"] for job in call.args[1]] for call in update_jobs_bulk.call_args_list] == [
+            ["processing"] * 3,
+            ["completed", "completed"]
+        ]
+        mock_transcription.transcribe_audio.assert_any_call(paths[0], content_hash="upload-hash")
+        mock_transcription.transcribe_audio.assert_any_call(paths[2])
+        
+        db_session.expire_all()
+        jobs = [db_session.get(ProcessingJob, job_id) for job_id in job_ids]
+        assert [job.status for job in jobs] == ["completed", "failed", "completed"]
+        assert jobs[0].content_hash == "upload-hash"
+        assert jobs[2].content_hash == FileHandler.compute_sha256(str(mp3_source))
+        assert jobs[0].summary == "Summary of Transcript of test0.mp3"
+        assert jobs[1].transcription is None
+        assert not any(os.path.exists(path) for path in paths)
+
+class TestSummaryBatchTasks:
+    """Test cases for summary generation through the OpenAI Batch API"""
     
-    tests = [
-        ("File handler validation", test_instance.test_file_handler_validation),
-        ("Job status update", test_instance.test_job_status_update),
-        ("Successful processing workflow", test_instance.test_successful_processing_workflow),
-        ("Transcription failure workflow", test_instance.test_transcription_failure_workflow),
-        ("Summarization failure workflow", test_instance.test_summarization_failure_workflow),
-        ("Service integration", test_instance.test_service_integration),
-        ("File cleanup functionality", test_instance.test_file_cleanup_functionality),
-    ]
+    LONG_TEXT = "This transcript is long enough to be summarized through the batch. " * 10
+    SHORT_TEXT = "This transcript is short enough to stand as its own summary."
     
-    passed = 0
-    failed = 0
+    @pytest.fixture
+    def batch_service(self, monkeypatch):
+        """Stand-in SummarizationService for the flush and poll tasks"""
+        def validate_text(text):
+            if not text:
+                raise ValueError("Text cannot be empty")
+            return text
+        
+        service = SimpleNamespace(
+            validate_text=validate_text,
+            passthrough_length=300,
+            fits_single_request=lambda text: True,
+            summarize_text=Mock(return_value="Passthrough summary."),
+            submit_batch=Mock(return_value="batch-123"),
+            fetch_batch=Mock(return_value=None)
+        )
+        monkeypatch.setattr("app.tasks.get_summarization_service", lambda: service)
+        return service
     
-    for test_name, test_func in tests:
-        try:
-            test_instance.setup_method()
-            test_func()
-            test_instance.teardown_method()
-            print(f"✅ {test_name} - PASSED")
-            passed += 1
-        except Exception as e:
-            test_instance.teardown_method()
-            print(f"❌ {test_name} - FAILED: {e}")
-            failed += 1
+    def test_flush_and_poll_summarization_batch(self, db_session, task_sessions, monkeypatch, new_job_id, batch_service):
+        """Test awaiting_summary -> summarizing -> completed, and the jobs completed outside the batch"""
+        batched, passthrough, invalid = new_job_id(), new_job_id(), new_job_id()
+        for job_id, transcription in ((batched, self.LONG_TEXT), (passthrough, self.SHORT_TEXT), (invalid, "")):
+            db_session.add(ProcessingJob(id=job_id, filename="test.mp3", status="awaiting_summary", transcription=transcription))
+        db_session.flush()
+        
+        enqueue = Mock()
+        monkeypatch.setattr(summarize_job, "delay", enqueue)
+        
+        assert flush_summarization_batch() == "batch-123"
+        batch_service.submit_batch.assert_called_once_with({batched: self.LONG_TEXT})
+        
+        # The short text is left to a summarization task instead of being summarized here
+        batch_service.summarize_text.assert_not_called()
+        enqueue.assert_called_once_with(passthrough)
+        
+        db_session.expire_all()
+        job = db_session.get(ProcessingJob, batched)
+        assert (job.status, job.batch_id, job.summary) == ("summarizing", "batch-123", None)
+        job = db_session.get(ProcessingJob, passthrough)
+        assert (job.status, job.batch_id) == ("summarizing", None)
+        job = db_session.get(ProcessingJob, invalid)
+        assert (job.status, job.summary) == ("completed", "Summary generation failed: Text cannot be empty")
+        
+        assert summarize_job(passthrough)["summary"] == "Passthrough summary."
+        batch_service.summarize_text.assert_called_once_with(self.SHORT_TEXT)
+        
+        # Nothing is stored while the batch is still running
+        assert poll_summarization_batches() == 0
+        
+        batch_service.fetch_batch.return_value = {batched: "Batch summary."}
+        assert poll_summarization_batches() == 1
+        batch_service.fetch_batch.assert_called_with("batch-123")
+        
+        db_session.expire_all()
+        for job_id, summary in ((batched, "Batch summary."), (passthrough, "Passthrough summary.")):
+            job = db_session.get(ProcessingJob, job_id)
+            assert (job.status, job.summary) == ("completed", summary)
+        
+        # Every job has left the batch queue
+        assert flush_summarization_batch() is None
+        batch_service.submit_batch.assert_called_once()
     
-    print(f"\n📊 Results: {passed} passed, {failed} failed")
+    def test_flush_skips_claimed_jobs_and_returns_them_on_failure(self, db_session, task_sessions, new_job_id, batch_service):
+        """Test that a job claimed by one flush isn't sent by another, and a failed submission puts it back"""
+        job_id = new_job_id()
+        db_session.add(ProcessingJob(id=job_id, filename="test.mp3", status="awaiting_summary", transcription=self.LONG_TEXT))
+        db_session.flush()
+        
+        def submit_batch(texts):
+            # A flush overlapping this one, while its batch is being submitted
+            assert flush_summarization_batch() is None
+            raise Exception("Batch API unavailable")
+        
+        batch_service.submit_batch.side_effect = submit_batch
+        
+        with pytest.raises(Exception, match="Batch API unavailable"):
+            flush_summarization_batch()
+        
+        batch_service.submit_batch.assert_called_once()
+        db_session.expire_all()
+        job = db_session.get(ProcessingJob, job_id)
+        assert (job.status, job.batch_id) == ("awaiting_summary", None)
     
-    # Clean up
-    if os.path.exists("test_core_workflow.db"):
-        os.remove("test_core_workflow.db")
\ No newline at end of file
+    def test_create_tables_adds_missing_columns(self, monkeypatch):
+        """Test that create_tables adds nullable columns a pre-existing table predates"""
+        old_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        with old_engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE processing_jobs (id VARCHAR PRIMARY KEY, filename VARCHAR NOT NULL, "
+                "status VARCHAR NOT NULL, transcription TEXT, summary TEXT, error_message VARCHAR, created_at DATETIME)"
+            ))
+            conn.execute(text("INSERT INTO processing_jobs (id, filename, status) VALUES ('old-job', 'old.mp3', 'completed')"))
+        monkeypatch.setattr(database, "engine", old_engine)
+        
+        database.create_tables()
+        
+        inspector = inspect(old_engine)
+        columns = {column["name"] for column in inspector.get_columns("processing_jobs")}
+        assert {"batch_id", "content_hash"} <= columns
+        assert "ix_processing_jobs_content_hash" in {index["name"] for index in inspector.get_indexes("processing_jobs")}
+        with old_engine.connect() as conn:
+            assert conn.execute(text("SELECT status, content_hash FROM processing_jobs")).all() == [("completed", None)]
+        old_engine.dispose()
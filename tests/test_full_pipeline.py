@@ -6,13 +6,23 @@ This tests both the transcription and summarization services working together.
 
 import sys
 import os
-
-# Add the parent directory to the Python path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pytest
 
 from app.services.transcription import get_transcription_service
 from app.services.summarization import get_summarization_service
 
+# Sample transcription text (realistic length and content)
+SAMPLE_TRANSCRIPTION = """
+    Hello everyone, welcome to today's meeting. I wanted to discuss our quarterly results and the upcoming product launch. 
+    First, let me go over the sales numbers from last quarter. We exceeded our targets by fifteen percent, which is fantastic news. 
+    The marketing team did an excellent job with the campaign, and customer feedback has been overwhelmingly positive. 
+    Now, regarding the new product launch scheduled for next month, we need to finalize the pricing strategy and ensure 
+    our supply chain is ready to handle the expected demand. The engineering team has completed all the testing phases, 
+    and we're confident in the product quality. I'd like to schedule follow-up meetings with each department head to 
+    coordinate the launch activities. Are there any questions or concerns about these topics?
+"""
+
+@pytest.mark.live
 def test_full_pipeline():
     """Test the complete pipeline: audio -> transcription -> summary"""
     
@@ -87,45 +97,35 @@ def test_full_pipeline():
         print(f"❌ Error during pipeline test: {str(e)}")
         return False
 
+@pytest.mark.live
 def test_summarization_with_sample_transcription():
     """Test summarization with a realistic sample transcription"""
     
     print("\n🧪 Testing Summarization with Sample Transcription")
     print("=" * 60)
     
-    # Sample transcription text (realistic length and content)
-    sample_transcription = """
-    Hello everyone, welcome to today's meeting. I wanted to discuss our quarterly results and the upcoming product launch. 
-    First, let me go over the sales numbers from last quarter. We exceeded our targets by fifteen percent, which is fantastic news. 
-    The marketing team did an excellent job with the campaign, and customer feedback has been overwhelmingly positive. 
-    Now, regarding the new product launch scheduled for next month, we need to finalize the pricing strategy and ensure 
-    our supply chain is ready to handle the expected demand. The engineering team has completed all the testing phases, 
-    and we're confident in the product quality. I'd like to schedule follow-up meetings with each department head to 
-    coordinate the launch activities. Are there any questions or concerns about these topics?
-    """
-    
     try:
         print("Initializing summarization service...")
         service = get_summarization_service()
         
-        print(f"Sample transcription length: {len(sample_transcription)} characters")
+        print(f"Sample transcription length: {len(SAMPLE_TRANSCRIPTION)} characters")
         print("\nGenerating summary...")
         
-        summary = service.summarize_text(sample_transcription)
+        summary = service.summarize_text(SAMPLE_TRANSCRIPTION)
         
         print("\n" + "=" * 60)
         print("📝 SAMPLE TRANSCRIPTION:")
         print("=" * 60)
-        print(sample_transcription.strip())
+        print(SAMPLE_TRANSCRIPTION.strip())
         
         print("\n" + "=" * 60)
         print("📋 GENERATED SUMMARY:")
         print("=" * 60)
         print(summary)
         
-        print(f"\nOriginal: {len(sample_transcription)} characters")
+        print(f"\nOriginal: {len(SAMPLE_TRANSCRIPTION)} characters")
         print(f"Summary: {len(summary)} characters")
-        print(f"Compression: {len(summary)/len(sample_transcription):.2%}")
+        print(f"Compression: {len(summary)/len(SAMPLE_TRANSCRIPTION):.2%}")
         
         print("\n✅ Sample transcription summarization test completed!")
         return True
@@ -134,18 +134,12 @@ def test_summarization_with_sample_transcription():
         print(f"❌ Error during sample test: {str(e)}")
         return False
 
-if __name__ == "__main__":
-    print("🚀 Full Pipeline Test: Transcription + Summarization")
-    print("This script will transcribe test.mp3 and then summarize the result.")
-    print("Make sure you have a valid OPENAI_API_KEY in your .env file.\n")
-    
-    # Test 1: Full pipeline with actual audio file
-    success1 = test_full_pipeline()
-    
-    # Test 2: Summarization with sample transcription (as backup)
-    success2 = test_summarization_with_sample_transcription()
+def test_pipeline_with_stub_services(monkeypatch, tmp_path, stub_transcription, stub_summarization):
+    """Run both pipeline checks against canned services, without the network or a real test.mp3"""
+    monkeypatch.setattr(sys.modules[__name__], "get_transcription_service", lambda: stub_transcription)
+    monkeypatch.setattr(sys.modules[__name__], "get_summarization_service", lambda: stub_summarization)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "test.mp3").write_bytes(b"ID3")
     
-    if success1 or success2:
-        print("\n🏁 At least one test completed successfully!")
-    else:
-        print("\n❌ All tests failed. Please check your configuration.")
\ No newline at end of file
+    assert test_full_pipeline() is True
+    assert test_summarization_with_sample_transcription() is True
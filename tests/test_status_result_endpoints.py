@@ -1,51 +1,42 @@
 """
 Test the status and result endpoints
 """
+import asyncio
+import anyio
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.main import app
-from app.database import get_db
-from app.models import Base, ProcessingJob
-import uuid
-import os
+from sqlalchemy.orm import Session
+from app.models import ProcessingJob
 
-# Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_endpoints.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Requests read from the test's rolled-back session (see conftest.py)
+pytestmark = pytest.mark.usefixtures("override_get_db")
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-# Override the database dependency
-app.dependency_overrides[get_db] = override_get_db
-
-# Create test client
-client = TestClient(app)
+@pytest.fixture(scope="module")
+def seeded_jobs(engine, new_job_id):
+    """Insert one job per state in a single batch for the whole module; no test changes them"""
+    ids = {state: new_job_id() for state in ("processing", "completed", "failed")}
+    with Session(engine) as session:
+        session.bulk_save_objects([
+            ProcessingJob(id=ids["processing"], filename="test.mp3", status="processing"),
+            ProcessingJob(
+                id=ids["completed"],
+                filename="test.mp3",
+                status="completed",
+                transcription="This is a test transcription",
+                summary="This is a test summary"
+            ),
+            ProcessingJob(id=ids["failed"], filename="test.mp3", status="failed", error_message="Processing failed")
+        ])
+        session.commit()
+    
+    yield ids
+    
+    with Session(engine) as session:
+        session.query(ProcessingJob).filter(ProcessingJob.id.in_(ids.values())).delete(synchronize_session=False)
+        session.commit()
 
-def test_status_endpoint_valid_job():
+def test_status_endpoint_valid_job(seeded_jobs, client):
     """Test status endpoint with valid job ID"""
-    
-    # Create a test job directly in database
-    db = TestingSessionLocal()
-    job_id = str(uuid.uuid4())
-    job = ProcessingJob(
-        id=job_id,
-        filename="test.mp3",
-        status="processing"
-    )
-    db.add(job)
-    db.commit()
-    db.close()
+    job_id = seeded_jobs["processing"]
     
     # Test the endpoint
     response = client.get(f"/status/{job_id}")
@@ -57,29 +48,16 @@ def test_status_endpoint_valid_job():
     assert data["filename"] == "test.mp3"
     assert "created_at" in data
 
-def test_status_endpoint_invalid_job():
+def test_status_endpoint_invalid_job(client, new_job_id):
     """Test status endpoint with invalid job ID"""
-    fake_job_id = str(uuid.uuid4())
+    fake_job_id = new_job_id()
     response = client.get(f"/status/{fake_job_id}")
     assert response.status_code == 404
     assert "not found" in response.json()["detail"]
 
-def test_result_endpoint_valid_job():
+def test_result_endpoint_valid_job(seeded_jobs, client):
     """Test result endpoint with valid job ID"""
-    
-    # Create a test job with results
-    db = TestingSessionLocal()
-    job_id = str(uuid.uuid4())
-    job = ProcessingJob(
-        id=job_id,
-        filename="test.mp3",
-        status="completed",
-        transcription="This is a test transcription",
-        summary="This is a test summary"
-    )
-    db.add(job)
-    db.commit()
-    db.close()
+    job_id = seeded_jobs["completed"]
     
     # Test the endpoint
     response = client.get(f"/result/{job_id}")
@@ -88,32 +66,20 @@ def test_result_endpoint_valid_job():
     data = response.json()
     assert data["job_id"] == job_id
     assert data["status"] == "completed"
-    assert data["transcription"] == "This is a test transcription"
+    assert data["transcript"] == "This is a test transcription"
     assert data["summary"] == "This is a test summary"
     assert data["error_message"] is None
 
-def test_result_endpoint_invalid_job():
+def test_result_endpoint_invalid_job(client, new_job_id):
     """Test result endpoint with invalid job ID"""
-    fake_job_id = str(uuid.uuid4())
+    fake_job_id = new_job_id()
     response = client.get(f"/result/{fake_job_id}")
     assert response.status_code == 404
     assert "not found" in response.json()["detail"]
 
-def test_result_endpoint_failed_job():
+def test_result_endpoint_failed_job(seeded_jobs, client):
     """Test result endpoint with failed job"""
-    
-    # Create a test job with error
-    db = TestingSessionLocal()
-    job_id = str(uuid.uuid4())
-    job = ProcessingJob(
-        id=job_id,
-        filename="test.mp3",
-        status="failed",
-        error_message="Processing failed"
-    )
-    db.add(job)
-    db.commit()
-    db.close()
+    job_id = seeded_jobs["failed"]
     
     # Test the endpoint
     response = client.get(f"/result/{job_id}")
@@ -122,41 +88,25 @@ def test_result_endpoint_failed_job():
     data = response.json()
     assert data["job_id"] == job_id
     assert data["status"] == "failed"
-    assert data["transcription"] is None
+    assert data["transcript"] is None
     assert data["summary"] is None
     assert data["error_message"] == "Processing failed"
 
-if __name__ == "__main__":
-    print("🧪 Testing Status and Result Endpoints")
-    
-    try:
-        test_status_endpoint_valid_job()
-        print("✅ Status endpoint with valid job - PASSED")
-    except Exception as e:
-        print(f"❌ Status endpoint with valid job - FAILED: {e}")
-    
-    try:
-        test_status_endpoint_invalid_job()
-        print("✅ Status endpoint with invalid job - PASSED")
-    except Exception as e:
-        print(f"❌ Status endpoint with invalid job - FAILED: {e}")
-    
-    try:
-        test_result_endpoint_valid_job()
-        print("✅ Result endpoint with valid job - PASSED")
-    except Exception as e:
-        print(f"❌ Result endpoint with valid job - FAILED: {e}")
+def test_all_endpoints(seeded_jobs, async_client):
+    """Test fetching status and result for every seeded job in one concurrent batch"""
+    paths = [f"/{endpoint}/{job_id}" for job_id in seeded_jobs.values() for endpoint in ("status", "result")]
     
-    try:
-        test_result_endpoint_invalid_job()
-        print("✅ Result endpoint with invalid job - PASSED")
-    except Exception as e:
-        print(f"❌ Result endpoint with invalid job - FAILED: {e}")
+    async def fetch_all():
+        # The requests share the test's one Session, so its queries must not overlap: give this
+        # loop a single worker thread. Everything else about the requests still interleaves.
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 1
+        async with async_client:
+            return await asyncio.gather(*(async_client.get(path) for path in paths))
     
-    try:
-        test_result_endpoint_failed_job()
-        print("✅ Result endpoint with failed job - PASSED")
-    except Exception as e:
-        print(f"❌ Result endpoint with failed job - FAILED: {e}")
+    responses = asyncio.run(fetch_all())
     
-    print("\n🎉 All endpoint tests completed!")
\ No newline at end of file
+    for path, response in zip(paths, responses):
+        assert response.status_code == 200, path
+        assert response.json()["job_id"] == path.rsplit("/", 1)[1]
+    statuses = {state: responses[2 * i].json()["status"] for i, state in enumerate(seeded_jobs)}
+    assert statuses == {state: state for state in seeded_jobs}
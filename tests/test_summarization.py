@@ -1,15 +1,37 @@
+import json
+import threading
+import time
+import httpx
 import pytest
 from unittest.mock import Mock, patch
-from app.services.summarization import SummarizationService, get_summarization_service
+from app.services.summarization import SummarizationService, get_summarization_service, PROMPT_PREFIX, SYSTEM_PROMPT
+
+
+def _chat_completion(content):
+    """Body of a chat completion API response with a single choice"""
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-3.5-turbo",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]
+    }
+
+
+@pytest.fixture(scope="module")
+def shared_service():
+    """One service for the tests that never reach the API, built once for the module"""
+    with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+        return SummarizationService()
 
 
 class TestSummarizationService:
     """Test cases for the SummarizationService"""
     
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def setup_service(self, shared_service):
         """Set up test fixtures"""
-        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
-            self.service = SummarizationService()
+        self.service = shared_service
     
     def test_initialization_without_api_key(self):
         """Test that service raises error when API key is missing"""
@@ -33,7 +55,7 @@ class TestSummarizationService:
     
     def test_summarize_text_too_long(self):
         """Test that text longer than maximum length raises ValueError"""
-        long_text = "x" * 100001  # Exceeds max_text_length
+        long_text = "x" * (self.service.max_text_length + 1)  # Exceeds max_text_length
         with pytest.raises(ValueError, match="Text is too long for summarization"):
             self.service.summarize_text(long_text)
     
@@ -53,7 +75,7 @@ class TestSummarizationService:
         with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
             service = SummarizationService()
         
-        test_text = "This is a longer text that needs to be summarized. " * 5
+        test_text = "This is a longer text that needs to be summarized. " * 10
         result = service.summarize_text(test_text)
         
         assert result == "This is a test summary."
@@ -70,7 +92,7 @@ class TestSummarizationService:
         with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
             service = SummarizationService()
         
-        test_text = "This is a longer text that needs to be summarized. " * 5
+        test_text = "This is a longer text that needs to be summarized. " * 10
         
         with pytest.raises(Exception, match="Summarization failed: API Error"):
             service.summarize_text(test_text)
@@ -90,11 +112,25 @@ class TestSummarizationService:
         with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
             service = SummarizationService()
         
-        test_text = "This is a longer text that needs to be summarized. " * 5
+        test_text = "This is a longer text that needs to be summarized. " * 10
         result = service.summarize_text(test_text)
         
         assert result == "Unable to generate summary - no content returned."
     
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_short_text_returns_text(self, mock_openai):
+        """Test that text below the passthrough length is its own summary, without an API call"""
+        mock_client = Mock()
+        mock_openai.return_value = mock_client
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        test_text = "  A single sentence transcript that is already shorter than any summary would be.  "
+        
+        assert service.summarize_text(test_text) == test_text.strip()
+        mock_client.chat.completions.create.assert_not_called()
+    
     def test_create_summarization_prompt(self):
         """Test that summarization prompt is created correctly"""
         test_text = "This is test content for summarization."
@@ -103,6 +139,11 @@ class TestSummarizationService:
         assert "Please provide a concise summary" in prompt
         assert test_text in prompt
         assert "Summary:" in prompt
+        
+        # The instructions are an identical prefix whatever the text, so OpenAI can cache them
+        other_prompt = self.service._create_summarization_prompt("Some entirely different content.")
+        assert prompt.startswith(PROMPT_PREFIX)
+        assert prompt[:len(PROMPT_PREFIX)] == other_prompt[:len(PROMPT_PREFIX)]
     
     @patch('app.services.summarization.OpenAI')
     def test_validate_api_key_success(self, mock_openai):
@@ -129,6 +170,332 @@ class TestSummarizationService:
         
         assert service.validate_api_key() is False
     
+    @patch('app.services.summarization.cache')
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_text_uses_cached_summary(self, mock_openai, mock_cache):
+        """Test that a cached summary for the same transcript skips the API call"""
+        mock_client = Mock()
+        mock_openai.return_value = mock_client
+        mock_cache.get_sync.return_value = "Cached summary".encode("utf-8")
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        result = service.summarize_text("This is a test text that needs to be summarized. " * 10)
+        
+        assert result == "Cached summary"
+        mock_client.chat.completions.create.assert_not_called()
+        mock_cache.set_sync.assert_not_called()
+    
+    @patch('app.services.summarization.cache')
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_text_caches_new_summary(self, mock_openai, mock_cache):
+        """Test that a fresh summary is stored under a key derived from the transcript"""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = "Fresh summary"
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create.return_value = mock_response
+        mock_openai.return_value = mock_client
+        mock_cache.get_sync.return_value = None
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        text = "This is a test text that needs to be summarized. " * 10
+        assert service.summarize_text(text) == "Fresh summary"
+        
+        key, value, _ = mock_cache.set_sync.call_args[0]
+        assert key == mock_cache.get_sync.call_args[0][0]
+        assert key.startswith("sum:")
+        assert value == b"Fresh summary"
+    
+    @patch('tenacity.nap.time.sleep')
+    @patch('app.services.summarization.cache')
+    def test_summarize_text_through_sdk(self, mock_cache, mock_sleep):
+        """Test a summary through the real OpenAI SDK and retry path, answered by a mock HTTP transport"""
+        mock_cache.get_sync.return_value = None
+        requests = []
+        
+        def handle(request):
+            requests.append(json.loads(request.content))
+            if len(requests) == 1:
+                return httpx.Response(429, headers={"retry-after": "1"}, json={"error": {"message": "Rate limit"}})
+            return httpx.Response(200, json=_chat_completion("SDK summary"))
+        
+        http_client = httpx.Client(transport=httpx.MockTransport(handle))
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'), \
+             patch('app.services.summarization.get_http_client', return_value=http_client):
+            service = SummarizationService()
+        
+        assert service.summarize_text("This is a test text that needs to be summarized. " * 10) == "SDK summary"
+        
+        # The rate-limited request was retried once, with the same serialized body
+        assert len(requests) == 2
+        assert requests[0] == requests[1]
+        assert requests[1]["messages"][0]["content"] == SYSTEM_PROMPT
+        assert requests[1]["messages"][1]["content"].startswith(PROMPT_PREFIX)
+    
+    def test_summary_cache_key_ignores_whitespace_and_case(self):
+        """Test that transcripts differing only in spacing or capitalization share a cache key"""
+        text = "This is a test text that needs to be summarized. " * 10
+        reformatted = text.upper().replace(". ", ".\n\n")
+        
+        assert self.service._summary_cache_key(text) == self.service._summary_cache_key(reformatted)
+        assert self.service._summary_cache_key(text) != self.service._summary_cache_key(text + " More.")
+    
+    @patch('app.services.summarization._get_encoding', return_value=None)
+    @patch('app.services.summarization.cache')
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_long_text_in_chunks(self, mock_openai, mock_cache, mock_encoding):
+        """Test that text longer than one chunk is summarized per chunk and then combined"""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = "Part summary"
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create.return_value = mock_response
+        mock_openai.return_value = mock_client
+        mock_cache.get_sync.return_value = None
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        service.chunk_tokens = 100
+        service.chunk_overlap_tokens = 10
+        
+        text = "word " * 200  # 1000 characters, about 250 estimated tokens
+        assert service.summarize_text(text) == "Part summary"
+        
+        # Three overlapping chunks, then one request combining their summaries
+        calls = mock_client.chat.completions.create.call_args_list
+        assert len(calls) == 4
+        combine_prompt = calls[-1].kwargs["messages"][1]["content"]
+        assert "Part 3:\nPart summary" in combine_prompt
+        assert not service.fits_single_request(text)
+    
+    @patch('app.services.summarization.cache')
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_texts_concurrently(self, mock_openai, mock_cache):
+        """Test that several texts are summarized at the same time, with errors returned in place"""
+        texts = [f"Transcript number {index} that needs to be summarized. " * 10 for index in range(4)]
+        # Every request waits until all four are in flight, so sequential calls would time out
+        all_in_flight = threading.Barrier(len(texts), timeout=5)
+        
+        def create(**params):
+            all_in_flight.wait()
+            prompt = params["messages"][1]["content"]
+            if "number 2" in prompt:
+                raise Exception("API Error")
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = f"Summary {prompt.split('number ')[1][0]}"
+            return response
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create.side_effect = create
+        mock_openai.return_value = mock_client
+        mock_cache.get_sync.return_value = None
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        results = service.summarize_texts(texts)
+        
+        assert results[:2] == ["Summary 0", "Summary 1"]
+        assert isinstance(results[2], Exception) and "API Error" in str(results[2])
+        assert results[3] == "Summary 3"
+    
+    @patch('app.services.summarization.cache')
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_text_coalesces_duplicates(self, mock_openai, mock_cache):
+        """Test that identical texts summarized at the same time share one API call"""
+        text = "This is a test text that needs to be summarized. " * 10
+        duplicates = 10
+        release = threading.Event()
+        
+        def create(**params):
+            # Hold the first request open until every duplicate has arrived
+            release.wait(timeout=5)
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = "Shared summary"
+            return response
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create.side_effect = create
+        mock_openai.return_value = mock_client
+        mock_cache.get_sync.return_value = None
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        def release_when_all_arrived():
+            # Every duplicate checks the cache just before joining the in-flight request
+            while mock_cache.get_sync.call_count < duplicates:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            release.set()
+        
+        threading.Thread(target=release_when_all_arrived, daemon=True).start()
+        results = service.summarize_texts([text] * duplicates, max_concurrency=duplicates)
+        
+        assert results == ["Shared summary"] * duplicates
+        mock_client.chat.completions.create.assert_called_once()
+        mock_cache.set_sync.assert_called_once()
+        assert service._inflight == {}
+    
+    @patch('app.services.summarization.cache')
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_text_stream(self, mock_openai, mock_cache):
+        """Test that a streamed summary is yielded piece by piece, then cached whole"""
+        pieces = ["This ", "is ", "a ", "streamed ", "summary."]
+        yielded = []
+        
+        def stream():
+            for piece in pieces:
+                # Nothing is read ahead: each piece is passed on before the next arrives
+                assert yielded == pieces[:len(yielded)]
+                yield Mock(choices=[Mock(delta=Mock(content=piece))])
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create.return_value = stream()
+        mock_openai.return_value = mock_client
+        mock_cache.get_sync.return_value = None
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        for piece in service.summarize_text_stream("This is a test text that needs to be summarized. " * 10):
+            yielded.append(piece)
+        
+        assert yielded == pieces
+        assert mock_client.chat.completions.create.call_args.kwargs["stream"] is True
+        key, value, _ = mock_cache.set_sync.call_args[0]
+        assert value == b"This is a streamed summary."
+    
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_texts_packed(self, mock_openai):
+        """Test that short texts share one request per pack and are mapped back by document number"""
+        def create(**params):
+            count = params["messages"][1]["content"].count("\nDocument ")
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = json.dumps({"summaries": [
+                {"document": number, "summary": f"Summary {number}"} for number in range(count, 0, -1)
+            ]})
+            return response
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create.side_effect = create
+        mock_openai.return_value = mock_client
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        texts = [f"Transcript number {index} that needs to be summarized. " * 10 for index in range(3)]
+        results = service.summarize_texts_packed(texts + ["Short"], pack=2)
+        
+        assert results[:3] == ["Summary 1", "Summary 2", "Summary 1"]
+        assert isinstance(results[3], ValueError)
+        calls = mock_client.chat.completions.create.call_args_list
+        assert len(calls) == 2
+        assert calls[0].kwargs["response_format"] == {"type": "json_object"}
+    
+    @patch('app.services.summarization.cache')
+    @patch('app.services.summarization.OpenAI')
+    def test_summarize_texts_packed_uses_summary_cache(self, mock_openai, mock_cache):
+        """Test that packing skips cached texts, sends identical texts once and caches what it gets back"""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({"summaries": [{"document": 1, "summary": "Fresh summary"}]})
+        mock_client = Mock()
+        mock_client.chat.completions.create.return_value = mock_response
+        mock_openai.return_value = mock_client
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        cached_text = "This transcript was summarized before. " * 10
+        new_text = "This transcript has not been summarized yet. " * 10
+        cached_key = service._summary_cache_key(cached_text)
+        mock_cache.get_sync.side_effect = lambda key: b"Cached summary" if key == cached_key else None
+        
+        results = service.summarize_texts_packed([cached_text, new_text, new_text])
+        
+        assert results == ["Cached summary", "Fresh summary", "Fresh summary"]
+        mock_client.chat.completions.create.assert_called_once()
+        assert mock_client.chat.completions.create.call_args.kwargs["messages"][1]["content"].count("\nDocument ") == 1
+        mock_cache.set_sync.assert_called_once()
+        assert mock_cache.set_sync.call_args[0][:2] == (service._summary_cache_key(new_text), b"Fresh summary")
+        assert not service._inflight
+    
+    @patch('app.services.summarization.OpenAI')
+    def test_submit_batch(self, mock_openai):
+        """Test that texts are sent as one JSONL batch file keyed by job ID"""
+        mock_client = Mock()
+        mock_client.files.create.return_value = Mock(id="file-123")
+        mock_client.batches.create.return_value = Mock(id="batch-123")
+        mock_openai.return_value = mock_client
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        batch_id = service.submit_batch({"job-1": "first text", "job-2": "second text"})
+        
+        assert batch_id == "batch-123"
+        _, content = mock_client.files.create.call_args[1]["file"]
+        lines = [json.loads(line) for line in content.splitlines()]
+        assert [line["custom_id"] for line in lines] == ["job-1", "job-2"]
+        assert all(line["url"] == "/v1/chat/completions" for line in lines)
+        mock_client.batches.create.assert_called_once_with(
+            input_file_id="file-123",
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+    
+    @patch('app.services.summarization.OpenAI')
+    def test_fetch_batch(self, mock_openai):
+        """Test reading summaries and per-request errors from a finished batch"""
+        output_line = {"custom_id": "job-1", "response": {"status_code": 200, "body": {
+            "choices": [{"message": {"content": " Summary of job 1 "}}]
+        }}}
+        error_line = {"custom_id": "job-2", "response": {"status_code": 429, "body": {
+            "error": {"message": "Rate limit reached"}
+        }}}
+        
+        mock_client = Mock()
+        mock_client.batches.retrieve.return_value = Mock(
+            status="completed", output_file_id="out-file", error_file_id="err-file"
+        )
+        mock_client.files.content.side_effect = lambda file_id: Mock(
+            text=json.dumps(output_line if file_id == "out-file" else error_line)
+        )
+        mock_openai.return_value = mock_client
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        summaries = service.fetch_batch("batch-123")
+        
+        assert summaries == {
+            "job-1": "Summary of job 1",
+            "job-2": "Summary generation failed: Rate limit reached"
+        }
+    
+    @patch('app.services.summarization.OpenAI')
+    def test_fetch_batch_still_running(self, mock_openai):
+        """Test that an unfinished batch returns None"""
+        mock_client = Mock()
+        mock_client.batches.retrieve.return_value = Mock(status="in_progress")
+        mock_openai.return_value = mock_client
+        
+        with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
+            service = SummarizationService()
+        
+        assert service.fetch_batch("batch-123") is None
+        mock_client.files.content.assert_not_called()
+    
     def test_get_summarization_service_factory(self):
         """Test the factory function"""
         with patch('app.services.summarization.settings.OPENAI_API_KEY', 'test-key'):
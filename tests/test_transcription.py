@@ -1,8 +1,13 @@
 import pytest
 import os
+import shutil
 import tempfile
 from unittest.mock import Mock, patch, mock_open
-from app.services.transcription import TranscriptionService
+import httpx
+from openai import OpenAI, RateLimitError
+from app.config import settings
+from app.services.transcription import NO_SPEECH_MESSAGE, TranscriptionService, get_transcription_service, split_audio
+from app.services.openai_client import OPENAI_TIMEOUT, RateLimiter, get_http_client
 
 
 class TestTranscriptionService:
@@ -10,13 +15,13 @@ class TestTranscriptionService:
     
     def setup_method(self):
         """Set up test fixtures"""
-        # Mock the OpenAI client entirely to avoid dependency issues
-        with patch('app.services.transcription.settings') as mock_settings, \
-             patch('app.services.transcription.OpenAI') as mock_openai:
+        with patch('app.services.transcription.settings') as mock_settings:
             mock_settings.OPENAI_API_KEY = 'test-api-key'
-            self.mock_client = Mock()
-            mock_openai.return_value = self.mock_client
             self.service = TranscriptionService()
+        
+        # Tests that get past validation talk to a mock instead of the lazily built OpenAI client
+        self.mock_client = Mock()
+        self.service.client = self.mock_client
     
     def test_init_without_api_key(self):
         """Test that service initialization fails without API key"""
@@ -26,6 +31,19 @@ class TestTranscriptionService:
             with pytest.raises(ValueError, match="OPENAI_API_KEY environment variable is required"):
                 TranscriptionService()
     
+    @patch('app.services.transcription.OpenAI')
+    def test_client_built_on_first_use(self, mock_openai):
+        """Test that no OpenAI client is created until a request needs one"""
+        with patch('app.services.transcription.settings.OPENAI_API_KEY', 'test-api-key'):
+            service = TranscriptionService()
+        
+        with pytest.raises(FileNotFoundError):
+            service.transcribe_audio("/nonexistent/file.mp3")
+        mock_openai.assert_not_called()
+        
+        assert service.client is service.client
+        mock_openai.assert_called_once()
+    
     def test_transcribe_audio_file_not_found(self):
         """Test transcription fails when file doesn't exist"""
         with pytest.raises(FileNotFoundError, match="Audio file not found"):
@@ -56,6 +74,11 @@ class TestTranscriptionService:
         
         assert result == "This is a test transcription."
         mock_file.assert_called_once_with("/fake/path/test.mp3", "rb")
+        
+        # The open file is handed over as-is, to be streamed rather than read up front
+        upload = self.mock_client.audio.transcriptions.create.call_args.kwargs["file"]
+        assert upload == ("test.mp3", mock_file.return_value, "audio/mpeg")
+        mock_file.return_value.read.assert_not_called()
     
     @patch('builtins.open', new_callable=mock_open, read_data=b'fake audio data')
     @patch('os.path.exists')
@@ -102,6 +125,120 @@ class TestTranscriptionService:
         with pytest.raises(Exception, match="OpenAI API rate limit exceeded"):
             self.service.transcribe_audio("/fake/path/test.mp3")
     
+    @patch('tenacity.nap.time.sleep')
+    @patch('app.services.transcription.cache')
+    def test_transcribe_audio_timeout(self, mock_cache, mock_sleep, tmp_path):
+        """Test that a request that times out is retried per call and then fails the transcription"""
+        audio_path = tmp_path / "test.mp3"
+        audio_path.write_bytes(b"fake audio data")
+        mock_cache.get_sync.return_value = None
+        attempts = []
+        
+        def handle(request):
+            attempts.append(request)
+            raise httpx.ReadTimeout("timed out", request=request)
+        
+        http_client = httpx.Client(transport=httpx.MockTransport(handle))
+        with patch('app.services.transcription.settings.OPENAI_API_KEY', 'test-api-key'), \
+             patch('app.services.transcription.get_http_client', return_value=http_client):
+            service = TranscriptionService()
+            
+            with pytest.raises(Exception, match="request timed out"):
+                service.transcribe_audio(str(audio_path))
+        
+        assert len(attempts) == settings.OPENAI_MAX_ATTEMPTS
+    
+    def test_shared_http_client_has_timeout(self):
+        """Test that SDK clients on the shared HTTP client don't wait the 10 minute default"""
+        client = OpenAI(api_key='test-api-key', http_client=get_http_client(), max_retries=0)
+        assert client.timeout == OPENAI_TIMEOUT
+        assert OPENAI_TIMEOUT.read == settings.OPENAI_READ_TIMEOUT
+    
+    @patch('tenacity.nap.time.sleep')
+    @patch('builtins.open', new_callable=mock_open, read_data=b'fake audio data')
+    @patch('os.path.exists')
+    def test_transcribe_audio_retries_rate_limit(self, mock_exists, mock_file, mock_sleep):
+        """Test that a transient rate limit is retried, honouring Retry-After"""
+        mock_exists.return_value = True
+        
+        request = httpx.Request("POST", "https://api.openai.com/v1/audio/transcriptions")
+        response = httpx.Response(429, request=request, headers={"retry-after": "3"})
+        rate_limit = RateLimitError("Rate limit exceeded", response=response, body=None)
+        
+        self.mock_client.audio.transcriptions.create.side_effect = [rate_limit, "Recovered transcription"]
+        
+        result = self.service.transcribe_audio("/fake/path/test.mp3")
+        
+        assert result == "Recovered transcription"
+        assert self.mock_client.audio.transcriptions.create.call_count == 2
+        assert mock_sleep.call_args[0][0] >= 3
+    
+    @patch('app.services.transcription.cache')
+    def test_transcribe_audio_uses_cached_transcript(self, mock_cache):
+        """Test that audio whose hash is cached skips the Whisper call"""
+        mock_cache.get_sync.return_value = "Cached transcription".encode("utf-8")
+        
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+            temp_file.write(b'fake audio data')
+            temp_path = temp_file.name
+        
+        try:
+            result = self.service.transcribe_audio(temp_path)
+        finally:
+            os.unlink(temp_path)
+        
+        assert result == "Cached transcription"
+        assert mock_cache.get_sync.call_args[0][0].startswith("tr:whisper-1:")
+        self.mock_client.audio.transcriptions.create.assert_not_called()
+    
+    @patch('app.services.transcription.cache')
+    @patch('builtins.open', new_callable=mock_open, read_data=b'fake audio data')
+    @patch('os.path.exists', return_value=True)
+    def test_transcribe_audio_after_cache_checked(self, mock_exists, mock_file, mock_cache):
+        """Test that a caller's cache miss isn't looked up again, while the transcript is still cached"""
+        self.mock_client.audio.transcriptions.create.return_value = "Fresh transcription"
+        
+        result = self.service.transcribe_audio("/fake/path/test.mp3", content_hash="abc123", cache_checked=True)
+        
+        assert result == "Fresh transcription"
+        mock_cache.get_sync.assert_not_called()
+        mock_cache.set_sync.assert_called_once_with("tr:whisper-1:abc123", b"Fresh transcription", settings.TRANSCRIPTION_CACHE_TTL)
+    
+    @patch('app.services.transcription.cache')
+    def test_whole_file_transcription_cache(self, mock_cache):
+        """Test the whole-file cache used for recordings transcribed in segments"""
+        mock_cache.get_sync.return_value = None
+        
+        assert self.service.get_cached_transcription("abc123") is None
+        mock_cache.get_sync.assert_called_once_with("tr:whisper-1:abc123")
+        
+        self.service.cache_transcription("abc123", "Joined transcript")
+        mock_cache.set_sync.assert_called_once_with("tr:whisper-1:abc123", b"Joined transcript", settings.TRANSCRIPTION_CACHE_TTL)
+        
+        # A recording without speech is not cached
+        mock_cache.set_sync.reset_mock()
+        self.service.cache_transcription("abc123", NO_SPEECH_MESSAGE)
+        mock_cache.set_sync.assert_not_called()
+    
+    @patch('app.services.transcription.probe_audio_duration', return_value=0.4)
+    @patch('app.services.transcription.cache')
+    def test_transcribe_audio_skips_too_short_clip(self, mock_cache, mock_probe):
+        """Test that a clip shorter than the minimum duration skips the Whisper call"""
+        mock_cache.get_sync.return_value = None
+        
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+            temp_file.write(b'fake audio data')
+            temp_path = temp_file.name
+        
+        try:
+            result = self.service.transcribe_audio(temp_path)
+        finally:
+            os.unlink(temp_path)
+        
+        assert result == "No speech detected in the audio file."
+        mock_probe.assert_called_once_with(temp_path)
+        self.mock_client.audio.transcriptions.create.assert_not_called()
+    
     def test_validate_api_key_success(self):
         """Test successful API key validation"""
         self.mock_client.models.list.return_value = Mock()
@@ -110,4 +247,61 @@ class TestTranscriptionService:
     def test_validate_api_key_failure(self):
         """Test failed API key validation"""
         self.mock_client.models.list.side_effect = Exception("Invalid key")
-        assert self.service.validate_api_key() is False
\ No newline at end of file
+        assert self.service.validate_api_key() is False
+    
+    def test_get_transcription_service_is_shared(self):
+        """Test that the factory builds the service (and its OpenAI client) only once"""
+        get_transcription_service.cache_clear()
+        try:
+            with patch('app.services.transcription.settings') as mock_settings, \
+                 patch('app.services.transcription.OpenAI'):
+                mock_settings.OPENAI_API_KEY = 'test-api-key'
+                assert get_transcription_service() is get_transcription_service()
+        finally:
+            get_transcription_service.cache_clear()
+
+
+@patch('app.services.transcription._ffmpeg_path', return_value=None)
+def test_split_audio_without_ffmpeg(mock_ffmpeg):
+    """Test that audio is transcribed whole when ffmpeg is not installed"""
+    assert split_audio("/fake/path/test.mp3", 600) == ["/fake/path/test.mp3"]
+
+
+@patch('app.services.transcription.subprocess.run')
+@patch('app.services.transcription.probe_audio_duration', return_value=1500.0)
+@patch('app.services.transcription._ffmpeg_path', return_value="/usr/bin/ffmpeg")
+def test_split_audio_into_segments(mock_ffmpeg, mock_probe, mock_run):
+    """Test that long audio is split by ffmpeg and the segments are returned in order"""
+    def run(command, **kwargs):
+        segment_dir = os.path.dirname(command[-1])
+        for index in (2, 0, 1):
+            open(os.path.join(segment_dir, f"{index:04d}.mp3"), "wb").close()
+        return Mock(returncode=0, stderr=b"")
+    
+    mock_run.side_effect = run
+    
+    segments = split_audio("/fake/path/test.mp3", 600)
+    try:
+        assert [os.path.basename(segment) for segment in segments] == ["0000.mp3", "0001.mp3", "0002.mp3"]
+        assert mock_run.call_args[0][0][mock_run.call_args[0][0].index("-segment_time") + 1] == "600"
+    finally:
+        shutil.rmtree(os.path.dirname(segments[0]))
+
+
+def test_rate_limiter_paces_requests_and_tokens():
+    """Test that the limiter lets a full minute's budget through, then waits for it to refill"""
+    clock = [1000.0]
+    
+    def sleep(seconds):
+        clock[0] += seconds
+    
+    with patch('app.services.openai_client.time.monotonic', side_effect=lambda: clock[0]), \
+         patch('app.services.openai_client.time.sleep', side_effect=sleep):
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+        
+        assert [limiter.acquire(100) for _ in range(60)] == [0.0] * 60
+        assert limiter.acquire(100) == pytest.approx(1.0)  # Out of requests: one more each second
+        
+        clock[0] += 60
+        assert limiter.acquire(6000) == 0.0
+        assert limiter.acquire(3000) == pytest.approx(30.0)  # Out of tokens: 100 more each second
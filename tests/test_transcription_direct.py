@@ -5,16 +5,18 @@ Direct test of the transcription service with an MP3 file
 
 import sys
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+@lru_cache(maxsize=1)
+def _bootstrap():
+    """Load .env and make the app importable, once and only when a test actually runs"""
+    load_dotenv()
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-# Add app to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-
-def test_transcription_with_file(mp3_file_path):
-    """Test transcription service with an actual MP3 file"""
+def transcribe_file(mp3_file_path):
+    """Transcribe an actual MP3 file with the transcription service (run this script directly)"""
+    _bootstrap()
     
     if not os.path.exists(mp3_file_path):
         print(f"❌ File not found: {mp3_file_path}")
@@ -50,15 +52,14 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         mp3_path = sys.argv[1]
     else:
-        # Look for any MP3 files in current directory
-        mp3_files = [f for f in os.listdir('.') if f.endswith('.mp3')]
-        if mp3_files:
-            mp3_path = mp3_files[0]
+        # Look for an MP3 file in current directory, stopping at the first one
+        mp3_path = next((entry.name for entry in os.scandir('.') if entry.is_file() and entry.name.endswith('.mp3')), None)
+        if mp3_path:
             print(f"📁 Found MP3 file: {mp3_path}")
         else:
             print("❌ No MP3 file provided or found.")
             print("Usage: python test_transcription_direct.py <path_to_mp3_file>")
             sys.exit(1)
     
-    success = test_transcription_with_file(mp3_path)
+    success = transcribe_file(mp3_path)
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -1,75 +1,84 @@
-#!/usr/bin/env python3
 """
-Simple test script to verify the upload endpoint functionality
+Test the upload endpoint against the app in-process
 """
-import requests
+import asyncio
 import io
 import os
+import time
+import anyio
+import pytest
+from unittest.mock import Mock, patch
+from app.config import settings
 
-def test_upload_endpoint():
+# Mock MP3 file content (ID3 header plus filler), enough to pass the endpoint's checks
+MOCK_MP3 = b"ID3\x03\x00\x00\x00" + b"fake mp3 content for testing" * 100
+
+# Uploads fired at once by test_upload_concurrent, and the wall time they must finish in
+CONCURRENT_UPLOADS = 50
+CONCURRENT_UPLOAD_SECONDS = 30
+
+pytestmark = pytest.mark.usefixtures("override_get_db")
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Save uploads under a per-test directory instead of ./uploads"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def mock_task():
+    """Stand in for the Celery task so uploads are not queued"""
+    with patch('app.tasks.process_audio_file.delay', return_value=Mock(id="task-123")) as task:
+        yield task
+
+def test_upload_endpoint(client, upload_dir, mock_task):
     """Test the upload endpoint with a mock MP3 file"""
-    
-    # Create a mock MP3 file content (just for testing the endpoint)
-    mock_mp3_content = b"ID3\x03\x00\x00\x00" + b"fake mp3 content for testing" * 100
-    
-    # Create file-like object
     files = {
-        'file': ('test.mp3', io.BytesIO(mock_mp3_content), 'audio/mpeg')
+        'file': ('test.mp3', io.BytesIO(MOCK_MP3), 'audio/mpeg')
     }
     
-    try:
-        # Test the upload endpoint
-        response = requests.post('http://localhost:8000/upload', files=files)
-        
-        if response.status_code == 200:
-            result = response.json()
-            print(f"✅ Upload successful!")
-            print(f"Job ID: {result['job_id']}")
-            print(f"Status: {result['status']}")
-            return result['job_id']
-        else:
-            print(f"❌ Upload failed with status {response.status_code}")
-            print(f"Response: {response.text}")
-            return None
-            
-    except requests.exceptions.ConnectionError:
-        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
-        return None
+    response = client.post('/upload', files=files)
+    
+    assert response.status_code == 200
+    result = response.json()
+    assert result['status'] == "pending"
+    
+    # The file was saved in the uploads directory under its job ID
+    saved = [name for name in os.listdir(upload_dir) if result['job_id'] in name]
+    assert len(saved) == 1
+    assert (upload_dir / saved[0]).read_bytes() == MOCK_MP3
+    mock_task.assert_called_once()
 
-def test_invalid_file():
+def test_invalid_file(client, mock_task):
     """Test upload with invalid file format"""
-    
-    # Create a text file instead of MP3
     files = {
         'file': ('test.txt', io.BytesIO(b"This is not an MP3 file"), 'text/plain')
     }
     
-    try:
-        response = requests.post('http://localhost:8000/upload', files=files)
-        
-        if response.status_code == 400:
-            print("✅ Invalid file correctly rejected")
-            print(f"Error: {response.json()['detail']}")
-        else:
-            print(f"❌ Expected 400 error, got {response.status_code}")
-            print(f"Response: {response.text}")
-            
-    except requests.exceptions.ConnectionError:
-        print("❌ Could not connect to server")
+    response = client.post('/upload', files=files)
+    
+    assert response.status_code == 400
+    assert response.json()['detail']
+    mock_task.assert_not_called()
 
-if __name__ == "__main__":
-    print("Testing upload endpoint...")
-    print("\n1. Testing valid MP3 upload:")
-    job_id = test_upload_endpoint()
+def test_upload_concurrent(async_client, upload_dir, mock_task):
+    """Test that many uploads sent at once all succeed, each as its own job"""
+    async def upload_all():
+        # The uploads share the test's one Session, so its queries must not overlap: give this
+        # loop a single worker thread. Reading and saving the files still interleaves.
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 1
+        async with async_client:
+            return await asyncio.gather(*(
+                async_client.post('/upload', files={'file': (f'test{i}.mp3', MOCK_MP3, 'audio/mpeg')})
+                for i in range(CONCURRENT_UPLOADS)
+            ))
     
-    print("\n2. Testing invalid file format:")
-    test_invalid_file()
+    started = time.perf_counter()
+    responses = asyncio.run(upload_all())
+    elapsed = time.perf_counter() - started
     
-    if job_id:
-        print(f"\n3. Checking if file was saved in uploads directory:")
-        upload_files = os.listdir("uploads") if os.path.exists("uploads") else []
-        if any(job_id in f for f in upload_files):
-            print("✅ File was saved successfully")
-        else:
-            print("❌ File was not found in uploads directory")
-            print(f"Files in uploads: {upload_files}")
\ No newline at end of file
+    assert [response.status_code for response in responses] == [200] * CONCURRENT_UPLOADS
+    assert len({response.json()['job_id'] for response in responses}) == CONCURRENT_UPLOADS
+    assert len(os.listdir(upload_dir)) == CONCURRENT_UPLOADS
+    assert mock_task.call_count == CONCURRENT_UPLOADS
+    assert elapsed < CONCURRENT_UPLOAD_SECONDS